@@ -0,0 +1,140 @@
+"""Compare regular inserts with server-side async inserts against a live ClickHouse.
+
+Several writers insert small batches concurrently, like etl workers do. For every mode
+it reports insert latency, time until all rows are visible, CPU of this process and of
+the server, and the number of parts created.
+
+Usage:
+    python -m src.benchmarks.async_insert --writers 8 --batches 50 --batch-size 1000
+"""
+import argparse
+import asyncio
+import time
+
+from asynch.pool import Pool
+from src.benchmarks.columnar_insert import (
+    BENCHMARK_TABLE,
+    CREATE_TABLE_QUERY,
+    generate_messages,
+)
+from src.etl.analytical_db import AsyncInsertClickhouseRepository, ClickhouseRepository
+from src.etl.clickhouse_connection import create_connection_pool
+from src.models.view import ViewMessage
+from src.settings.clickhouse import ClickhouseSettings
+
+POLL_INTERVAL_SEC = 0.05
+
+
+async def query_value(pool: Pool, query: str) -> int:
+    async with pool.acquire() as connection, connection.cursor() as cursor:
+        await cursor.execute(query)
+        row = await cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else 0
+
+
+async def server_cpu_us(pool: Pool) -> int:
+    return await query_value(
+        pool,
+        "SELECT value FROM system.events WHERE event = 'OSCPUVirtualTimeMicroseconds'",
+    )
+
+
+async def write(
+    repository: ClickhouseRepository,
+    batches: list[list[list]],
+    latencies: list[float],
+) -> None:
+    for columns in batches:
+        start = time.perf_counter()
+        await repository.insert_columns(
+            table=BENCHMARK_TABLE, keys=ViewMessage.column_names(), columns=columns
+        )
+        latencies.append(time.perf_counter() - start)
+
+
+async def measure(
+    name: str,
+    repository: ClickhouseRepository,
+    pool: Pool,
+    writers_batches: list[list[list[list]]],
+    rows: int,
+) -> None:
+    async with pool.acquire() as connection, connection.cursor() as cursor:
+        await cursor.execute(f"DROP TABLE IF EXISTS {BENCHMARK_TABLE}")
+        await cursor.execute(CREATE_TABLE_QUERY)
+
+    latencies: list[float] = []
+    cpu_before = await server_cpu_us(pool)
+    process_before = time.process_time()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[write(repository, batches, latencies) for batches in writers_batches]
+    )
+    inserted = time.perf_counter() - start
+
+    # Without waiting for async inserts rows appear only after the server's flush
+    count_query = f"SELECT count() FROM {BENCHMARK_TABLE}"
+    while await query_value(pool, count_query) < rows:
+        await asyncio.sleep(POLL_INTERVAL_SEC)
+    visible = time.perf_counter() - start
+    process_cpu = time.process_time() - process_before
+    server_cpu = (await server_cpu_us(pool) - cpu_before) / 1e6
+    parts = await query_value(
+        pool,
+        "SELECT count() FROM system.parts "
+        f"WHERE database = currentDatabase() AND table = '{BENCHMARK_TABLE}'",
+    )
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(
+        f"{name:>12}: {rows} rows, inserted in {inserted:.3f}s, visible in {visible:.3f}s, "
+        f"{rows / visible:,.0f} rows/sec, latency p50 = {p50 * 1000:.1f}ms, "
+        f"p99 = {p99 * 1000:.1f}ms, etl cpu = {process_cpu:.3f}s, "
+        f"server cpu = {server_cpu:.3f}s, parts = {parts}"
+    )
+
+
+async def main(writers: int, batches_n: int, batch_size: int) -> None:
+    settings = ClickhouseSettings(table=BENCHMARK_TABLE)
+    rows = writers * batches_n * batch_size
+    models = [ViewMessage.parse_raw(message) for message in generate_messages(rows)]
+    batches = [
+        ViewMessage.to_columns(models[i : i + batch_size])
+        for i in range(0, rows, batch_size)
+    ]
+    writers_batches = [batches[i::writers] for i in range(writers)]
+
+    async with create_connection_pool(settings) as pool:
+        try:
+            await measure(
+                "sync", ClickhouseRepository(pool), pool, writers_batches, rows
+            )
+            await measure(
+                "async wait",
+                AsyncInsertClickhouseRepository(pool, wait_for_async_insert=True),
+                pool,
+                writers_batches,
+                rows,
+            )
+            await measure(
+                "async nowait",
+                AsyncInsertClickhouseRepository(pool, wait_for_async_insert=False),
+                pool,
+                writers_batches,
+                rows,
+            )
+        finally:
+            async with pool.acquire() as connection, connection.cursor() as cursor:
+                await cursor.execute(f"DROP TABLE IF EXISTS {BENCHMARK_TABLE}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=50, help="Batches per writer")
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.writers, args.batches, args.batch_size))
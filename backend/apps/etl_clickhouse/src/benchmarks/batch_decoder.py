@@ -0,0 +1,96 @@
+"""Compare parse throughput of the per-message pydantic path and the batch view decoder.
+
+Usage:
+    python -m src.benchmarks.batch_decoder --messages 100000 --invalid-ratio 0.01
+"""
+import argparse
+import logging
+import random
+import time
+import uuid
+
+import orjson
+from src.etl.decoders import (
+    BatchDecoder,
+    DecodedBatch,
+    SchemaBatchDecoder,
+    ViewBatchDecoder,
+    to_epoch_seconds,
+)
+from src.models.view import ViewMessage
+
+INVALID_MESSAGES = (
+    b"not a json",
+    b'{"user_id": "not an uuid"}',
+    orjson.dumps(
+        {
+            "user_id": str(uuid.uuid4()),
+            "film_id": str(uuid.uuid4()),
+            "progress_sec": -1,
+            "timestamp": time.time(),
+        }
+    ),
+)
+
+
+def generate_messages(n: int, invalid_ratio: float) -> list[bytes]:
+    now = time.time()
+    messages = []
+    for i in range(n):
+        if random.random() < invalid_ratio:  # noqa: S311
+            messages.append(random.choice(INVALID_MESSAGES))  # noqa: S311
+            continue
+        messages.append(
+            orjson.dumps(
+                {
+                    "user_id": str(uuid.uuid4()),
+                    "film_id": str(uuid.uuid4()),
+                    "progress_sec": i % 7200,
+                    "timestamp": now + i,
+                }
+            )
+        )
+    return messages
+
+
+def normalized_rows(batch: DecodedBatch) -> list[tuple]:
+    rows = zip(*batch.columns) if batch.columns else []
+    return sorted(
+        (user_id, film_id, progress_sec, to_epoch_seconds(timestamp))
+        for user_id, film_id, progress_sec, timestamp in rows
+    )
+
+
+def measure(name: str, decoder: BatchDecoder, messages: list[bytes]) -> DecodedBatch:
+    start = time.perf_counter()
+    batch = decoder.decode(messages)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>8}: {len(messages)} messages in {elapsed:.3f}s, "
+        f"{len(messages) / elapsed:,.0f} msgs/sec, invalid = {len(batch.invalid)}"
+    )
+    return batch
+
+
+def main(n: int, invalid_ratio: float) -> None:
+    messages = generate_messages(n, invalid_ratio)
+
+    pydantic_batch = measure("pydantic", SchemaBatchDecoder(ViewMessage), messages)
+    batch = measure("batch", ViewBatchDecoder(), messages)
+
+    same_invalid = pydantic_batch.invalid == batch.invalid
+    same_rows = normalized_rows(pydantic_batch) == normalized_rows(batch)
+    if not (same_invalid and same_rows):
+        raise SystemExit("Decoders produced different results")
+    print("Results are identical")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--invalid-ratio", type=float, default=0.01)
+    args = parser.parse_args()
+
+    # Invalid messages are logged one by one, keep the output readable
+    logging.disable(logging.ERROR)
+    main(args.messages, args.invalid_ratio)
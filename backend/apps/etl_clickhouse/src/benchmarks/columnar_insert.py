@@ -0,0 +1,105 @@
+"""Compare row-dict and columnar insert throughput against a live ClickHouse.
+
+Usage:
+    python -m src.benchmarks.columnar_insert --rows 100000 --batch-size 10000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+
+import orjson
+from src.etl.analytical_db import ClickhouseRepository
+from src.etl.clickhouse_connection import create_connection_pool
+from src.models.view import ViewMessage
+from src.settings.clickhouse import ClickhouseSettings
+
+BENCHMARK_TABLE = "etl_benchmark_views"
+
+CREATE_TABLE_QUERY = f"""
+CREATE TABLE IF NOT EXISTS {BENCHMARK_TABLE} (
+    user_id UUID,
+    film_id UUID,
+    progress_sec UInt32,
+    timestamp TIMESTAMP
+)
+Engine=MergeTree()
+ORDER BY (user_id, film_id, timestamp)
+"""
+
+
+def generate_messages(n: int) -> list[bytes]:
+    now = time.time()
+    return [
+        orjson.dumps(
+            {
+                "user_id": str(uuid.uuid4()),
+                "film_id": str(uuid.uuid4()),
+                "progress_sec": i % 7200,
+                "timestamp": now + i,
+            }
+        )
+        for i in range(n)
+    ]
+
+
+async def insert_rows(
+    repository: ClickhouseRepository, models: list[ViewMessage]
+) -> None:
+    await repository.insert_batch(
+        table=BENCHMARK_TABLE,
+        keys=models[0].dict().keys(),
+        data=[model.dict() for model in models],
+    )
+
+
+async def insert_columns(
+    repository: ClickhouseRepository, models: list[ViewMessage]
+) -> None:
+    await repository.insert_columns(
+        table=BENCHMARK_TABLE,
+        keys=ViewMessage.column_names(),
+        columns=ViewMessage.to_columns(models),
+    )
+
+
+async def measure(
+    name: str,
+    insert: Callable[[ClickhouseRepository, list[ViewMessage]], Awaitable[None]],
+    repository: ClickhouseRepository,
+    batches: list[list[ViewMessage]],
+) -> None:
+    rows = sum(len(batch) for batch in batches)
+    start = time.perf_counter()
+    for batch in batches:
+        await insert(repository, batch)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {rows} rows in {elapsed:.3f}s, {rows / elapsed:,.0f} rows/sec")
+
+
+async def main(rows: int, batch_size: int) -> None:
+    settings = ClickhouseSettings(table=BENCHMARK_TABLE)
+    messages = generate_messages(rows)
+    models = [ViewMessage.parse_raw(message) for message in messages]
+    batches = [models[i : i + batch_size] for i in range(0, rows, batch_size)]
+
+    async with create_connection_pool(settings) as pool:
+        async with pool.acquire() as connection, connection.cursor() as cursor:
+            await cursor.execute(CREATE_TABLE_QUERY)
+        try:
+            repository = ClickhouseRepository(pool)
+            await measure("rows", insert_rows, repository, batches)
+            await measure("columnar", insert_columns, repository, batches)
+        finally:
+            async with pool.acquire() as connection, connection.cursor() as cursor:
+                await cursor.execute(f"DROP TABLE IF EXISTS {BENCHMARK_TABLE}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.rows, args.batch_size))
@@ -0,0 +1,258 @@
+"""Measure throughput of the etl pipeline and where the time goes, without kafka or clickhouse.
+
+Synthetic views go from an in-memory consumer through FlushableMemoryBuffer, which copies
+them into a MessageBatch like the etl's partition buffers, to KafkaToDatabaseHandler, which
+inserts into a repository that only records the batches.
+
+Usage:
+    python -m src.benchmarks.pipeline --messages 200000 --buffer-sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from functools import partial
+from typing import Any
+
+import orjson
+from aiokafka.structs import ConsumerRecord, TopicPartition
+from src.buffer.flush_buffer import FlushableMemoryBuffer
+from src.buffer.message_batch import MessageBatch
+from src.etl.analytical_db import InsertSelectRepository
+from src.etl.decoders import DecodedBatch
+from src.etl.topic_handler import Topic, TopicMessage, get_topic_handler
+
+STAGES = ("consume", "push", "parse", "prepare", "insert")
+
+
+class Timings:
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = defaultdict(float)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+
+class InMemoryConsumer:
+    "Returns prepared records in fetches the way AIOKafkaConsumer.getmany does"
+
+    def __init__(self, records: list[ConsumerRecord]) -> None:
+        self.records = records
+        self._position = 0
+
+    async def getmany(
+        self, max_records: int
+    ) -> dict[TopicPartition, list[ConsumerRecord]]:
+        records = self.records[self._position : self._position + max_records]
+        self._position += len(records)
+        if not records:
+            return {}
+        return {TopicPartition(records[0].topic, records[0].partition): records}
+
+    async def commit(self, offsets: Any = None) -> None:
+        pass
+
+
+class InMemoryProducer:
+    def __init__(self) -> None:
+        self.sent: list[tuple[str, bytes]] = []
+
+    async def send(self, topic: str, value: bytes, key: bytes | None = None) -> None:
+        self.sent.append((topic, value))
+
+
+class RecordingRepository(InsertSelectRepository):
+    "Counts inserted rows, time spent here is the insert stage"
+
+    def __init__(self, timings: Timings) -> None:
+        self.timings = timings
+        self.inserts = 0
+        self.rows = 0
+
+    def _record(self, rows: int) -> None:
+        self.inserts += 1
+        self.rows += rows
+
+    async def insert_batch(
+        self,
+        table: str,
+        keys: Iterable[str],
+        data: list[dict[str, Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        with self.timings.stage("insert"):
+            self._record(len(data))
+
+    async def insert_columns(
+        self,
+        table: str,
+        keys: Iterable[str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        with self.timings.stage("insert"):
+            self._record(len(columns[0]) if columns else 0)
+
+    async def insert_select(
+        self,
+        table: str,
+        select: str,
+        structure: dict[str, str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        with self.timings.stage("insert"):
+            self._record(len(columns[0]) if columns else 0)
+
+    async def active_parts(self, table: str) -> int:
+        return 0
+
+
+def generate_records(n: int, topic: str) -> list[ConsumerRecord]:
+    now = time.time()
+    records = []
+    for i in range(n):
+        value = orjson.dumps(
+            {
+                "user_id": str(uuid.uuid4()),
+                "film_id": str(uuid.uuid4()),
+                "progress_sec": i % 7200,
+                "timestamp": now + i,
+            }
+        )
+        records.append(
+            ConsumerRecord(
+                topic=topic,
+                partition=0,
+                offset=i,
+                timestamp=int(now * 1000),
+                timestamp_type=0,
+                key=None,
+                value=value,
+                checksum=None,
+                serialized_key_size=-1,
+                serialized_value_size=len(value),
+                headers=(),
+            )
+        )
+    return records
+
+
+async def run_pipeline(
+    records: list[ConsumerRecord],
+    buffer_size: int,
+    max_records: int,
+    columnar_insert: bool,
+) -> tuple[Timings, RecordingRepository, float]:
+    timings = Timings()
+    repository = RecordingRepository(timings)
+    consumer = InMemoryConsumer(records)
+    handler = get_topic_handler(
+        topic=Topic.VIEWS,
+        consumer=consumer,  # type: ignore[arg-type]
+        producer=InMemoryProducer(),  # type: ignore[arg-type]
+        dlq_topic="benchmark_dlq",
+        repository=repository,
+        db_table="benchmark_views",
+        columnar_insert=columnar_insert,
+    )
+
+    parse_messages = handler.parse_messages
+    insert_rows = handler.insert_rows
+
+    def timed_parse(messages: Any) -> tuple[DecodedBatch, list[TopicMessage]]:
+        with timings.stage("parse"):
+            return parse_messages(messages)
+
+    async def timed_insert_rows(batch: DecodedBatch, dedup_token: Any = None) -> None:
+        # Includes the insert itself, which is subtracted below
+        with timings.stage("prepare"):
+            await insert_rows(batch, dedup_token)
+
+    handler.parse_messages = timed_parse  # type: ignore[method-assign]
+    handler.insert_rows = timed_insert_rows  # type: ignore[method-assign]
+
+    async def timed_handle_batch(messages: Any) -> None:
+        with timings.stage("handle"):
+            await handler.handle_batch(messages)
+
+    start = time.perf_counter()
+    new_batch = partial(MessageBatch, Topic.VIEWS.value, 0)
+    async with FlushableMemoryBuffer(buffer_size, new_batch) as buffer:
+        buffer.add_on_flush_callback(timed_handle_batch)
+        while fetched := await consumer.getmany(max_records):
+            for records in fetched.values():
+                with timings.stage("push_and_flush"):
+                    size = sum(len(record.value) for record in records)
+                    await buffer.extend(records, size)
+    elapsed = time.perf_counter() - start
+
+    seconds = timings.seconds
+    seconds["prepare"] -= seconds["insert"]
+    seconds["push"] = seconds.pop("push_and_flush") - seconds["handle"]
+    seconds["consume"] = elapsed - seconds["push"]
+    seconds["consume"] -= seconds.pop("handle")
+    return timings, repository, elapsed
+
+
+def report(
+    buffer_size: int, timings: Timings, repository: RecordingRepository, elapsed: float
+) -> None:
+    n = repository.rows
+    print(
+        f"buffer = {buffer_size:>9} bytes: {n} messages in {elapsed:.3f}s, "
+        f"{n / elapsed:,.0f} msgs/sec, inserts = {repository.inserts}, "
+        f"rows/insert = {n / max(repository.inserts, 1):,.0f}"
+    )
+    for stage in STAGES:
+        seconds = timings.seconds[stage]
+        print(
+            f"    {stage:>9}: {seconds:.3f}s, {seconds / elapsed:6.1%}, "
+            f"{seconds / max(n, 1) * 1e6:.2f} us/msg"
+        )
+
+
+def main(
+    n: int, buffer_sizes: list[int], max_records: int, columnar_insert: bool
+) -> None:
+    records = generate_records(n, Topic.VIEWS)
+    for buffer_size in buffer_sizes:
+        timings, repository, elapsed = asyncio.run(
+            run_pipeline(records, buffer_size, max_records, columnar_insert)
+        )
+        report(buffer_size, timings, repository, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument(
+        "--buffer-sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument(
+        "--max-records", type=int, default=5_000, help="Records per fetch"
+    )
+    parser.add_argument(
+        "--rows",
+        action="store_true",
+        help="Insert row dicts instead of columns, to measure the .dict() path",
+    )
+    args = parser.parse_args()
+
+    # Batches are logged by the handler, keep the output readable
+    logging.disable(logging.WARNING)
+    main(
+        args.messages,
+        args.buffer_sizes,
+        args.max_records,
+        columnar_insert=not args.rows,
+    )
@@ -1,30 +1,48 @@
 import asyncio
 import logging
+import math
 import sys
+import time
 from abc import ABC, abstractmethod
-from collections.abc import AsyncGenerator, Callable
-from contextlib import asynccontextmanager
+from collections.abc import AsyncGenerator, Callable, Sequence
+from contextlib import asynccontextmanager, suppress
+from enum import StrEnum, unique
 from typing import Any, Self
 
+from src.metrics.etl import BUFFER_FLUSHES
+
 logger = logging.getLogger()
 
 
+@unique
+class FlushReason(StrEnum):
+    SIZE: str = "size"
+    COUNT: str = "count"
+    LINGER: str = "linger"
+    EXIT: str = "exit"
+    MANUAL: str = "manual"
+
+
 class FlushableBuffer(ABC):
-    """Interface for async buffers that can automatically flush based on different conditions"""
+    """Interface for async buffers that can automatically flush based on different conditions
 
-    def __init__(self) -> None:
-        self.__buffer: list = []
+    Data is appended to a batch made by new_batch, a list by default. On flush the batch
+    is handed to callbacks as is and replaced by a new one, so it's never copied.
+    """
+
+    def __init__(self, new_batch: Callable[[], Any] = list) -> None:
+        self.__new_batch = new_batch
+        self.__buffer: Any = new_batch()
         self.__data_size: int = 0
+        self.__first_push_time: float | None = None
         self.__on_flush_callbacks: list[Callable] = []
+        self.__flush_lock = asyncio.Lock()
 
     @abstractmethod
     async def _on_push(self) -> None:
         pass
 
-    async def __on_buffer_flush(self, buffer: tuple) -> None:
-        logger.debug(
-            f"Processing buffer data, callbacks n = {len(self.__on_flush_callbacks)}, buffer = {self.__buffer}"
-        )
+    async def __on_buffer_flush(self, buffer: Any) -> None:
         await asyncio.gather(
             *[callback(buffer) for callback in self.__on_flush_callbacks]
         )
@@ -33,19 +51,25 @@ class FlushableBuffer(ABC):
         logger.debug(f"Add new on_flush_callback = {callback}")
         self.__on_flush_callbacks.append(callback)
 
-    async def flush(self) -> None:
-        logger.debug(
-            f"Flushing buffer, size = {self.__data_size}, buffer = {self.__buffer}"
-        )
-        if not len(self.__buffer):
-            return None
-        buffer_copy = tuple(self.__buffer)
-        self.__buffer.clear()
-        self.__data_size = 0
-        await self.__on_buffer_flush(buffer_copy)
+    async def flush(self, reason: FlushReason = FlushReason.MANUAL) -> None:
+        # Flushes can be triggered both by pushes and by background timers,
+        # callbacks must still see batches one at a time and in order
+        async with self.__flush_lock:
+            if not len(self.__buffer):
+                return None
+            logger.debug(
+                f"Flushing buffer, reason = {reason}, size = {self.__data_size}, n = {len(self.__buffer)}"
+            )
+            buffer = self.__buffer
+            self.__buffer = self.__new_batch()
+            self.__data_size = 0
+            self.__first_push_time = None
+            BUFFER_FLUSHES.labels(reason).inc()
+            await self.__on_buffer_flush(buffer)
 
     async def push(self, data: Any, size: int | None = None) -> None:
-        logger.debug(f"Pushing to buffer data = {data}, size = {size}")
+        if self.__first_push_time is None:
+            self.__first_push_time = time.monotonic()
         self.__buffer.append(data)
 
         if size is None:
@@ -55,31 +79,136 @@ class FlushableBuffer(ABC):
 
         await self._on_push()
 
+    def _room(self, item_size: float) -> int:
+        "How many more items of the size fit before the buffer has to flush"
+        return sys.maxsize
+
+    async def extend(self, data: Sequence[Any], size: int | None = None) -> None:
+        """Pushes a sequence of data, i.e. a fetched batch, with far fewer checks than
+        pushing items one by one.
+
+        Data is split where the buffer fills up, assuming items of the same size, so
+        flushed batches stay close to the thresholds.
+        """
+        if not data:
+            return
+        if size is None:
+            size = sum(sys.getsizeof(item) for item in data)
+        item_size = size / len(data)
+
+        start = 0
+        while start < len(data):
+            if self.__first_push_time is None:
+                self.__first_push_time = time.monotonic()
+            end = min(start + max(self._room(item_size), 1), len(data))
+            self.__buffer.extend(data[start:end])
+            self.__data_size += round(item_size * end) - round(item_size * start)
+            start = end
+            await self._on_push()
+
     def buffer_data_size(self) -> int:
         return self.__data_size
 
+    def buffer_length(self) -> int:
+        return len(self.__buffer)
+
+    def buffer_age(self) -> float:
+        "Seconds since the oldest buffered data was pushed"
+        if self.__first_push_time is None:
+            return 0.0
+        return time.monotonic() - self.__first_push_time
+
     async def __aenter__(self) -> Self:
         return self
 
     async def __aexit__(self, *excinfo) -> None:
-        logger.debug(f"Flushing buffer on exit, buffer = {self.__buffer}")
-        await self.flush()
+        await self.flush(FlushReason.EXIT)
 
 
 class FlushableMemoryBuffer(FlushableBuffer):
-    def __init__(self, max_buffer_bytes: int = 0) -> None:
-        super().__init__()
+    def __init__(
+        self, max_buffer_bytes: int = 0, new_batch: Callable[[], Any] = list
+    ) -> None:
+        super().__init__(new_batch)
+        self._max_buffer_size = max_buffer_bytes
+
+    def set_max_buffer_bytes(self, max_buffer_bytes: int) -> None:
+        "Applies from the next push, i.e. when the size is adjusted at runtime"
         self._max_buffer_size = max_buffer_bytes
 
+    def _room(self, item_size: float) -> int:
+        if item_size <= 0:
+            return super()._room(item_size)
+        return math.ceil((self._max_buffer_size - self.buffer_data_size()) / item_size)
+
     async def _on_push(self) -> None:
         if self.buffer_data_size() >= self._max_buffer_size:
             logger.debug("Buffer overflows, flushing")
-            await self.flush()
+            await self.flush(FlushReason.SIZE)
+
+
+class HybridFlushBuffer(FlushableMemoryBuffer):
+    """Flushes on whichever comes first: byte size, message count or linger time.
+
+    Linger time is checked by a background task, so data doesn't stay in memory
+    indefinitely when there are no new pushes.
+    """
+
+    def __init__(
+        self,
+        max_buffer_bytes: int = 0,
+        max_messages: int = 0,
+        linger_ms: int = 0,
+        new_batch: Callable[[], Any] = list,
+    ) -> None:
+        super().__init__(max_buffer_bytes, new_batch)
+        self._max_messages = max_messages
+        self._linger_sec = linger_ms / 1000
+        self._linger_task: asyncio.Task | None = None
+
+    def _room(self, item_size: float) -> int:
+        room = super()._room(item_size)
+        if self._max_messages:
+            return min(room, self._max_messages - self.buffer_length())
+        return room
+
+    async def _on_push(self) -> None:
+        if self._max_messages and self.buffer_length() >= self._max_messages:
+            logger.debug("Buffer reached max messages, flushing")
+            await self.flush(FlushReason.COUNT)
+            return
+        await super()._on_push()
+
+    async def _linger(self) -> None:
+        while True:
+            remaining = self._linger_sec - self.buffer_age()
+            if self.buffer_length() and remaining <= 0:
+                try:
+                    # Exiting cancels lingering, but a flushed batch must still reach
+                    # callbacks, it's no longer in the buffer for the exit's flush
+                    await asyncio.shield(self.flush(FlushReason.LINGER))
+                except Exception as e:
+                    logger.error(f"Couldn't flush lingering buffer, err = {e}")
+                continue
+            await asyncio.sleep(remaining if self.buffer_length() else self._linger_sec)
+
+    async def __aenter__(self) -> Self:
+        if self._linger_sec > 0:
+            self._linger_task = asyncio.create_task(self._linger())
+        return await super().__aenter__()
+
+    async def __aexit__(self, *excinfo) -> None:
+        if self._linger_task is not None:
+            self._linger_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._linger_task
+            self._linger_task = None
+        await super().__aexit__(*excinfo)
 
 
 @asynccontextmanager
 async def get_flushable_buffer(
-    *, max_buffer_size: int
+    *, max_buffer_size: int, max_messages: int = 0, linger_ms: int = 0
 ) -> AsyncGenerator[FlushableBuffer, None]:
-    async with FlushableMemoryBuffer(max_buffer_size) as fb:
+    async with HybridFlushBuffer(max_buffer_size, max_messages, linger_ms) as fb:
         yield fb
@@ -0,0 +1,141 @@
+from array import array
+from collections.abc import Iterable, Sequence
+from typing import Protocol, overload
+
+from src.models.message import TopicMessage
+
+# Values are handed to decoders as views into the batch, without copying them
+RawValue = bytes | memoryview
+
+
+class RawRecord(Protocol):
+    "Consumed record, i.e. aiokafka's ConsumerRecord"
+
+    @property
+    def key(self) -> bytes | None:
+        ...
+
+    @property
+    def value(self) -> bytes | None:
+        ...
+
+    @property
+    def offset(self) -> int:
+        ...
+
+
+class MessageBatch(Sequence[TopicMessage]):
+    """Raw messages of one partition, stored in a single byte arena.
+
+    Keys and values are appended to one bytearray and located by an array of bounds,
+    offsets are kept in another array, so buffering a record allocates nothing per
+    message. Values are read as memoryviews into the arena. Indexing builds a
+    TopicMessage, which is only meant for the few messages that go to the DLQ.
+    A batch must not be appended to once its values were read.
+    """
+
+    __slots__ = ("topic", "partition", "offsets", "value_bytes", "_arena", "_bounds")
+
+    def __init__(self, topic: str, partition: int) -> None:
+        self.topic = topic
+        self.partition = partition
+        self.offsets = array("q")
+        self.value_bytes = 0
+        self._arena = bytearray()
+        # Start, key length or -1 without a key, and end of every message
+        self._bounds = array("q")
+
+    def append(self, record: RawRecord) -> None:
+        start = len(self._arena)
+        key = record.key
+        if key is None:
+            key_length = -1
+        else:
+            self._arena += key
+            key_length = len(key)
+        # Tombstones have no value, they're sent to the DLQ as empty values
+        value = record.value or b""
+        self._arena += value
+        self.value_bytes += len(value)
+        self._bounds.append(start)
+        self._bounds.append(key_length)
+        self._bounds.append(len(self._arena))
+        self.offsets.append(record.offset)
+
+    def extend(self, records: Iterable[RawRecord]) -> None:
+        append = self.append
+        for record in records:
+            append(record)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @overload
+    def __getitem__(self, index: int) -> TopicMessage:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[TopicMessage]:
+        ...
+
+    def __getitem__(self, index: int | slice) -> TopicMessage | list[TopicMessage]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = range(len(self))[index]
+        start, key_length, end = self._bounds[3 * index : 3 * index + 3]
+        key = None
+        if key_length >= 0:
+            key = bytes(self._arena[start : start + key_length])
+        return TopicMessage.construct(
+            key=key,
+            value=bytes(self._arena[start + max(key_length, 0) : end]),
+            topic=self.topic,
+            partition=self.partition,
+            offset=self.offsets[index],
+            headers=(),
+        )
+
+    def values(self) -> list[memoryview]:
+        arena = memoryview(self._arena)
+        bounds = self._bounds
+        return [
+            arena[bounds[i] + max(bounds[i + 1], 0) : bounds[i + 2]]
+            for i in range(0, len(bounds), 3)
+        ]
+
+
+def message_values(messages: Sequence[TopicMessage]) -> Sequence[RawValue]:
+    if isinstance(messages, MessageBatch):
+        return messages.values()
+    return [message.value for message in messages]
+
+
+def values_size(messages: Sequence[TopicMessage]) -> int:
+    if isinstance(messages, MessageBatch):
+        return messages.value_bytes
+    return sum(len(message.value) for message in messages)
+
+
+def offset_ranges(
+    messages: Sequence[TopicMessage],
+) -> dict[tuple[str, int], tuple[int, int]] | None:
+    "First and last offset per partition, None if a message has no offset"
+    if isinstance(messages, MessageBatch):
+        if not messages:
+            return {}
+        # A partition is consumed in order, so offsets of its batch are ascending
+        return {
+            (messages.topic, messages.partition): (
+                messages.offsets[0],
+                messages.offsets[-1],
+            )
+        }
+
+    ranges: dict[tuple[str, int], tuple[int, int]] = {}
+    for message in messages:
+        if message.topic is None or message.partition is None or message.offset is None:
+            return None
+        tp = (message.topic, message.partition)
+        first, last = ranges.get(tp, (message.offset, message.offset))
+        ranges[tp] = (min(first, message.offset), max(last, message.offset))
+    return ranges
@@ -1,10 +1,17 @@
+import asyncio
+import logging
 from abc import ABC, abstractmethod
-from collections.abc import Iterable
+from collections.abc import Awaitable, Callable, Iterable
+from itertools import compress
+from operator import methodcaller
 from typing import Any
 
-from asynch.connection import Connection
 from asynch.cursors import DictCursor
-from src.exceptions.exception import BatchInsertException
+from asynch.pool import Pool
+from clickhouse_cityhash.cityhash import CityHash64
+from src.exceptions.exception import BatchInsertException, ShardsInsertException
+
+logger = logging.getLogger(__name__)
 
 
 class AnalyticalRepository(ABC):
@@ -12,34 +19,368 @@ class AnalyticalRepository(ABC):
 
     @abstractmethod
     async def insert_batch(
-        self, table: str, keys: Iterable[str], data: list[dict[str, Any]]
+        self,
+        table: str,
+        keys: Iterable[str],
+        data: list[dict[str, Any]],
+        dedup_token: str | None = None,
     ) -> None:
         pass
 
+    @abstractmethod
+    async def insert_columns(
+        self,
+        table: str,
+        keys: Iterable[str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        "Insert a batch given as one list of values per key, in keys order"
+
+    @abstractmethod
+    async def active_parts(self, table: str) -> int:
+        "Most active parts in a partition of the table, grows when merges fall behind"
+
+
+class InsertSelectRepository(AnalyticalRepository):
+    "Analytical repository that also inserts rows computed from a batch by a select"
+
+    @abstractmethod
+    async def insert_select(
+        self,
+        table: str,
+        select: str,
+        structure: dict[str, str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        """Insert rows the select computes from the batch, i.e. aggregate states.
+
+        The select reads the batch from {input}, a table with the given column types,
+        and columns are given in the structure's order.
+        """
+
 
-class ClickhouseRepository(AnalyticalRepository):
+class ClickhouseRepository(InsertSelectRepository):
     KEYS_SEPARATOR = ","
 
     INSERT_BATCH_QUERY: str = "INSERT INTO {table} ({keys}) VALUES"
+    ACTIVE_PARTS_QUERY: str = """
+    SELECT max(parts) AS parts FROM (
+        SELECT count() AS parts FROM system.parts
+        WHERE active AND database = {database} AND table = %(table)s
+        GROUP BY partition
+    )
+    """
 
-    def __init__(self, connection: Connection) -> None:
+    def __init__(self, pool: Pool) -> None:
         super().__init__()
-        self.connection = connection
+        # Batches may be inserted concurrently, so every insert takes its own connection
+        self.pool = pool
 
     async def insert_batch(
-        self, table: str, keys: Iterable[str], data: list[dict[str, Any]]
+        self,
+        table: str,
+        keys: Iterable[str],
+        data: list[dict[str, Any]],
+        dedup_token: str | None = None,
     ) -> None:
         try:
-            async with self.connection.cursor(cursor=DictCursor) as cursor:
+            async with self.pool.acquire() as connection, connection.cursor(
+                cursor=DictCursor
+            ) as cursor:
                 query = self.__batch_insert_query(table, keys)
+                cursor.set_settings(self._insert_settings(dedup_token))
                 await cursor.execute(query, data)
         # TODO: catch correct clickhouse exceptions and react if possible
         except Exception as e:
             raise BatchInsertException from e
 
+    async def insert_columns(
+        self,
+        table: str,
+        keys: Iterable[str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        query = self.__batch_insert_query(table, keys)
+        await self.__execute_columnar(query, columns, dedup_token)
+
+    async def insert_select(
+        self,
+        table: str,
+        select: str,
+        structure: dict[str, str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        types = ", ".join(f"{key} {type_}" for key, type_ in structure.items())
+        query = f"INSERT INTO {table} " + select.format(input=f"input('{types}')")
+        await self.__execute_columnar(query, columns, dedup_token)
+
+    async def active_parts(self, table: str) -> int:
+        database, _, name = table.rpartition(".")
+        query = self.ACTIVE_PARTS_QUERY.format(
+            database="%(database)s" if database else "currentDatabase()"
+        )
+        async with self.pool.acquire() as connection, connection.cursor(
+            cursor=DictCursor
+        ) as cursor:
+            await cursor.execute(query, {"database": database, "table": name})
+            row = await cursor.fetchone()
+        return int(row["parts"]) if row else 0
+
+    async def __execute_columnar(
+        self, query: str, columns: list[list[Any]], dedup_token: str | None
+    ) -> None:
+        try:
+            # asynch cursors don't expose columnar mode, so go to the protocol
+            # connection directly the same way the cursor itself does
+            async with self.pool.acquire() as connection:
+                await connection._connection.execute(
+                    query,
+                    columns,
+                    settings=self._insert_settings(dedup_token),
+                    columnar=True,
+                )
+        except Exception as e:
+            raise BatchInsertException from e
+
+    def _insert_settings(self, dedup_token: str | None) -> dict[str, Any]:
+        # Clickhouse drops an insert with an already seen token, so retrying the same
+        # batch never duplicates rows
+        if dedup_token is None:
+            return {}
+        return {"insert_deduplication_token": dedup_token}
+
     @staticmethod
     def __batch_insert_query(table: str, keys: Iterable[str]) -> str:
         keys_str = ClickhouseRepository.KEYS_SEPARATOR.join(keys)
         return ClickhouseRepository.INSERT_BATCH_QUERY.format(
             table=table, keys=keys_str
         )
+
+
+class AsyncInsertClickhouseRepository(ClickhouseRepository):
+    """Lets clickhouse buffer inserts on the server with async_insert.
+
+    Inserts of many etl workers into a table are merged into one part per server
+    flush, so workers can send small batches without creating many parts. Without
+    wait_for_async_insert an insert returns once the server buffered it, so offsets
+    may be committed before the data is written and it's lost if the server crashes.
+    Inserts with a select, i.e. rollups, are never buffered by the server.
+    """
+
+    def __init__(
+        self,
+        pool: Pool,
+        wait_for_async_insert: bool = True,
+        busy_timeout_ms: int | None = None,
+    ) -> None:
+        super().__init__(pool)
+        self.wait_for_async_insert = wait_for_async_insert
+        self.busy_timeout_ms = busy_timeout_ms
+
+    def _insert_settings(self, dedup_token: str | None) -> dict[str, Any]:
+        settings = super()._insert_settings(dedup_token)
+        settings["async_insert"] = 1
+        settings["wait_for_async_insert"] = int(self.wait_for_async_insert)
+        if self.busy_timeout_ms is not None:
+            settings["async_insert_busy_timeout_ms"] = self.busy_timeout_ms
+        if dedup_token is not None:
+            # Async inserts ignore deduplication tokens unless asked for it
+            settings["async_insert_deduplicate"] = 1
+        return settings
+
+
+def sharding_expression(sharding_key: str) -> str:
+    "Sharding key of Distributed tables that puts rows on the shards shard_index does"
+    return f"cityHash64(toString({sharding_key}))"
+
+
+def shard_index(value: Any, shards_n: int) -> int:
+    """Shard of a sharding key value, stable across processes unlike hash().
+
+    Clickhouse's cityHash64 is CityHash v1.0.2, so rows inserted into shards directly
+    land where a Distributed table with sharding_expression would put them.
+    """
+    return CityHash64(str(value)) % shards_n
+
+
+class ShardedClickhouseRepository(InsertSelectRepository):
+    """Splits batches by the sharding key and inserts them into local tables of shards.
+
+    Shards are inserted into in parallel, each into its first replica that accepts
+    the insert. Going to local tables directly saves the extra hop and fan-out of
+    an insert into a Distributed table.
+    """
+
+    def __init__(
+        self,
+        shards: list[list[InsertSelectRepository]],
+        sharding_key: str,
+        local_table_suffix: str = "",
+    ) -> None:
+        super().__init__()
+        if not shards or not all(shards):
+            raise ValueError("Every shard needs at least one replica")
+        self.shards = shards
+        self.sharding_key = sharding_key
+        self.local_table_suffix = local_table_suffix
+
+    async def insert_batch(
+        self,
+        table: str,
+        keys: Iterable[str],
+        data: list[dict[str, Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        keys = list(keys)
+        shard_rows: dict[int, list[dict[str, Any]]] = {}
+        for row in data:
+            shard = shard_index(row[self.sharding_key], len(self.shards))
+            shard_rows.setdefault(shard, []).append(row)
+
+        await self.__insert_into_shards(
+            [
+                (
+                    shard,
+                    methodcaller(
+                        "insert_batch", self.__local(table), keys, rows, dedup_token
+                    ),
+                )
+                for shard, rows in shard_rows.items()
+            ]
+        )
+
+    async def insert_columns(
+        self,
+        table: str,
+        keys: Iterable[str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        keys = list(keys)
+        await self.__insert_into_shards(
+            [
+                (
+                    shard,
+                    methodcaller(
+                        "insert_columns",
+                        self.__local(table),
+                        keys,
+                        shard_columns,
+                        dedup_token,
+                    ),
+                )
+                for shard, shard_columns in self.__split_columns(keys, columns)
+            ]
+        )
+
+    async def insert_select(
+        self,
+        table: str,
+        select: str,
+        structure: dict[str, str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        await self.__insert_into_shards(
+            [
+                (
+                    shard,
+                    methodcaller(
+                        "insert_select",
+                        self.__local(table),
+                        select,
+                        structure,
+                        shard_columns,
+                        dedup_token,
+                    ),
+                )
+                for shard, shard_columns in self.__split_columns(
+                    list(structure), columns
+                )
+            ]
+        )
+
+    async def active_parts(self, table: str) -> int:
+        "Most active parts of the local table over all shards, from a replica that answers"
+
+        async def _shard_parts(replicas: list[InsertSelectRepository]) -> int:
+            for replica_n, replica in enumerate(replicas):
+                try:
+                    return await replica.active_parts(self.__local(table))
+                except Exception as e:
+                    logger.warning(
+                        f"Couldn't get active parts of replica = {replica_n}, err = {e}"
+                    )
+            return 0
+
+        return max(await asyncio.gather(*map(_shard_parts, self.shards)))
+
+    def __local(self, table: str) -> str:
+        return f"{table}{self.local_table_suffix}"
+
+    def __split_columns(
+        self, keys: list[str], columns: list[list[Any]]
+    ) -> list[tuple[int, list[list[Any]]]]:
+        row_shards = [
+            shard_index(value, len(self.shards))
+            for value in columns[keys.index(self.sharding_key)]
+        ]
+
+        shard_columns = []
+        for shard in set(row_shards):
+            mask = [row_shard == shard for row_shard in row_shards]
+            shard_columns.append(
+                (shard, [list(compress(column, mask)) for column in columns])
+            )
+        return shard_columns
+
+    async def __insert_into_shards(
+        self,
+        inserts: list[tuple[int, Callable[[InsertSelectRepository], Awaitable[None]]]],
+    ) -> None:
+        results = await asyncio.gather(
+            *[self.__insert_into_shard(shard, insert) for shard, insert in inserts],
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if not errors:
+            return
+        if not all(isinstance(error, BatchInsertException) for error in errors):
+            raise next(e for e in errors if not isinstance(e, BatchInsertException))
+
+        # Shards that took their rows mustn't get them again under another token, i.e.
+        # from the DLQ, so callers can tell which rows failed
+        failed_shards = {
+            shard
+            for (shard, _), result in zip(inserts, results)
+            if isinstance(result, BaseException)
+        }
+        raise ShardsInsertException(
+            f"Shards = {sorted(failed_shards)} failed",
+            failed_shards=failed_shards,
+            sharding_key=self.sharding_key,
+            shards_n=len(self.shards),
+        ) from errors[0]
+
+    async def __insert_into_shard(
+        self,
+        shard: int,
+        insert: Callable[[InsertSelectRepository], Awaitable[None]],
+    ) -> None:
+        error: BatchInsertException | None = None
+        for replica_n, replica in enumerate(self.shards[shard]):
+            try:
+                # Replicas of a shard share deduplication, so falling back to another
+                # replica with the same token can't duplicate rows either
+                await insert(replica)
+                return
+            except BatchInsertException as e:
+                logger.warning(
+                    f"Couldn't insert into shard = {shard}, replica = {replica_n}, err = {e.__cause__ or e!r}"
+                )
+                error = e
+        raise BatchInsertException(f"All replicas of shard = {shard} failed") from error
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager, suppress
+
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from asynch.errors import NetworkError, ServerException, SocketTimeoutError
+from src.exceptions.exception import BatchDroppedException, BatchInsertException
+from src.metrics.etl import CONSUMPTION_PAUSED, INSERT_OVERLOADS
+
+logger = logging.getLogger(__name__)
+
+# Clickhouse errors of a server or cluster that is busy rather than of a bad batch
+OVERLOAD_ERROR_CODES = frozenset(
+    {
+        159,  # TIMEOUT_EXCEEDED
+        202,  # TOO_MANY_SIMULTANEOUS_QUERIES
+        209,  # SOCKET_TIMEOUT
+        210,  # NETWORK_ERROR
+        241,  # MEMORY_LIMIT_EXCEEDED
+        242,  # TABLE_IS_READ_ONLY, i.e. replicas lost keeper
+        252,  # TOO_MANY_PARTS
+        279,  # ALL_CONNECTION_TRIES_FAILED
+        999,  # KEEPER_EXCEPTION
+    }
+)
+OVERLOAD_ERRORS = (NetworkError, SocketTimeoutError, ConnectionError, TimeoutError)
+
+
+def is_overload(error: BaseException) -> bool:
+    "Whether the insert failed because clickhouse is overloaded or unreachable"
+    cause: BaseException | None = error
+    while cause is not None:
+        if isinstance(cause, ServerException) and cause.code in OVERLOAD_ERROR_CODES:
+            return True
+        if isinstance(cause, OVERLOAD_ERRORS):
+            return True
+        cause = cause.__cause__
+    return False
+
+
+class Backpressure:
+    """Turns clickhouse overload into consumer lag instead of DLQ sends.
+
+    While any batch waits for clickhouse to recover all assigned partitions are
+    paused, the consumer keeps polling so it stays in the group, and buffered batches
+    are retried with the same deduplication token until one succeeds. A held batch
+    of revoked partitions is dropped instead of holding up the rebalance, its offsets
+    aren't committed, so the partitions' new owner consumes it again.
+    """
+
+    def __init__(
+        self,
+        consumer: AIOKafkaConsumer,
+        probe_backoff_ms: int = 1000,
+        probe_max_backoff_ms: int = 30000,
+        max_pause_sec: float = 120,
+    ) -> None:
+        self.consumer = consumer
+        self.probe_backoff_ms = probe_backoff_ms
+        self.probe_max_backoff_ms = probe_max_backoff_ms
+        # After this long an overloaded batch goes to the DLQ after all, it must stay
+        # well below max_poll_interval_ms, as consuming waits for held batches
+        self.max_pause_sec = max_pause_sec
+        self._waiting = 0
+        self._revoked: set[TopicPartition] = set()
+        # Set and replaced on every revocation, so held batches wake up to be dropped
+        self._revocation = asyncio.Event()
+
+    @property
+    def paused(self) -> bool:
+        return self._waiting > 0
+
+    def pause(self, partitions: set[TopicPartition]) -> None:
+        if partitions:
+            self.consumer.pause(*partitions)
+
+    def on_partitions_revoked(self, revoked: set[TopicPartition]) -> None:
+        self._revoked |= revoked
+        self._revocation.set()
+        self._revocation = asyncio.Event()
+
+    def on_partitions_assigned(self, assigned: set[TopicPartition]) -> None:
+        self._revoked -= assigned
+        # A rebalance resets pausing, partitions assigned meanwhile start paused too
+        if self.paused:
+            self.pause(assigned)
+
+    def _drop_if_revoked(self, partitions: set[TopicPartition], table: str) -> None:
+        if partitions & self._revoked:
+            raise BatchDroppedException(
+                f"Partitions = {partitions & self._revoked} were revoked while "
+                f"the batch waited for clickhouse, table = {table}"
+            )
+
+    async def _sleep(self, delay_sec: float) -> None:
+        "Sleeps for the delay or until partitions are revoked"
+        with suppress(TimeoutError):
+            await asyncio.wait_for(self._revocation.wait(), delay_sec)
+
+    @asynccontextmanager
+    async def _paused(self) -> AsyncIterator[None]:
+        self._waiting += 1
+        if self._waiting == 1:
+            logger.warning("Pausing consumption until clickhouse recovers")
+            self.pause(self.consumer.assignment())
+            CONSUMPTION_PAUSED.set(1)
+        try:
+            yield
+        finally:
+            self._waiting -= 1
+            if self._waiting == 0:
+                logger.warning("Resuming consumption")
+                self.consumer.resume(*self.consumer.assignment())
+                CONSUMPTION_PAUSED.set(0)
+
+    async def wait(
+        self,
+        insert: Callable[[], Awaitable[None]],
+        table: str,
+        partitions: set[TopicPartition],
+    ) -> None:
+        """Retries the insert with growing delays while clickhouse is overloaded.
+
+        Raises the last BatchInsertException if an error isn't an overload or
+        max_pause_sec is exceeded, and BatchDroppedException once any of the batch's
+        partitions is revoked.
+        """
+        INSERT_OVERLOADS.labels(table).inc()
+        self._drop_if_revoked(partitions, table)
+        deadline = time.monotonic() + self.max_pause_sec
+        delay_sec = self.probe_backoff_ms / 1000
+        async with self._paused():
+            while True:
+                await self._sleep(delay_sec)
+                self._drop_if_revoked(partitions, table)
+                try:
+                    await insert()
+                    return
+                except BatchInsertException as e:
+                    if not is_overload(e):
+                        raise
+                    if time.monotonic() >= deadline:
+                        raise
+                    INSERT_OVERLOADS.labels(table).inc()
+                    logger.warning(
+                        f"Clickhouse still overloaded, table = {table}, "
+                        f"retrying in {delay_sec}s, err = {e.__cause__ or e!r}"
+                    )
+                delay_sec = min(delay_sec * 2, self.probe_max_backoff_ms / 1000)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from collections.abc import Callable, Sequence
+
+from src.buffer.message_batch import values_size
+from src.etl.analytical_db import AnalyticalRepository
+from src.etl.topic_handler import TopicMessage
+from src.metrics.etl import ACTIVE_PARTS, BATCH_SIZE_BYTES
+
+logger = logging.getLogger(__name__)
+
+GROW_FACTOR = 1.5
+SHRINK_FACTOR = 0.5
+# Weight of the last batch in the smoothed insert latency
+LATENCY_SMOOTHING = 0.3
+
+
+class AdaptiveBatchSize:
+    """Flush threshold of a topic's buffers, adjusted after every inserted batch.
+
+    Too many active parts means merges can't keep up with inserts, so batches grow
+    regardless of latency. Otherwise batches shrink while inserts are slower than the
+    target latency, so data stays fresh, and grow while they hold fewer rows than the
+    target, so clickhouse doesn't get many small inserts. Batches flushed by linger
+    long before reaching the threshold don't make it grow, as traffic is what limits
+    them then.
+    """
+
+    def __init__(
+        self,
+        topic: str,
+        table: str,
+        repository: AnalyticalRepository,
+        initial_bytes: int,
+        min_bytes: int,
+        max_bytes: int,
+        target_latency_ms: int,
+        target_rows: int,
+        max_active_parts: int,
+    ) -> None:
+        self.topic = topic
+        self.table = table
+        self.repository = repository
+        self.min_bytes = min_bytes
+        self.max_bytes = max(max_bytes, min_bytes)
+        self.target_latency_sec = target_latency_ms / 1000
+        self.target_rows = target_rows
+        self.max_active_parts = max_active_parts
+        self.latency_sec = 0.0
+        self.active_parts = 0
+        self._size = self._clamp(initial_bytes)
+        self._on_resize_callbacks: list[Callable[[int], None]] = []
+        self._gauge = BATCH_SIZE_BYTES.labels(topic)
+        self._gauge.set(self._size)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _clamp(self, size: float) -> int:
+        return int(min(max(size, self.min_bytes), self.max_bytes))
+
+    def add_on_resize_callback(self, callback: Callable[[int], None]) -> None:
+        self._on_resize_callbacks.append(callback)
+
+    def observe(self, messages: Sequence[TopicMessage], latency_sec: float) -> None:
+        "Adjusts the size given an inserted batch and how long its insert took"
+        rows = len(messages)
+        batch_bytes = values_size(messages)
+        self.latency_sec += LATENCY_SMOOTHING * (latency_sec - self.latency_sec)
+
+        if self.active_parts >= self.max_active_parts:
+            size = self._size * GROW_FACTOR
+        elif self.latency_sec > self.target_latency_sec:
+            size = self._size * SHRINK_FACTOR
+        elif rows < self.target_rows and batch_bytes >= self._size / 2:
+            size = self._size * GROW_FACTOR
+        else:
+            return
+
+        size = self._clamp(size)
+        if size == self._size:
+            return
+        logger.info(
+            f"Batch size of topic = {self.topic} changed to {size} bytes, rows = {rows}, latency = {self.latency_sec:.3f}s, active parts = {self.active_parts}"
+        )
+        self._size = size
+        self._gauge.set(size)
+        for callback in self._on_resize_callbacks:
+            callback(size)
+
+    async def watch_parts(self, interval_sec: float) -> None:
+        "Periodically reads active parts of the table from system.parts"
+        active_parts = ACTIVE_PARTS.labels(self.table)
+        while True:
+            try:
+                self.active_parts = await self.repository.active_parts(self.table)
+                active_parts.set(self.active_parts)
+            except Exception as e:
+                logger.warning(
+                    f"Couldn't get active parts of table = {self.table}, err = {e}"
+                )
+            await asyncio.sleep(interval_sec)
@@ -1,5 +1,6 @@
 import logging
-from contextlib import asynccontextmanager
+from collections.abc import AsyncGenerator
+from contextlib import AsyncExitStack, asynccontextmanager
 
 from asynch import create_pool
 from asynch.connection import Connection
@@ -13,18 +14,46 @@ connection_pool: Pool | None = None
 
 
 @asynccontextmanager
-async def create_connection_pool(clickhouse_settings: ClickhouseSettings) -> Pool:
+async def create_connection_pool(
+    clickhouse_settings: ClickhouseSettings,
+    host: str | None = None,
+    port: int | None = None,
+    database: str | None = None,
+) -> Pool:
     logger.debug("Creating clickhouse connection pool")
     async with create_pool(
-        host=clickhouse_settings.host,
-        port=clickhouse_settings.port,
-        database=clickhouse_settings.database,
+        host=host or clickhouse_settings.host,
+        port=port or clickhouse_settings.port,
+        database=database or clickhouse_settings.database,
         user=clickhouse_settings.user,
         password=clickhouse_settings.password,
     ) as pool:
         yield pool
 
 
+@asynccontextmanager
+async def create_shard_pools(
+    clickhouse_settings: ClickhouseSettings,
+) -> AsyncGenerator[list[list[Pool]], None]:
+    "Connection pools of every replica, grouped by shard"
+    async with AsyncExitStack() as stack:
+        shards = []
+        for replicas in clickhouse_settings.shards:
+            pools = []
+            for replica in replicas:
+                host, _, port = replica.partition(":")
+                logger.debug(f"Creating clickhouse connection pool for = {replica}")
+                pools.append(
+                    await stack.enter_async_context(
+                        create_connection_pool(
+                            clickhouse_settings, host, int(port) if port else None
+                        )
+                    )
+                )
+            shards.append(pools)
+        yield shards
+
+
 @asynccontextmanager
 async def clickhouse_connection() -> Connection:
     logger.debug("Acquiring clickhouse connection")
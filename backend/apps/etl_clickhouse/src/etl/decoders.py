@@ -0,0 +1,171 @@
+import logging
+from abc import ABC, abstractmethod
+from calendar import timegm
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+import orjson
+from src.buffer.message_batch import RawValue
+from src.models.base import MAX_TIMESTAMP, MAX_UINT32, AppBaseSchema
+from src.models.view import ViewMessage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class DecodedBatch:
+    "Decoded values as one list per key, and indices of values that couldn't be decoded"
+
+    keys: list[str]
+    columns: list[list[Any]]
+    invalid: list[int] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def rows(self) -> list[dict[str, Any]]:
+        return [dict(zip(self.keys, row)) for row in zip(*self.columns)]
+
+
+def to_epoch_seconds(timestamp: datetime | float) -> int:
+    "Seconds since epoch for naive utc datetimes and epoch floats, as stored in DateTime"
+    if isinstance(timestamp, datetime):
+        return timegm(timestamp.timetuple())
+    return int(round(timestamp, 6))
+
+
+class BatchDecoder(ABC):
+    "Interface for decoders turning raw topic values into columns ready to be inserted"
+
+    def __init__(self, schema: type[AppBaseSchema]) -> None:
+        self.schema = schema
+
+    @abstractmethod
+    def decode(self, values: Sequence[RawValue]) -> DecodedBatch:
+        pass
+
+    def parse_one(self, value: RawValue) -> AppBaseSchema | None:
+        try:
+            return self.schema.parse_raw(value)
+        except Exception as e:
+            logger.error(f"Couldn't parse message = {bytes(value)!r}, err = {e}")
+            return None
+
+
+class SchemaBatchDecoder(BatchDecoder):
+    "Validates every value with the pydantic schema"
+
+    def decode(self, values: Sequence[RawValue]) -> DecodedBatch:
+        models = []
+        invalid = []
+        for i, value in enumerate(values):
+            model = self.parse_one(value)
+            if model is None:
+                invalid.append(i)
+            else:
+                models.append(model)
+
+        return DecodedBatch(
+            keys=self.schema.column_names(),
+            columns=self.schema.to_columns(models) if models else [],
+            invalid=invalid,
+        )
+
+
+class ViewBatchDecoder(BatchDecoder):
+    """Decodes views with orjson and validates them for the whole batch at once.
+
+    Values that don't pass the fast checks are validated with the pydantic schema one
+    by one, so the pydantic schema stays the single source of truth for what is valid.
+    """
+
+    def __init__(self, schema: type[AppBaseSchema] = ViewMessage) -> None:
+        super().__init__(schema)
+
+    def decode(self, values: Sequence[RawValue]) -> DecodedBatch:
+        user_ids: list[UUID] = []
+        film_ids: list[UUID] = []
+        progresses: list[Any] = []
+        timestamps: list[Any] = []
+        decoded: list[int] = []
+        slow_path: list[int] = []
+
+        for i, value in enumerate(values):
+            try:
+                row = orjson.loads(value)
+                user_id = UUID(row["user_id"])
+                film_id = UUID(row["film_id"])
+                progress_sec = row["progress_sec"]
+                timestamp = row["timestamp"]
+            except Exception:
+                slow_path.append(i)
+                continue
+
+            user_ids.append(user_id)
+            film_ids.append(film_id)
+            progresses.append(progress_sec)
+            timestamps.append(timestamp)
+            decoded.append(i)
+
+        columns: list[list[Any]] = [user_ids, film_ids, progresses, timestamps]
+        if decoded and not self._batch_is_valid(progresses, timestamps):
+            valid = [
+                self._row_is_valid(progress_sec, timestamp)
+                for progress_sec, timestamp in zip(progresses, timestamps)
+            ]
+            slow_path.extend(i for i, is_valid in zip(decoded, valid) if not is_valid)
+            decoded = [i for i, is_valid in zip(decoded, valid) if is_valid]
+            columns = [
+                [item for item, is_valid in zip(column, valid) if is_valid]
+                for column in columns
+            ]
+
+        columns[3] = [to_epoch_seconds(timestamp) for timestamp in columns[3]]
+        if not slow_path:
+            return DecodedBatch(keys=self.schema.column_names(), columns=columns)
+
+        # Slow path rows are merged back in message order, as callers map rows
+        # back to messages by the position of the row among the valid ones
+        rows = dict(zip(decoded, zip(*columns)))
+        invalid = []
+        for i in slow_path:
+            model = self.parse_one(values[i])
+            if model is None:
+                invalid.append(i)
+                continue
+            row = [getattr(model, name) for name in self.schema.column_names()]
+            row[3] = to_epoch_seconds(row[3])
+            rows[i] = tuple(row)
+
+        invalid.sort()
+        ordered = [rows[i] for i in sorted(rows)]
+        columns = [list(column) for column in zip(*ordered)] if ordered else columns
+        return DecodedBatch(
+            keys=self.schema.column_names(), columns=columns, invalid=invalid
+        )
+
+    @staticmethod
+    def _batch_is_valid(progresses: list[Any], timestamps: list[Any]) -> bool:
+        return (
+            set(map(type, progresses)) == {int}
+            and set(map(type, timestamps)) <= {int, float}
+            and 0 <= min(progresses)
+            and max(progresses) <= MAX_UINT32
+            and 0 <= min(timestamps)
+            and max(timestamps) < MAX_TIMESTAMP
+        )
+
+    @staticmethod
+    def _row_is_valid(progress_sec: Any, timestamp: Any) -> bool:
+        return (
+            isinstance(progress_sec, int)
+            and isinstance(timestamp, int | float)
+            # bool is an int subclass, but isn't a valid value here
+            and not isinstance(progress_sec, bool)
+            and not isinstance(timestamp, bool)
+            and 0 <= progress_sec <= MAX_UINT32
+            and 0 <= timestamp < MAX_TIMESTAMP
+        )
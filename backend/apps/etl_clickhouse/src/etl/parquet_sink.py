@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections.abc import Iterable
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.etl.analytical_db import AnalyticalRepository
+from src.exceptions.exception import BatchInsertException
+
+logger = logging.getLogger(__name__)
+
+TMP_SUFFIX = ".tmp"
+
+
+def _arrow_column(values: list[Any]) -> pa.Array:
+    # Arrow has no UUID type that parquet readers agree on, so they're kept as strings
+    if values and isinstance(values[0], uuid.UUID):
+        return pa.array([str(value) for value in values], type=pa.string())
+    return pa.array(values)
+
+
+def _timestamp_column(values: list[Any]) -> pa.Array:
+    "Event times as timestamps, decoders give either naive utc datetimes or epoch seconds"
+    if values and isinstance(values[0], float):
+        values = [int(value) for value in values]
+    return pa.array(values, type=pa.timestamp("s"))
+
+
+def _event_date(value: Any) -> date | None:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, int | float) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=timezone.utc).date()
+    return None
+
+
+class ParquetFileRepository(AnalyticalRepository):
+    """Writes every batch to parquet files partitioned by table and event date.
+
+    Files are laid out as <dir>/topic=<table>/date=<yyyy-mm-dd>/<name>-<n>.parquet and a
+    batch's file is rolled over to the next n once it exceeds max_file_bytes. Files are
+    written under a temporary name and renamed when complete, so readers never see a
+    partial file, and an insert returns only once its files are in place. With a dedup
+    token the files are named after it, so a retried batch overwrites its own files.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        compression: str = "zstd",
+        max_file_bytes: int = 128 * 1024 * 1024,
+        row_group_rows: int = 100_000,
+        date_column: str = "timestamp",
+    ) -> None:
+        super().__init__()
+        self.directory = Path(directory)
+        self.compression = compression
+        self.max_file_bytes = max_file_bytes
+        self.row_group_rows = row_group_rows
+        self.date_column = date_column
+
+    async def insert_batch(
+        self,
+        table: str,
+        keys: Iterable[str],
+        data: list[dict[str, Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        keys = list(keys)
+        columns = [[row[key] for row in data] for key in keys]
+        await self.insert_columns(table, keys, columns, dedup_token)
+
+    async def insert_columns(
+        self,
+        table: str,
+        keys: Iterable[str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        keys = list(keys)
+        if not columns or not columns[0]:
+            return
+        try:
+            await asyncio.to_thread(self._write, table, keys, columns, dedup_token)
+        except Exception as e:
+            raise BatchInsertException from e
+
+    async def active_parts(self, table: str) -> int:
+        # Files are never merged, so there's nothing to fall behind
+        return 0
+
+    def _partition_rows(
+        self, keys: list[str], columns: list[list[Any]]
+    ) -> dict[date, list[int]]:
+        "Row indexes by event date, rows without one go to the date of writing"
+        today = datetime.now(tz=timezone.utc).date()
+        if self.date_column not in keys:
+            return {today: list(range(len(columns[0])))}
+
+        partitions: dict[date, list[int]] = {}
+        for i, value in enumerate(columns[keys.index(self.date_column)]):
+            partitions.setdefault(_event_date(value) or today, []).append(i)
+        return partitions
+
+    def _write(
+        self,
+        table: str,
+        keys: list[str],
+        columns: list[list[Any]],
+        dedup_token: str | None,
+    ) -> None:
+        name = (dedup_token or uuid.uuid4().hex).replace(":", "-").replace("/", "-")
+        for day, rows in self._partition_rows(keys, columns).items():
+            partition_columns = columns
+            if len(rows) != len(columns[0]):
+                partition_columns = [[column[i] for i in rows] for column in columns]
+            batch = pa.table(
+                [
+                    _timestamp_column(column)
+                    if key == self.date_column
+                    else _arrow_column(column)
+                    for key, column in zip(keys, partition_columns)
+                ],
+                names=keys,
+            )
+            directory = self.directory / f"topic={table}" / f"date={day.isoformat()}"
+            directory.mkdir(parents=True, exist_ok=True)
+            self._write_files(directory, name, batch)
+
+    def _write_files(self, directory: Path, name: str, batch: pa.Table) -> None:
+        file_n = 0
+        offset = 0
+        while offset < batch.num_rows:
+            path = directory / f"{name}-{file_n}.parquet"
+            tmp_path = path.with_name(path.name + TMP_SUFFIX)
+            with pq.ParquetWriter(
+                tmp_path, batch.schema, compression=self.compression
+            ) as writer:
+                while offset < batch.num_rows:
+                    writer.write_table(batch.slice(offset, self.row_group_rows))
+                    offset += self.row_group_rows
+                    if tmp_path.stat().st_size >= self.max_file_bytes:
+                        break
+            with open(tmp_path, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            logger.debug(f"Written parquet file = {path}")
+            file_n += 1
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from collections.abc import Iterable, Sequence
+from functools import partial
+from typing import Self
+
+from aiokafka import ConsumerRebalanceListener, TopicPartition
+from src.buffer.flush_buffer import HybridFlushBuffer
+from src.buffer.message_batch import MessageBatch, RawRecord
+from src.etl.backpressure import Backpressure
+from src.etl.pipeline import BatchPipeline
+from src.etl.routing import Route
+from src.etl.sessions import WatchSessions
+from src.metrics.etl import BUFFER_BYTES, BUFFER_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionBuffers:
+    """Keeps a buffer per assigned partition, partitions of a topic share its pipeline.
+
+    A partition's buffer only ever holds messages of that partition, so it can be
+    flushed and committed on its own when the partition is revoked. Records of a
+    revoked partition that were fetched before the revocation are dropped until it's
+    assigned again, its new owner consumes them from the last commit. Buffers follow
+    the size of their topic's pipeline if it's adaptive.
+    """
+
+    def __init__(self, routes: dict[str, tuple[Route, BatchPipeline]]) -> None:
+        self._routes = routes
+        self._buffers: dict[TopicPartition, HybridFlushBuffer] = {}
+        self._revoked: set[TopicPartition] = set()
+        # Revocations close buffers while consuming may be extending them
+        self._lock = asyncio.Lock()
+        for topic, (_, pipeline) in routes.items():
+            if pipeline.batch_size is not None:
+                pipeline.batch_size.add_on_resize_callback(partial(self._resize, topic))
+
+    def _resize(self, topic: str, max_buffer_bytes: int) -> None:
+        for tp, buffer in self._buffers.items():
+            if tp.topic == topic:
+                buffer.set_max_buffer_bytes(max_buffer_bytes)
+
+    async def _open(self, tp: TopicPartition) -> HybridFlushBuffer:
+        route, pipeline = self._routes[tp.topic]
+        buffer_size = route.buffer_size
+        if pipeline.batch_size is not None:
+            buffer_size = pipeline.batch_size.size
+        buffer = await HybridFlushBuffer(
+            buffer_size,
+            route.max_messages,
+            route.linger_ms,
+            new_batch=partial(MessageBatch, tp.topic, tp.partition),
+        ).__aenter__()
+        buffer.add_on_flush_callback(partial(self._submit, tp, pipeline))
+        self._buffers[tp] = buffer
+        # Gauges read the buffer on scrape, so pushes don't pay for metrics
+        BUFFER_BYTES.labels(tp.topic, tp.partition).set_function(
+            buffer.buffer_data_size
+        )
+        BUFFER_MESSAGES.labels(tp.topic, tp.partition).set_function(
+            buffer.buffer_length
+        )
+        logger.info(f"Opened buffer for partition = {tp}")
+        return buffer
+
+    async def _submit(
+        self, tp: TopicPartition, pipeline: BatchPipeline, messages: MessageBatch
+    ) -> None:
+        if tp in self._revoked:
+            logger.warning(
+                f"Skipped batch of revoked partition = {tp}, n = {len(messages)}"
+            )
+            return
+        await pipeline.submit(messages)
+
+    async def extend(self, tp: TopicPartition, records: Sequence[RawRecord]) -> None:
+        "Copies records fetched from the partition into its batch in one push"
+        async with self._lock:
+            if tp in self._revoked:
+                logger.warning(
+                    f"Skipped records of revoked partition = {tp}, n = {len(records)}"
+                )
+                return
+            buffer = self._buffers.get(tp)
+            if buffer is None:
+                buffer = await self._open(tp)
+            await buffer.extend(
+                records, sum(len(record.value or b"") for record in records)
+            )
+
+    def assign(self, partitions: Iterable[TopicPartition]) -> None:
+        "Buffers partitions again, i.e. revoked ones assigned back to this consumer"
+        self._revoked.difference_update(partitions)
+
+    async def close(self, partitions: Iterable[TopicPartition]) -> None:
+        "Flushes buffers of the partitions and waits until their offsets are committed"
+        partitions = list(partitions)
+        topics = set()
+        async with self._lock:
+            for tp in partitions:
+                buffer = self._buffers.pop(tp, None)
+                if buffer is not None:
+                    await buffer.__aexit__(None, None, None)
+                    BUFFER_BYTES.remove(tp.topic, str(tp.partition))
+                    BUFFER_MESSAGES.remove(tp.topic, str(tp.partition))
+                    topics.add(tp.topic)
+                    logger.info(f"Closed buffer for partition = {tp}")
+                # After the last flush, so nothing of the partition is submitted later
+                self._revoked.add(tp)
+
+        for topic in topics:
+            _, pipeline = self._routes[topic]
+            await pipeline.join()
+            pipeline.committer.forget_dropped(partitions)
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *excinfo) -> None:
+        await self.close(list(self._buffers))
+
+
+class FlushOnRevokeListener(ConsumerRebalanceListener):
+    """Commits everything consumed from partitions before they move to another worker.
+
+    The consumer doesn't rejoin the group until on_partitions_revoked returns, so the
+    new owner of a partition starts right after the last persisted message.
+    """
+
+    def __init__(
+        self,
+        buffers: PartitionBuffers,
+        backpressure: Backpressure | None = None,
+        sessions: Sequence[WatchSessions] = (),
+    ) -> None:
+        self.buffers = buffers
+        self.backpressure = backpressure
+        self.sessions = sessions
+
+    async def on_partitions_revoked(self, revoked: set[TopicPartition]) -> None:
+        logger.info(f"Partitions revoked = {revoked}")
+        if self.backpressure is not None:
+            # Batches held until clickhouse recovers would outlast the rebalance
+            self.backpressure.on_partitions_revoked(revoked)
+        await self.buffers.close(revoked)
+        # Closing waits for the partitions' last batches, sessions are checkpointed
+        for sessions in self.sessions:
+            await sessions.forget(revoked)
+
+    async def on_partitions_assigned(self, assigned: set[TopicPartition]) -> None:
+        logger.info(f"Partitions assigned = {assigned}")
+        self.buffers.assign(assigned)
+        if self.backpressure is not None:
+            self.backpressure.on_partitions_assigned(assigned)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from typing import Self
+
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from src.buffer.message_batch import offset_ranges
+from src.etl.batch_size import AdaptiveBatchSize
+from src.etl.topic_handler import TopicMessage
+from src.exceptions.exception import BatchDroppedException
+from src.metrics.etl import FLUSH_DURATION, LAST_COMMIT
+
+logger = logging.getLogger(__name__)
+
+
+def batch_offsets(messages: Sequence[TopicMessage]) -> dict[TopicPartition, int]:
+    "Offsets to commit once the batch is persisted, i.e. the next offset per partition"
+    ranges = offset_ranges(messages) or {}
+    return {
+        TopicPartition(topic, partition): last + 1
+        for (topic, partition), (_, last) in ranges.items()
+    }
+
+
+class OffsetCommitter:
+    """Commits offsets of batches strictly in the order the batches were submitted.
+
+    Batches may be persisted out of order, so a batch's offsets are committed only
+    once every batch submitted before it is persisted as well. Once a batch is
+    dropped, offsets of its partitions aren't committed until they're forgotten.
+    """
+
+    def __init__(self, consumer: AIOKafkaConsumer) -> None:
+        self.consumer = consumer
+        self._next_sequence = 0
+        self._commit_sequence = 0
+        self._persisted: dict[int, dict[TopicPartition, int]] = {}
+        self._dropped: set[TopicPartition] = set()
+        self._lock = asyncio.Lock()
+
+    def register(self) -> int:
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        return sequence
+
+    async def persisted(
+        self, sequence: int, offsets: dict[TopicPartition, int]
+    ) -> None:
+        async with self._lock:
+            self._persisted[sequence] = offsets
+            await self._commit_ready()
+
+    async def dropped(self, sequence: int, partitions: set[TopicPartition]) -> None:
+        "The batch won't be persisted, so later offsets of its partitions mustn't be either"
+        async with self._lock:
+            self._dropped |= partitions
+            self._persisted[sequence] = {}
+            await self._commit_ready()
+
+    def forget_dropped(self, partitions: Iterable[TopicPartition]) -> None:
+        "Commits the partitions again, once no batch of their previous assignment is left"
+        self._dropped.difference_update(partitions)
+
+    async def _commit_ready(self) -> None:
+        to_commit: dict[TopicPartition, int] = {}
+        while self._commit_sequence in self._persisted:
+            for tp, offset in self._persisted.pop(self._commit_sequence).items():
+                if tp not in self._dropped:
+                    to_commit[tp] = max(to_commit.get(tp, 0), offset)
+            self._commit_sequence += 1
+
+        if to_commit:
+            logger.debug(f"Committing offsets = {to_commit}")
+            await self.consumer.commit(to_commit)
+            for topic in {tp.topic for tp in to_commit}:
+                LAST_COMMIT.labels(topic).set_to_current_time()
+
+
+class BatchPipeline:
+    """Processes flushed batches in the background, so consuming doesn't wait for inserts.
+
+    At most max_in_flight batches are processed at the same time, submitting one more
+    waits until a slot is free. If a batch fails, its offsets and offsets of all later
+    batches are never committed, and the error is raised on the next submit or on exit.
+    Offsets aren't committed at all without commit_offsets, i.e. when replaying.
+    With batch_size, insert latency of every batch adjusts the topic's flush threshold.
+    """
+
+    def __init__(
+        self,
+        consumer: AIOKafkaConsumer,
+        handle_batch: Callable[[Sequence[TopicMessage]], Awaitable[None]],
+        max_in_flight: int = 2,
+        topic: str = "",
+        commit_offsets: bool = True,
+        batch_size: AdaptiveBatchSize | None = None,
+    ) -> None:
+        self.handle_batch = handle_batch
+        self.commit_offsets = commit_offsets
+        self.batch_size = batch_size
+        self.flush_duration = FLUSH_DURATION.labels(topic)
+        self.committer = OffsetCommitter(consumer)
+        self._slots = asyncio.Semaphore(max(max_in_flight, 1))
+        self._tasks: set[asyncio.Task] = set()
+        self._error: BaseException | None = None
+
+    def _raise_on_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    async def submit(self, messages: Sequence[TopicMessage]) -> None:
+        started = time.perf_counter()
+        self._raise_on_error()
+        await self._slots.acquire()
+        self._raise_on_error()
+
+        sequence = self.committer.register()
+        task = asyncio.create_task(self._process(sequence, messages, started))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(
+        self, sequence: int, messages: Sequence[TopicMessage], started: float
+    ) -> None:
+        try:
+            handle_started = time.perf_counter()
+            try:
+                await self.handle_batch(messages)
+            except BatchDroppedException as e:
+                # Its partitions were revoked, their new owner consumes it again
+                logger.warning(f"Dropped batch, n = {len(messages)}, err = {e}")
+                if self.commit_offsets:
+                    await self.committer.dropped(sequence, set(batch_offsets(messages)))
+                return
+            if self.batch_size is not None:
+                self.batch_size.observe(messages, time.perf_counter() - handle_started)
+            if self.commit_offsets:
+                await self.committer.persisted(sequence, batch_offsets(messages))
+            self.flush_duration.observe(time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"Couldn't process batch, n = {len(messages)}, err = {e}")
+            if self._error is None:
+                self._error = e
+        finally:
+            self._slots.release()
+
+    async def join(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._raise_on_error()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *excinfo) -> None:
+        await self.join()
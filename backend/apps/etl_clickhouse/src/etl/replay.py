@@ -0,0 +1,185 @@
+import logging
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, TopicPartition
+from src.buffer.message_batch import MessageBatch
+from src.etl.pipeline import BatchPipeline
+from src.etl.routing import get_routes
+from src.etl.run import create_repository, get_rollups, get_table
+from src.etl.topic_handler import get_topic_handler
+from src.settings.app import AppSettings
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL_SEC = 5
+
+
+def parse_timestamp(value: str) -> int:
+    "Milliseconds since epoch from either milliseconds or an ISO datetime, utc if naive"
+    if value.isdigit():
+        return int(value)
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+@dataclass(frozen=True, slots=True)
+class ReplayBounds:
+    "Where to start and stop replaying, timestamps are in milliseconds"
+
+    from_offset: int | None = None
+    from_timestamp: int | None = None
+    to_offset: int | None = None
+    to_timestamp: int | None = None
+
+
+async def resolve_offsets(
+    consumer: AIOKafkaConsumer, partitions: list[TopicPartition], bounds: ReplayBounds
+) -> tuple[dict[TopicPartition, int], dict[TopicPartition, int]]:
+    "Start offsets and exclusive end offsets of the partitions"
+    beginning = await consumer.beginning_offsets(partitions)
+    # Without an end bound replay stops at the end of the topic as of now,
+    # so it exits even while the topic keeps growing
+    end = await consumer.end_offsets(partitions)
+
+    async def _for_time(timestamp: int) -> dict[TopicPartition, int]:
+        found = await consumer.offsets_for_times({tp: timestamp for tp in partitions})
+        return {
+            tp: end[tp] if offset is None else offset.offset
+            for tp, offset in found.items()
+        }
+
+    if bounds.from_timestamp is not None:
+        start = await _for_time(bounds.from_timestamp)
+    elif bounds.from_offset is not None:
+        start = {tp: max(bounds.from_offset, beginning[tp]) for tp in partitions}
+    else:
+        start = beginning
+
+    if bounds.to_timestamp is not None:
+        end = await _for_time(bounds.to_timestamp)
+    elif bounds.to_offset is not None:
+        end = {tp: min(bounds.to_offset, end[tp]) for tp in partitions}
+
+    return start, end
+
+
+async def run_replay(
+    app_settings: AppSettings,
+    topic: str,
+    bounds: ReplayBounds,
+    partition_ids: list[int] | None = None,
+    batch_size: int = 100_000,
+    max_in_flight: int = 4,
+) -> None:
+    """Inserts a range of a topic again, i.e. to recover from a bad deploy.
+
+    Partitions are assigned manually without a consumer group, so the live etl and its
+    committed offsets aren't affected.
+    """
+    routes = {route.topic: route for route in get_routes(app_settings)}
+    if topic not in routes:
+        raise ValueError(f"No route configured for topic = {topic}")
+    route = routes[topic]
+
+    async with AIOKafkaConsumer(
+        bootstrap_servers=[app_settings.kafka.dsn],
+        group_id=None,
+        enable_auto_commit=False,
+        max_partition_fetch_bytes=16 * 1024 * 1024,
+    ) as consumer, AIOKafkaProducer(
+        bootstrap_servers=[app_settings.kafka.dsn],
+        compression_type="gzip",
+        enable_idempotence=True,
+    ) as producer, AsyncExitStack() as stack:
+        repository = await create_repository(stack, app_settings)
+        handler = get_topic_handler(
+            topic=route.topic,
+            consumer=consumer,
+            producer=producer,
+            dlq_topic=route.dlq,
+            repository=repository,
+            db_table=get_table(route, app_settings),
+            columnar_insert=app_settings.etl.columnar_insert,
+            insert_retries=app_settings.etl.insert_retries,
+            retry_backoff_ms=app_settings.etl.insert_retry_backoff_ms,
+            rollups=get_rollups(route, app_settings),
+            insert_raw=app_settings.etl.raw_insert,
+        )
+        pipeline = await stack.enter_async_context(
+            BatchPipeline(
+                consumer=consumer,
+                handle_batch=handler.handle_batch,
+                max_in_flight=max_in_flight,
+                topic=topic,
+                commit_offsets=False,
+            )
+        )
+
+        # Fetches metadata, so partitions of the topic are known
+        await consumer.topics()
+        partitions = [
+            TopicPartition(topic, partition)
+            for partition in sorted(
+                partition_ids or consumer.partitions_for_topic(topic) or []
+            )
+        ]
+        if not partitions:
+            raise ValueError(f"No partitions found for topic = {topic}")
+
+        consumer.assign(partitions)
+        start, end = await resolve_offsets(consumer, partitions, bounds)
+        remaining = {tp for tp in partitions if start[tp] < end[tp]}
+        for tp in partitions:
+            consumer.seek(tp, start[tp])
+        for tp in set(partitions) - remaining:
+            consumer.pause(tp)
+
+        total = sum(max(end[tp] - start[tp], 0) for tp in partitions)
+        logger.info(
+            f"Replaying topic = {topic}, partitions = {[tp.partition for tp in partitions]}, messages = {total}"
+        )
+
+        started = last_report = time.monotonic()
+        replayed = 0
+        # Records are buffered raw per partition, as by the live etl
+        batches: dict[TopicPartition, MessageBatch] = {}
+        while remaining:
+            records = await consumer.getmany(*remaining, timeout_ms=1000)
+            for tp, tp_records in records.items():
+                if tp not in batches:
+                    batches[tp] = MessageBatch(tp.topic, tp.partition)
+                # Tombstones have nothing to insert
+                batches[tp].extend(
+                    record
+                    for record in tp_records
+                    if record.offset < end[tp] and record.value is not None
+                )
+
+            for tp in list(remaining):
+                if await consumer.position(tp) >= end[tp]:
+                    consumer.pause(tp)
+                    remaining.discard(tp)
+
+            for tp, batch in list(batches.items()):
+                if len(batch) >= batch_size or (batch and tp not in remaining):
+                    replayed += len(batch)
+                    await pipeline.submit(batch)
+                    del batches[tp]
+
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL_SEC:
+                last_report = now
+                logger.info(
+                    f"Replayed {replayed}/{total} messages, {replayed / (now - started):,.0f} msgs/sec"
+                )
+
+        await pipeline.join()
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Replay finished, messages = {replayed}, {elapsed:.1f}s, {replayed / max(elapsed, 1e-9):,.0f} msgs/sec"
+        )
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+from collections.abc import Sequence
+from contextlib import AsyncExitStack
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from src.etl.routing import Route, get_routes
+from src.etl.run import create_repository, get_rollups, get_table
+from src.etl.topic_handler import (
+    KafkaToDatabaseHandler,
+    TopicMessage,
+    get_topic_handler,
+    insert_dedup_token,
+)
+from src.exceptions.exception import BatchInsertException
+from src.metrics.etl import DLQ_SENDS
+from src.settings.app import AppSettings
+
+logger = logging.getLogger(__name__)
+
+ATTEMPTS_HEADER = "etl_attempts"
+
+
+def message_attempts(message: TopicMessage) -> int:
+    "How many times the message was reprocessed already, 0 for messages from the etl"
+    for key, value in message.headers:
+        if key == ATTEMPTS_HEADER:
+            return int(value)
+    return 0
+
+
+class DLQReprocessor:
+    """Re-runs DLQ messages of a route through the etl parse and insert path.
+
+    Messages failing to insert go back to the DLQ with their attempts counter
+    increased until they run out of attempts, then they are parked. Messages that
+    can't be parsed are parked right away, as retrying them can't change the outcome.
+    """
+
+    def __init__(
+        self,
+        route: Route,
+        handler: KafkaToDatabaseHandler,
+        producer: AIOKafkaProducer,
+        max_attempts: int,
+    ) -> None:
+        self.route = route
+        self.handler = handler
+        self.producer = producer
+        self.max_attempts = max_attempts
+
+    async def reprocess(self, messages: Sequence[TopicMessage]) -> int:
+        "Returns the number of messages sent back to the DLQ"
+        batch, invalid = self.handler.parse_messages(messages)
+        failed: list[TopicMessage] = []
+        if len(batch):
+            try:
+                await self.handler.insert_with_retries(
+                    batch, insert_dedup_token(messages)
+                )
+            except BatchInsertException as e:
+                logger.error(
+                    f"Couldn't reinsert dlq batch = {self.route.dlq}, n = {len(batch)}, err = {e}"
+                )
+                failed = [
+                    messages[i] for i in self.handler.failed_indices(messages, batch, e)
+                ]
+
+        to_park = list(invalid)
+        to_requeue = []
+        for message in failed:
+            if message_attempts(message) + 1 >= self.max_attempts:
+                to_park.append(message)
+            else:
+                to_requeue.append(message)
+
+        # Offsets are committed by the caller, so sends must be delivered first
+        await asyncio.gather(
+            self._send(self.route.parking, to_park),
+            self._send(self.route.dlq, to_requeue),
+        )
+        return len(to_requeue)
+
+    async def _send(self, topic: str, messages: list[TopicMessage]) -> None:
+        if not messages:
+            return
+
+        logger.warning(f"Sending dlq messages to topic = {topic}, n = {len(messages)}")
+        deliveries = []
+        for message in messages:
+            attempts = str(message_attempts(message) + 1).encode()
+            headers = [(k, v) for k, v in message.headers if k != ATTEMPTS_HEADER]
+            deliveries.append(
+                await self.producer.send(
+                    topic=topic,
+                    key=message.key,
+                    value=message.value,
+                    headers=[*headers, (ATTEMPTS_HEADER, attempts)],
+                )
+            )
+        await asyncio.gather(*deliveries)
+        DLQ_SENDS.labels(topic).inc(len(messages))
+
+
+async def run_reprocessor(app_settings: AppSettings):
+    logger.info("Starting clickhouse etl dlq reprocessor")
+
+    settings = app_settings.reprocessor
+    routes = get_routes(app_settings)
+    dlq_topics = [route.dlq for route in routes]
+    if len(set(dlq_topics)) != len(dlq_topics):
+        raise ValueError(f"Routes must have distinct dlq topics, got = {dlq_topics}")
+
+    async with AIOKafkaConsumer(
+        *dlq_topics,
+        bootstrap_servers=[app_settings.kafka.dsn],
+        group_id=settings.consumer_group_id,
+        auto_offset_reset="earliest",
+        enable_auto_commit=False,
+    ) as consumer, AIOKafkaProducer(
+        bootstrap_servers=[app_settings.kafka.dsn],
+        compression_type="gzip",
+        enable_idempotence=True,
+    ) as producer, AsyncExitStack() as stack:
+        repository = await create_repository(stack, app_settings)
+        reprocessors = {
+            route.dlq: DLQReprocessor(
+                route=route,
+                handler=get_topic_handler(
+                    topic=route.topic,
+                    consumer=consumer,
+                    producer=producer,
+                    dlq_topic=route.dlq,
+                    repository=repository,
+                    db_table=get_table(route, app_settings),
+                    columnar_insert=app_settings.etl.columnar_insert,
+                    insert_retries=app_settings.etl.insert_retries,
+                    retry_backoff_ms=app_settings.etl.insert_retry_backoff_ms,
+                    rollups=get_rollups(route, app_settings),
+                    insert_raw=app_settings.etl.raw_insert,
+                    # Sessions aren't rebuilt from DLQ messages, as they come
+                    # out of order and long after their sessions were closed
+                ),
+                producer=producer,
+                max_attempts=settings.max_attempts,
+            )
+            for route in routes
+        }
+
+        logger.info(f"Starting to reprocess dlq topics = {dlq_topics}")
+
+        backoff_sec = 0.0
+        while True:
+            records = await consumer.getmany(
+                timeout_ms=1000, max_records=settings.batch_size
+            )
+            if not records:
+                continue
+
+            started = time.monotonic()
+            consumed = 0
+            requeued = 0
+            for tp, tp_records in records.items():
+                messages = [
+                    TopicMessage(
+                        key=record.key,
+                        value=record.value,
+                        topic=record.topic,
+                        partition=record.partition,
+                        offset=record.offset,
+                        headers=tuple(record.headers),
+                    )
+                    for record in tp_records
+                ]
+                requeued += await reprocessors[tp.topic].reprocess(messages)
+                consumed += len(messages)
+
+            await consumer.commit()
+            logger.info(
+                f"Reprocessed dlq messages, n = {consumed}, requeued = {requeued}"
+            )
+
+            # Keep the reinsert rate under the limit, so draining a large DLQ doesn't
+            # compete with the live etl for clickhouse
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(
+                max(consumed / max(settings.max_messages_per_sec, 1) - elapsed, 0)
+            )
+
+            if requeued:
+                backoff_sec = min(
+                    max(backoff_sec * 2, settings.backoff_ms / 1000),
+                    settings.max_backoff_ms / 1000,
+                )
+                logger.warning(f"Dlq messages keep failing, backing off {backoff_sec}s")
+                await asyncio.sleep(backoff_sec)
+            else:
+                backoff_sec = 0.0
@@ -0,0 +1,138 @@
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from typing import Any
+
+from src.etl.analytical_db import InsertSelectRepository
+from src.etl.decoders import DecodedBatch, to_epoch_seconds
+
+SECONDS_IN_MINUTE = 60
+SECONDS_IN_DAY = 24 * 60 * 60
+EPOCH_DATE = date(1970, 1, 1)
+
+
+class Rollup(ABC):
+    "Interface for summaries of view batches inserted alongside or instead of raw rows"
+
+    def __init__(self, table: str) -> None:
+        self.table = table
+
+    @abstractmethod
+    async def insert(
+        self,
+        repository: InsertSelectRepository,
+        batch: DecodedBatch,
+        dedup_token: str | None = None,
+    ) -> int:
+        "Returns the number of inserted rows"
+
+
+def _view_columns(batch: DecodedBatch) -> tuple[list, list, list, list[int]]:
+    columns = dict(zip(batch.keys, batch.columns))
+    return (
+        columns["user_id"],
+        columns["film_id"],
+        columns["progress_sec"],
+        [to_epoch_seconds(timestamp) for timestamp in columns["timestamp"]],
+    )
+
+
+class FilmMinuteRollup(Rollup):
+    """Views, max progress and distinct users per film and minute.
+
+    Distinct users are kept as uniq states, which python can't build, so the batch is
+    reduced to one row per film, minute and user here and clickhouse aggregates those.
+    """
+
+    STRUCTURE = {
+        "film_id": "UUID",
+        "minute": "DateTime",
+        "user_id": "UUID",
+        "views": "UInt64",
+        "max_progress_sec": "UInt32",
+    }
+    SELECT = """
+    SELECT film_id, minute, sum(views), max(max_progress_sec), uniqState(user_id)
+    FROM {input}
+    GROUP BY film_id, minute
+    """
+
+    async def insert(
+        self,
+        repository: InsertSelectRepository,
+        batch: DecodedBatch,
+        dedup_token: str | None = None,
+    ) -> int:
+        groups: dict[tuple[Any, int, Any], list[int]] = {}
+        for user_id, film_id, progress_sec, timestamp in zip(*_view_columns(batch)):
+            minute = timestamp - timestamp % SECONDS_IN_MINUTE
+            group = groups.get((film_id, minute, user_id))
+            if group is None:
+                groups[(film_id, minute, user_id)] = [1, progress_sec]
+            else:
+                group[0] += 1
+                group[1] = max(group[1], progress_sec)
+
+        if not groups:
+            return 0
+        film_ids, minutes, user_ids = map(list, zip(*groups))
+        views, max_progresses = map(list, zip(*groups.values()))
+        await repository.insert_select(
+            table=self.table,
+            select=self.SELECT,
+            structure=self.STRUCTURE,
+            columns=[film_ids, minutes, user_ids, views, max_progresses],
+            dedup_token=dedup_token,
+        )
+        return len(groups)
+
+
+class UserFilmDayRollup(Rollup):
+    "Views, max progress and first and last view time per user, film and day"
+
+    KEYS = (
+        "user_id",
+        "film_id",
+        "day",
+        "views",
+        "max_progress_sec",
+        "first_view",
+        "last_view",
+    )
+
+    async def insert(
+        self,
+        repository: InsertSelectRepository,
+        batch: DecodedBatch,
+        dedup_token: str | None = None,
+    ) -> int:
+        groups: dict[tuple[Any, Any, int], list[int]] = {}
+        for user_id, film_id, progress_sec, timestamp in zip(*_view_columns(batch)):
+            day = timestamp // SECONDS_IN_DAY
+            group = groups.get((user_id, film_id, day))
+            if group is None:
+                groups[(user_id, film_id, day)] = [
+                    1,
+                    progress_sec,
+                    timestamp,
+                    timestamp,
+                ]
+            else:
+                group[0] += 1
+                group[1] = max(group[1], progress_sec)
+                group[2] = min(group[2], timestamp)
+                group[3] = max(group[3], timestamp)
+
+        if not groups:
+            return 0
+        await repository.insert_columns(
+            table=self.table,
+            keys=self.KEYS,
+            columns=[
+                [user_id for user_id, _, _ in groups],
+                [film_id for _, film_id, _ in groups],
+                [EPOCH_DATE + timedelta(days=day) for _, _, day in groups],
+                *map(list, zip(*groups.values())),
+            ],
+            dedup_token=dedup_token,
+        )
+        return len(groups)
@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+
+from src.settings.app import AppSettings
+from src.settings.etl import TopicRoute
+
+
+@dataclass(frozen=True, slots=True)
+class Route:
+    "Topic route with DLQ and buffer limits resolved to defaults"
+
+    topic: str
+    table: str
+    dlq: str
+    # Where the DLQ reprocessor moves messages it gave up on
+    parking: str
+    buffer_size: int
+    max_messages: int
+    linger_ms: int
+
+
+def get_routes(app_settings: AppSettings) -> list[Route]:
+    etl = app_settings.etl
+    if not etl.routes:
+        return [
+            Route(
+                topic=app_settings.kafka.topic,
+                table=app_settings.clickhouse.table,
+                dlq=app_settings.kafka.dlq,
+                parking=f"{app_settings.kafka.dlq}_parked",
+                buffer_size=etl.buffer_size,
+                max_messages=etl.max_messages,
+                linger_ms=etl.linger_ms,
+            )
+        ]
+
+    return [resolve_route(route, app_settings) for route in etl.routes]
+
+
+def resolve_route(route: TopicRoute, app_settings: AppSettings) -> Route:
+    etl = app_settings.etl
+
+    def _or_default(value: int | None, default: int) -> int:
+        return default if value is None else value
+
+    # Every topic gets its own DLQ so messages can be reprocessed per topic
+    dlq = route.dlq or f"{route.topic}_dlq"
+    return Route(
+        topic=route.topic,
+        table=route.table,
+        dlq=dlq,
+        parking=route.parking or f"{dlq}_parked",
+        buffer_size=_or_default(route.buffer_size, etl.buffer_size),
+        max_messages=_or_default(route.max_messages, etl.max_messages),
+        linger_ms=_or_default(route.linger_ms, etl.linger_ms),
+    )
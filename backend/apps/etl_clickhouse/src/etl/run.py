@@ -1,57 +1,299 @@
+import asyncio
 import logging
+from contextlib import AsyncExitStack
 
 from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
-from src.buffer.flush_buffer import get_flushable_buffer
+from aiokafka.errors import ConsumerStoppedError, RecordTooLargeError
+from asynch.pool import Pool
 from src.etl import clickhouse_connection
-from src.etl.analytical_db import ClickhouseRepository
-from src.etl.topic_handler import TopicMessage, get_topic_handler
+from src.etl.analytical_db import (
+    AnalyticalRepository,
+    AsyncInsertClickhouseRepository,
+    ClickhouseRepository,
+    ShardedClickhouseRepository,
+)
+from src.etl.backpressure import Backpressure
+from src.etl.batch_size import AdaptiveBatchSize
+from src.etl.partitions import FlushOnRevokeListener, PartitionBuffers
+from src.etl.pipeline import BatchPipeline
+from src.etl.rollups import FilmMinuteRollup, Rollup, UserFilmDayRollup
+from src.etl.routing import Route, get_routes
+from src.etl.sessions import WatchSessions
+from src.etl.topic_handler import TOPIC_SCHEMAS_MAP, get_topic_handler
+from src.metrics.etl import MESSAGES_CONSUMED
+from src.metrics.lag import report_consumer_lag
+from src.models.view import ViewMessage
 from src.settings.app import AppSettings
+from src.settings.etl import Sink
+from src.settings.kafka import KafkaSettings
 
 logger = logging.getLogger(__name__)
 
 
+async def create_repository(
+    stack: AsyncExitStack, app_settings: AppSettings
+) -> AnalyticalRepository:
+    if app_settings.etl.sink == Sink.PARQUET:
+        if app_settings.etl.rollups or app_settings.etl.sessions:
+            raise ValueError(
+                "Rollups and sessions can only be inserted into clickhouse"
+            )
+        # pyarrow is only needed by this sink, so it's an optional dependency
+        from src.etl.parquet_sink import ParquetFileRepository
+
+        parquet = app_settings.parquet
+        return ParquetFileRepository(
+            directory=parquet.directory,
+            compression=parquet.compression,
+            max_file_bytes=parquet.max_file_bytes,
+            row_group_rows=parquet.row_group_rows,
+        )
+
+    clickhouse = app_settings.clickhouse
+
+    def _repository(pool: Pool) -> ClickhouseRepository:
+        if clickhouse.async_insert:
+            return AsyncInsertClickhouseRepository(
+                pool,
+                wait_for_async_insert=clickhouse.wait_for_async_insert,
+                busy_timeout_ms=clickhouse.async_insert_busy_timeout_ms,
+            )
+        return ClickhouseRepository(pool)
+
+    if not clickhouse.shards:
+        pool = await stack.enter_async_context(
+            clickhouse_connection.create_connection_pool(clickhouse)
+        )
+        clickhouse_connection.connection_pool = pool
+        return _repository(pool)
+
+    shard_pools = await stack.enter_async_context(
+        clickhouse_connection.create_shard_pools(clickhouse)
+    )
+    return ShardedClickhouseRepository(
+        shards=[
+            [_repository(replica_pool) for replica_pool in replica_pools]
+            for replica_pools in shard_pools
+        ],
+        sharding_key=clickhouse.sharding_key,
+        local_table_suffix=clickhouse.local_table_suffix,
+    )
+
+
+def get_table(route: Route, app_settings: AppSettings) -> str:
+    "Files are partitioned by topic, route tables only apply to clickhouse"
+    if app_settings.etl.sink == Sink.PARQUET:
+        return route.topic
+    return route.table
+
+
+def get_rollups(route: Route, app_settings: AppSettings) -> list[Rollup]:
+    etl = app_settings.etl
+    if (
+        etl.sink != Sink.CLICKHOUSE
+        or not etl.rollups
+        or TOPIC_SCHEMAS_MAP.get(route.topic) is not ViewMessage
+    ):
+        return []
+    return [
+        FilmMinuteRollup(etl.film_minute_table),
+        UserFilmDayRollup(etl.user_film_day_table),
+    ]
+
+
+def get_sessions(route: Route, app_settings: AppSettings) -> WatchSessions | None:
+    etl = app_settings.etl
+    if (
+        etl.sink != Sink.CLICKHOUSE
+        or not etl.sessions
+        or TOPIC_SCHEMAS_MAP.get(route.topic) is not ViewMessage
+    ):
+        return None
+    return WatchSessions(
+        table=etl.sessions_table,
+        state_dir=etl.sessions_state_dir,
+        gap_sec=etl.session_gap_sec,
+        max_open=etl.sessions_max_open,
+    )
+
+
+def get_batch_size(
+    stack: AsyncExitStack,
+    route: Route,
+    app_settings: AppSettings,
+    repository: AnalyticalRepository,
+) -> AdaptiveBatchSize | None:
+    etl = app_settings.etl
+    if not etl.adaptive_batch_size:
+        return None
+    batch_size = AdaptiveBatchSize(
+        topic=route.topic,
+        table=route.table,
+        repository=repository,
+        initial_bytes=route.buffer_size,
+        min_bytes=etl.adaptive_min_bytes,
+        max_bytes=etl.adaptive_max_bytes,
+        target_latency_ms=etl.adaptive_target_latency_ms,
+        target_rows=etl.adaptive_target_rows,
+        max_active_parts=etl.adaptive_max_active_parts,
+    )
+    parts_task = asyncio.create_task(
+        batch_size.watch_parts(etl.adaptive_parts_interval_ms / 1000)
+    )
+    stack.callback(parts_task.cancel)
+    return batch_size
+
+
+def get_backpressure(
+    consumer: AIOKafkaConsumer, app_settings: AppSettings
+) -> Backpressure | None:
+    etl = app_settings.etl
+    if not etl.backpressure:
+        return None
+    # Submitting a flushed batch waits while held batches fill the pipeline, so the
+    # consumer mustn't stop polling long enough to be evicted from the group
+    max_pause_limit_sec = app_settings.kafka.max_poll_interval_ms / 1000 / 2
+    if not 0 < etl.backpressure_max_pause_sec <= max_pause_limit_sec:
+        raise ValueError(
+            "ETL_BACKPRESSURE_MAX_PAUSE_SEC must be positive and at most half of "
+            f"KAFKA_MAX_POLL_INTERVAL_MS, got = {etl.backpressure_max_pause_sec}"
+        )
+    return Backpressure(
+        consumer,
+        probe_backoff_ms=etl.backpressure_probe_backoff_ms,
+        probe_max_backoff_ms=etl.backpressure_probe_max_backoff_ms,
+        max_pause_sec=etl.backpressure_max_pause_sec,
+    )
+
+
+async def start_pipeline(
+    stack: AsyncExitStack,
+    route: Route,
+    app_settings: AppSettings,
+    consumer: AIOKafkaConsumer,
+    producer: AIOKafkaProducer,
+    repository: AnalyticalRepository,
+    backpressure: Backpressure | None = None,
+    sessions: WatchSessions | None = None,
+) -> BatchPipeline:
+    message_handler = get_topic_handler(
+        topic=route.topic,
+        consumer=consumer,
+        producer=producer,
+        dlq_topic=route.dlq,
+        repository=repository,
+        db_table=get_table(route, app_settings),
+        columnar_insert=app_settings.etl.columnar_insert,
+        insert_retries=app_settings.etl.insert_retries,
+        retry_backoff_ms=app_settings.etl.insert_retry_backoff_ms,
+        rollups=get_rollups(route, app_settings),
+        insert_raw=app_settings.etl.raw_insert,
+        sessions=sessions,
+        backpressure=backpressure,
+    )
+    return await stack.enter_async_context(
+        BatchPipeline(
+            consumer=consumer,
+            handle_batch=message_handler.handle_batch,
+            max_in_flight=app_settings.etl.max_in_flight_batches,
+            topic=route.topic,
+            batch_size=get_batch_size(stack, route, app_settings, repository),
+        )
+    )
+
+
+async def consume(
+    consumer: AIOKafkaConsumer,
+    buffers: PartitionBuffers,
+    kafka: KafkaSettings,
+    topics: list[str],
+) -> None:
+    "Pushes every partition's records of a fetch into its buffer at once"
+    consumed = {topic: MESSAGES_CONSUMED.labels(topic) for topic in topics}
+    while True:
+        try:
+            fetched = await consumer.getmany(
+                timeout_ms=kafka.getmany_timeout_ms, max_records=kafka.max_records
+            )
+        except ConsumerStoppedError:
+            return
+        except RecordTooLargeError:
+            logger.exception("Couldn't fetch records")
+            continue
+        if not fetched:
+            continue
+
+        logger.debug(
+            f"Fetched records, partitions = {len(fetched)}, n = {sum(map(len, fetched.values()))}"
+        )
+        for tp, records in fetched.items():
+            consumed[tp.topic].inc(len(records))
+            await buffers.extend(tp, records)
+
+
 async def run_etl(app_settings: AppSettings):
     logger.info("Starting clickhouse etl")
 
-    async with clickhouse_connection.create_connection_pool(
-        app_settings.clickhouse
-    ) as connection_pool, AIOKafkaConsumer(
-        app_settings.kafka.topic,
+    routes = get_routes(app_settings)
+    topics = [route.topic for route in routes]
+
+    async with AIOKafkaConsumer(
         bootstrap_servers=[app_settings.kafka.dsn],
         group_id=app_settings.kafka.consumer_group_id,
         auto_offset_reset="latest",
         enable_auto_commit=False,
+        max_poll_interval_ms=app_settings.kafka.max_poll_interval_ms,
+        **app_settings.kafka.fetch_options(),
     ) as consumer, AIOKafkaProducer(
         bootstrap_servers=[app_settings.kafka.dsn],
         compression_type="gzip",
         enable_idempotence=True,
         max_batch_size=32768,
         linger_ms=500,
-    ) as producer, get_flushable_buffer(
-        max_buffer_size=app_settings.etl.buffer_size
-    ) as buffer:
-        clickhouse_connection.connection_pool = connection_pool
-
-        async with clickhouse_connection.clickhouse_connection() as connection:
-            message_handler = get_topic_handler(
-                topic=app_settings.kafka.topic,
-                consumer=consumer,
-                producer=producer,
-                dlq_topic=app_settings.kafka.dlq,
-                repository=ClickhouseRepository(connection),
-                db_table=app_settings.clickhouse.table,
-            )
+    ) as producer, AsyncExitStack() as stack:
+        repository = await create_repository(stack, app_settings)
+        backpressure = get_backpressure(consumer, app_settings)
 
-            buffer.add_on_flush_callback(message_handler.handle_batch)
-
-            logger.info(
-                f"Starting to consume data from topic = {app_settings.kafka.topic}"
+        # Every route has its own DLQ and pipeline, and every assigned partition its
+        # own buffer, while the connection pool and kafka clients are shared. The stack
+        # exits buffers before pipelines, so the last flushed batches are persisted
+        # and committed before shutdown.
+        sessions = {route.topic: get_sessions(route, app_settings) for route in routes}
+        pipelines = {
+            route.topic: (
+                route,
+                await start_pipeline(
+                    stack,
+                    route,
+                    app_settings,
+                    consumer,
+                    producer,
+                    repository,
+                    backpressure,
+                    sessions[route.topic],
+                ),
             )
+            for route in routes
+        }
+        buffers = await stack.enter_async_context(PartitionBuffers(pipelines))
+        listener = FlushOnRevokeListener(
+            buffers,
+            backpressure,
+            [
+                route_sessions
+                for route_sessions in sessions.values()
+                if route_sessions is not None
+            ],
+        )
+        consumer.subscribe(topics, listener=listener)
 
-            async for message in consumer:
-                logger.info(
-                    f"""Consumed new message from topic = {app_settings.kafka.topic}, partition = {message.partition},
-                    offset = {message.offset}, timestamp = {message.timestamp}, checksum = {message.checksum}"""
+        if app_settings.metrics.enabled:
+            lag_task = asyncio.create_task(
+                report_consumer_lag(
+                    consumer, app_settings.metrics.lag_interval_ms / 1000
                 )
-                topic_message = TopicMessage(key=message.key, value=message.value)
-                await buffer.push(topic_message, len(message.value))
+            )
+            stack.callback(lag_task.cancel)
+
+        logger.info(f"Starting to consume data from topics = {topics}")
+        await consume(consumer, buffers, app_settings.kafka, topics)
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+from collections.abc import Iterable, Sequence
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from uuid import UUID
+
+import orjson
+from aiokafka import TopicPartition
+from src.buffer.message_batch import MessageBatch, RawValue
+from src.etl.analytical_db import AnalyticalRepository
+from src.etl.decoders import BatchDecoder, DecodedBatch, to_epoch_seconds
+from src.exceptions.exception import BatchInsertException
+
+if TYPE_CHECKING:
+    from src.etl.topic_handler import TopicMessage
+
+logger = logging.getLogger(__name__)
+
+# Progress may drift from wall time by a few seconds between heartbeats
+# without the viewer seeking, i.e. because of buffering
+SEEK_TOLERANCE_SEC = 5
+
+
+@dataclass(slots=True)
+class Session:
+    user_id: UUID
+    film_id: UUID
+    start: int
+    end: int
+    last_progress_sec: int
+    watched_sec: int = 0
+    seeks: int = 0
+
+    def row(self) -> tuple:
+        return (
+            self.user_id,
+            self.film_id,
+            self.start,
+            self.end,
+            self.watched_sec,
+            self.seeks,
+        )
+
+
+class SessionTracker:
+    """Open sessions of one partition, closed after the inactivity gap in event time.
+
+    Sessions are kept in the order they were last updated, so the least recently
+    active ones are closed first, both on expiry and when there are too many.
+    """
+
+    def __init__(self, gap_sec: int, max_open: int) -> None:
+        self.gap_sec = gap_sec
+        self.max_open = max_open
+        # Last applied offset and the latest event time seen in the partition
+        self.offset = -1
+        self.watermark = 0
+        self.open: dict[tuple[UUID, UUID], Session] = {}
+        # Closed sessions waiting to be inserted
+        self.pending: list[Session] = []
+
+    def add(self, user_id: UUID, film_id: UUID, progress_sec: int, ts: int) -> None:
+        key = (user_id, film_id)
+        session = self.open.pop(key, None)
+        if session is not None and ts - session.end > self.gap_sec:
+            self.pending.append(session)
+            session = None
+
+        if session is None:
+            session = Session(user_id, film_id, ts, ts, progress_sec)
+        else:
+            progress_delta = progress_sec - session.last_progress_sec
+            if 0 <= progress_delta <= max(ts - session.end, 0) + SEEK_TOLERANCE_SEC:
+                session.watched_sec += progress_delta
+            else:
+                session.seeks += 1
+            session.end = max(session.end, ts)
+            session.last_progress_sec = progress_sec
+
+        self.open[key] = session
+        self.watermark = max(self.watermark, ts)
+
+    def close_expired(self) -> None:
+        expired_before = self.watermark - self.gap_sec
+        while self.open:
+            key, session = next(iter(self.open.items()))
+            if session.end >= expired_before and len(self.open) <= self.max_open:
+                break
+            self.pending.append(self.open.pop(key))
+
+    def dump(self) -> bytes:
+        return orjson.dumps(
+            {
+                "offset": self.offset,
+                "watermark": self.watermark,
+                "open": [astuple(session) for session in self.open.values()],
+                "pending": [astuple(session) for session in self.pending],
+            }
+        )
+
+    def load(self, data: bytes) -> None:
+        state = orjson.loads(data)
+
+        def _session(values: list[Any]) -> Session:
+            user_id, film_id, *rest = values
+            return Session(UUID(user_id), UUID(film_id), *rest)
+
+        self.offset = state["offset"]
+        self.watermark = state["watermark"]
+        self.open = {
+            (session.user_id, session.film_id): session
+            for session in map(_session, state["open"])
+        }
+        self.pending = [_session(values) for values in state["pending"]]
+
+
+class WatchSessions:
+    """Reconstructs watch sessions from view heartbeats and inserts the closed ones.
+
+    State of every partition is checkpointed to a file before the batch's offsets are
+    committed, along with the last applied offset, so after a restart already applied
+    messages are skipped and no open session is lost. State of revoked partitions is
+    forgotten, their next owner continues from the checkpoint. Views must be keyed by
+    user and film, so all heartbeats of a session are in one partition.
+    """
+
+    KEYS = ("user_id", "film_id", "start", "end", "watched_sec", "seeks")
+
+    def __init__(self, table: str, state_dir: str, gap_sec: int, max_open: int) -> None:
+        self.table = table
+        self.state_dir = Path(state_dir)
+        self.gap_sec = gap_sec
+        self.max_open = max_open
+        self._trackers: dict[tuple[str, int], SessionTracker] = {}
+        self._dirty: set[tuple[str, int]] = set()
+        self._lock = asyncio.Lock()
+
+    def _state_path(self, tp: tuple[str, int]) -> Path:
+        topic, partition = tp
+        return self.state_dir / f"{topic}-{partition}.json"
+
+    def _tracker(self, tp: tuple[str, int], first_offset: int) -> SessionTracker:
+        tracker = self._trackers.get(tp)
+        # Offsets going back mean the partition is consumed again from its last commit,
+        # state is rebuilt from the checkpoint, which is never behind it. Offsets skip
+        # ahead on their own, i.e. over transaction markers, so gaps are no reason to
+        if tracker is None or first_offset <= tracker.offset:
+            tracker = SessionTracker(self.gap_sec, self.max_open)
+            path = self._state_path(tp)
+            if path.exists():
+                tracker.load(path.read_bytes())
+                logger.info(
+                    f"Loaded sessions of partition = {tp}, offset = {tracker.offset}"
+                )
+            self._trackers[tp] = tracker
+        return tracker
+
+    def apply(
+        self,
+        messages: Sequence["TopicMessage"],
+        batch: DecodedBatch,
+        decoder: BatchDecoder,
+    ) -> None:
+        "Adds views of the batch to sessions, messages without an offset are skipped"
+        partitions: dict[tuple[str, int], list[tuple[int, RawValue]]] = {}
+        if isinstance(messages, MessageBatch):
+            partitions[(messages.topic, messages.partition)] = list(
+                zip(messages.offsets, messages.values())
+            )
+        else:
+            for message in messages:
+                if (
+                    message.topic is None
+                    or message.partition is None
+                    or message.offset is None
+                ):
+                    continue
+                partitions.setdefault((message.topic, message.partition), []).append(
+                    (message.offset, message.value)
+                )
+
+        for tp, offsets in partitions.items():
+            tracker = self._tracker(tp, offsets[0][0])
+            fresh = [
+                (offset, value) for offset, value in offsets if offset > tracker.offset
+            ]
+            if not fresh:
+                continue
+
+            # Messages already applied before a restart are skipped, which needs
+            # decoding the rest again. It only happens for the first batches replayed
+            tp_batch = batch
+            if len(fresh) != len(messages):
+                tp_batch = decoder.decode([value for _, value in fresh])
+
+            columns = dict(zip(tp_batch.keys, tp_batch.columns))
+            views = sorted(
+                zip(
+                    map(to_epoch_seconds, columns.get("timestamp", [])),
+                    columns.get("user_id", []),
+                    columns.get("film_id", []),
+                    columns.get("progress_sec", []),
+                ),
+                key=lambda view: view[0],
+            )
+            for ts, user_id, film_id, progress_sec in views:
+                tracker.add(user_id, film_id, progress_sec, ts)
+            tracker.close_expired()
+            tracker.offset = fresh[-1][0]
+            self._dirty.add(tp)
+
+    async def forget(self, partitions: Iterable[TopicPartition]) -> None:
+        "Drops state of partitions moving to another worker, once it's checkpointed"
+        async with self._lock:
+            for tp in partitions:
+                self._dirty.discard((tp.topic, tp.partition))
+                if self._trackers.pop((tp.topic, tp.partition), None) is not None:
+                    logger.info(f"Forgot sessions of partition = {tp}")
+
+    async def flush(
+        self, repository: AnalyticalRepository, dedup_token: str | None = None
+    ) -> None:
+        "Inserts closed sessions and checkpoints the state of changed partitions"
+        async with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            # Other batches may close more sessions while these are inserted
+            taken = {
+                tp: len(t.pending) for tp, t in self._trackers.items() if t.pending
+            }
+            sessions = [
+                session
+                for tp, n in taken.items()
+                for session in self._trackers[tp].pending[:n]
+            ]
+            if sessions:
+                try:
+                    await repository.insert_columns(
+                        table=self.table,
+                        keys=self.KEYS,
+                        columns=list(map(list, zip(*(s.row() for s in sessions)))),
+                        dedup_token=dedup_token,
+                    )
+                    for tp, n in taken.items():
+                        del self._trackers[tp].pending[:n]
+                        dirty.add(tp)
+                except BatchInsertException as e:
+                    # Sessions stay pending and are inserted with the next batch
+                    logger.error(
+                        f"Couldn't insert sessions, n = {len(sessions)}, err = {e}"
+                    )
+
+            # Dumped here, as other batches may change the state while files are written
+            states = {tp: self._trackers[tp].dump() for tp in dirty}
+            await asyncio.to_thread(self._checkpoint, states)
+
+    def _checkpoint(self, states: dict[tuple[str, int], bytes]) -> None:
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        for tp, state in states.items():
+            path = self._state_path(tp)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(state)
+            os.replace(tmp_path, path)
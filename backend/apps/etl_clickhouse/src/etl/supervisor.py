@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import logging.config
+import multiprocessing
+import signal
+import time
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+
+from prometheus_client import start_http_server
+from src.etl.run import run_etl
+from src.settings.app import AppSettings, get_app_settings
+from src.utils.write_pid import write_pid
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before restarting a crashed worker, so a worker failing on startup
+# doesn't restart in a tight loop
+RESTART_DELAY_SEC = 5
+STOP_TIMEOUT_SEC = 30
+
+
+def worker_pidfile(pidfile: str, index: int) -> str:
+    "Pidfile of a worker next to the supervisor's one, i.e. etl.pid -> etl.0.pid"
+    path = Path(pidfile)
+    return str(path.with_name(f"{path.stem}.{index}{path.suffix}"))
+
+
+async def _run_until_stopped(app_settings: AppSettings) -> None:
+    # Cancelling the etl exits buffers and pipelines, so consumed messages are
+    # flushed and committed before the worker leaves the consumer group
+    task = asyncio.current_task()
+    assert task is not None
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, task.cancel)
+
+    try:
+        await run_etl(app_settings)
+    except asyncio.CancelledError:
+        logger.info("Worker stopped")
+
+
+def run_worker(index: int) -> None:
+    app_settings = get_app_settings()
+    logging.config.dictConfig(app_settings.logging.config)
+    if app_settings.pidfile:
+        write_pid(worker_pidfile(app_settings.pidfile, index))
+    if app_settings.metrics.enabled:
+        start_http_server(app_settings.metrics.port + index)
+
+    logger.info(f"Starting etl worker = {index}")
+    asyncio.run(_run_until_stopped(app_settings))
+
+
+class Supervisor:
+    """Runs etl workers in separate processes and restarts them if they crash.
+
+    Workers share the consumer group, so kafka spreads partitions between them and
+    throughput scales with the number of cores and partitions.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: dict[int, BaseProcess] = {}
+        self._stopping = False
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(
+            target=run_worker, args=(index,), name=f"etl-worker-{index}"
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info(f"Started etl worker = {index}, pid = {process.pid}")
+
+    def _stop(self, signum: int, frame) -> None:
+        logger.info(f"Stopping etl workers, signal = {signum}")
+        self._stopping = True
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        for index in range(self.workers):
+            self._start(index)
+
+        while not self._stopping:
+            for index, process in list(self._processes.items()):
+                process.join(timeout=1)
+                if process.is_alive() or self._stopping:
+                    continue
+                logger.error(
+                    f"Etl worker = {index} exited, code = {process.exitcode}, restarting"
+                )
+                time.sleep(RESTART_DELAY_SEC)
+                if not self._stopping:
+                    self._start(index)
+
+        for process in self._processes.values():
+            process.join(timeout=STOP_TIMEOUT_SEC)
+            if process.is_alive():
+                logger.error(f"Killing etl worker, pid = {process.pid}")
+                process.kill()
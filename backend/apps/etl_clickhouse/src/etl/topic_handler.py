@@ -1,12 +1,31 @@
+import asyncio
 import logging
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
 from enum import StrEnum, unique
 
-from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
-from pydantic import BaseModel
-from src.etl.analytical_db import AnalyticalRepository
-from src.exceptions.exception import BatchInsertException
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, TopicPartition
+from src.buffer.message_batch import message_values, offset_ranges
+from src.etl.analytical_db import (
+    AnalyticalRepository,
+    InsertSelectRepository,
+    shard_index,
+)
+from src.etl.backpressure import Backpressure, is_overload
+from src.etl.decoders import (
+    BatchDecoder,
+    DecodedBatch,
+    SchemaBatchDecoder,
+    ViewBatchDecoder,
+)
+from src.etl.rollups import Rollup
+from src.etl.sessions import WatchSessions
+from src.exceptions.exception import BatchInsertException, ShardsInsertException
+from src.metrics.etl import DLQ_SENDS, PARSE_FAILURES, ROWS_INSERTED
 from src.models.base import AppBaseSchema
+from src.models.like import LikeMessage
+from src.models.message import TopicMessage
+from src.models.review import ReviewMessage
 from src.models.view import ViewMessage
 
 logger = logging.getLogger(__name__)
@@ -15,21 +34,52 @@ logger = logging.getLogger(__name__)
 @unique
 class Topic(StrEnum):
     VIEWS: str = "views"
+    FILM_PROGRESS: str = "film_progress"
+    LIKES: str = "likes"
+    REVIEWS: str = "reviews"
 
 
-TOPIC_SCHEMAS_MAP: dict[str, type[AppBaseSchema]] = {Topic.VIEWS: ViewMessage}
+TOPIC_SCHEMAS_MAP: dict[str, type[AppBaseSchema]] = {
+    Topic.VIEWS: ViewMessage,
+    Topic.FILM_PROGRESS: ViewMessage,
+    Topic.LIKES: LikeMessage,
+    Topic.REVIEWS: ReviewMessage,
+}
 
+# Topics without a dedicated decoder are validated with their schema message by message
+TOPIC_DECODERS_MAP: dict[str, type[BatchDecoder]] = {
+    Topic.VIEWS: ViewBatchDecoder,
+    Topic.FILM_PROGRESS: ViewBatchDecoder,
+}
 
-class TopicMessage(BaseModel):
-    key: bytes | None
-    value: bytes
+
+def batch_partitions(messages: Sequence[TopicMessage]) -> set[TopicPartition]:
+    return {
+        TopicPartition(topic, partition)
+        for topic, partition in offset_ranges(messages) or {}
+    }
+
+
+def insert_dedup_token(messages: Sequence[TopicMessage]) -> str | None:
+    """Identifies a batch by its offset range per partition, i.e. views:0:100-199.
+
+    Redelivered records only get the same token if they are cut into the same batches,
+    which isn't guaranteed after a restart, see Delivery guarantees in the README.
+    """
+    ranges = offset_ranges(messages)
+    if not ranges:
+        return None
+    return ",".join(
+        f"{topic}:{partition}:{first}-{last}"
+        for (topic, partition), (first, last) in sorted(ranges.items())
+    )
 
 
 class ITopicHandler(ABC):
     "Interface for different topics message handlers"
 
     @abstractmethod
-    async def handle_batch(self, messages: list[TopicMessage]) -> None:
+    async def handle_batch(self, messages: Sequence[TopicMessage]) -> None:
         pass
 
 
@@ -40,6 +90,7 @@ class KafkaTopicHandler(ITopicHandler):
         consumer: AIOKafkaConsumer,
         producer: AIOKafkaProducer,
         dlq_topic: str,
+        decoder: BatchDecoder | None = None,
     ) -> None:
         super().__init__()
         # TODO: replace with avro schema
@@ -47,29 +98,23 @@ class KafkaTopicHandler(ITopicHandler):
         self.consumer = consumer
         self.producer = producer
         self.dlq_topic = dlq_topic
+        self.decoder = decoder or SchemaBatchDecoder(schema)
 
-    def parse_messages(self, messages: list[TopicMessage]) -> tuple:
-        parsed_messages = []
-        dlq_messages = []
-
-        for message in messages:
-            logger.debug(f"Parsing message = {message}, schema = {self.schema}")
-            try:
-                view = self.schema.parse_raw(message.value)
-                parsed_messages.append(view)
-            except Exception as e:
-                logger.error(
-                    f"Couldn't parse message = {message}, err = {e}", exc_info=True
-                )
-                dlq_messages.append(message)
-
-        return parsed_messages, dlq_messages
+    def parse_messages(
+        self, messages: Sequence[TopicMessage]
+    ) -> tuple[DecodedBatch, list[TopicMessage]]:
+        batch = self.decoder.decode(message_values(messages))
+        dlq_messages = [messages[i] for i in batch.invalid]
+        if dlq_messages:
+            PARSE_FAILURES.labels(self.schema.__name__).inc(len(dlq_messages))
+        return batch, dlq_messages
 
     async def send_to_dlq(self, dlq_messages: list[TopicMessage]) -> None:
         if not dlq_messages:
             return
 
         logger.warning(f"Sending {self.schema} to dlq, n = {len(dlq_messages)}")
+        dlq_sends = DLQ_SENDS.labels(self.dlq_topic)
         for dlq_message in dlq_messages:
             try:
                 await self.producer.send(
@@ -78,13 +123,14 @@ class KafkaTopicHandler(ITopicHandler):
                     key=dlq_message.key,
                     value=dlq_message.value,
                 )
+                dlq_sends.inc()
             except Exception as e:
                 # Just ignore the error as we still can proceed even if we can't send a message to dlq
                 logger.error(
                     f"Something went wrong, couldn't send message = {dlq_message.value!r} to dlq = {self.dlq_topic}, err = {e}"
                 )
 
-    async def handle_batch(self, messages: list[TopicMessage]) -> None:
+    async def handle_batch(self, messages: Sequence[TopicMessage]) -> None:
         # Need to override the method so class can be instantiated and tested
         raise NotImplementedError
 
@@ -98,33 +144,191 @@ class KafkaToDatabaseHandler(KafkaTopicHandler):
         dlq_topic: str,
         analytical_repository: AnalyticalRepository,
         db_table: str,
+        columnar_insert: bool = True,
+        decoder: BatchDecoder | None = None,
+        insert_retries: int = 0,
+        retry_backoff_ms: int = 0,
+        rollups: Sequence[Rollup] = (),
+        insert_raw: bool = True,
+        sessions: WatchSessions | None = None,
+        backpressure: Backpressure | None = None,
     ) -> None:
-        super().__init__(schema, consumer, producer, dlq_topic)
+        super().__init__(schema, consumer, producer, dlq_topic, decoder)
+        if rollups and not isinstance(analytical_repository, InsertSelectRepository):
+            raise ValueError("Rollups need a repository that can insert with a select")
         self.analytical_repository = analytical_repository
         self.db_table = db_table
+        self.columnar_insert = columnar_insert
+        self.insert_retries = insert_retries
+        self.retry_backoff_ms = retry_backoff_ms
+        self.rollups = rollups
+        # Without rollups raw rows are the only thing there is to insert
+        self.insert_raw = insert_raw or not rollups
+        self.sessions = sessions
+        self.backpressure = backpressure
+
+    async def insert_decoded(
+        self, batch: DecodedBatch, dedup_token: str | None = None
+    ) -> None:
+        inserts = [
+            self.insert_rollup(rollup, batch, dedup_token) for rollup in self.rollups
+        ]
+        if self.insert_raw:
+            inserts.append(self.insert_rows(batch, dedup_token))
+        # Tokens are per table, so the same one is safe for raw rows and every rollup
+        results = await asyncio.gather(*inserts, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise combined_insert_error(errors)
+
+    async def insert_rollup(
+        self, rollup: Rollup, batch: DecodedBatch, dedup_token: str | None = None
+    ) -> None:
+        repository = self.analytical_repository
+        # Checked on init, handlers with rollups have a select capable repository
+        assert isinstance(repository, InsertSelectRepository)
+        rows = await rollup.insert(repository, batch, dedup_token)
+        ROWS_INSERTED.labels(rollup.table).inc(rows)
+
+    async def insert_rows(
+        self, batch: DecodedBatch, dedup_token: str | None = None
+    ) -> None:
+        if self.columnar_insert:
+            await self.analytical_repository.insert_columns(
+                table=self.db_table,
+                keys=batch.keys,
+                columns=batch.columns,
+                dedup_token=dedup_token,
+            )
+            ROWS_INSERTED.labels(self.db_table).inc(len(batch))
+            return
+
+        await self.analytical_repository.insert_batch(
+            table=self.db_table,
+            keys=batch.keys,
+            data=batch.rows(),
+            dedup_token=dedup_token,
+        )
+        ROWS_INSERTED.labels(self.db_table).inc(len(batch))
 
-    async def handle_batch(self, messages: list[TopicMessage]) -> None:
+    async def insert_with_retries(
+        self, batch: DecodedBatch, dedup_token: str | None = None
+    ) -> None:
+        """Inserts the batch, retrying with exponential backoff on failures.
+
+        Every attempt sends the same deduplication token, so an attempt that failed
+        after clickhouse had already written the rows doesn't duplicate them.
+        """
+        for attempt in range(self.insert_retries + 1):
+            try:
+                await self.insert_decoded(batch, dedup_token)
+                return
+            except BatchInsertException as e:
+                if attempt == self.insert_retries:
+                    raise
+                delay_sec = self.retry_backoff_ms * 2**attempt / 1000
+                logger.warning(
+                    f"Couldn't insert batch {self.schema}, n = {len(batch)}, "
+                    f"attempt = {attempt + 1}, retrying in {delay_sec}s, err = {e}"
+                )
+                await asyncio.sleep(delay_sec)
+
+    async def insert_until_recovered(
+        self,
+        batch: DecodedBatch,
+        dedup_token: str | None = None,
+        partitions: set[TopicPartition] | None = None,
+    ) -> None:
+        "Inserts with retries, then waits out clickhouse overload with backpressure"
+        try:
+            await self.insert_with_retries(batch, dedup_token)
+        except BatchInsertException as e:
+            if self.backpressure is None or not is_overload(e):
+                raise
+            logger.warning(
+                f"Clickhouse overloaded, holding batch {self.schema}, n = {len(batch)}, "
+                f"err = {e.__cause__ or e!r}"
+            )
+            await self.backpressure.wait(
+                lambda: self.insert_decoded(batch, dedup_token),
+                self.db_table,
+                partitions or set(),
+            )
+
+    def failed_indices(
+        self,
+        messages: Sequence[TopicMessage],
+        batch: DecodedBatch,
+        error: BatchInsertException,
+    ) -> list[int]:
+        "Indices of parsed messages to reprocess, only of failed shards if others took theirs"
+        invalid = set(batch.invalid)
+        parsed = [i for i in range(len(messages)) if i not in invalid]
+        if (
+            not isinstance(error, ShardsInsertException)
+            or error.sharding_key not in batch.keys
+        ):
+            return parsed
+
+        values = batch.columns[batch.keys.index(error.sharding_key)]
+        return [
+            i
+            for i, value in zip(parsed, values, strict=True)
+            if shard_index(value, error.shards_n) in error.failed_shards
+        ]
+
+    async def handle_batch(self, messages: Sequence[TopicMessage]) -> None:
         logger.info(f"Handling {self.schema} kafka messages, n = {len(messages)}")
-        models, dlq_messages = self.parse_messages(messages)
-        if models:
-            logger.info(f"Sending {self.schema} to clickhouse, n = {len(models)}")
+        batch, dlq_messages = self.parse_messages(messages)
+        if self.sessions is not None:
+            self.sessions.apply(messages, batch, self.decoder)
+
+        if len(batch):
+            logger.info(f"Sending {self.schema} to clickhouse, n = {len(batch)}")
 
             try:
-                await self.analytical_repository.insert_batch(
-                    table=self.db_table,
-                    keys=models[0].dict().keys(),
-                    data=[model.dict() for model in models],
+                await self.insert_until_recovered(
+                    batch, insert_dedup_token(messages), batch_partitions(messages)
                 )
             except BatchInsertException as e:
                 logger.error(
-                    f"Couldn't insert batch {self.schema}, n = {len(models)}, err = {e}"
+                    f"Couldn't insert batch {self.schema}, n = {len(batch)}, err = {e}"
                 )
-                # if insert failed we need to reprocess all messages later
-                dlq_messages = messages
+                # if insert still fails we need to reprocess the messages later, but
+                # not those that shards which took the batch already have
+                failed = {*batch.invalid, *self.failed_indices(messages, batch, e)}
+                dlq_messages = [messages[i] for i in sorted(failed)]
+
+        if self.sessions is not None:
+            # Checkpoints sessions before the batch is committed
+            await self.sessions.flush(
+                self.analytical_repository, insert_dedup_token(messages)
+            )
 
+        # Offsets are committed by the caller once all previous batches are persisted too
         await self.send_to_dlq(dlq_messages)
 
-        await self.consumer.commit()
+
+def combined_insert_error(errors: list[BaseException]) -> BaseException:
+    "One error for a batch inserted into several tables, with failed shards of all"
+    if len(errors) == 1:
+        return errors[0]
+    if not all(isinstance(error, ShardsInsertException) for error in errors):
+        return next(e for e in errors if not isinstance(e, ShardsInsertException))
+
+    shard_errors = [
+        error for error in errors if isinstance(error, ShardsInsertException)
+    ]
+    first = shard_errors[0]
+    failed_shards = set().union(*(error.failed_shards for error in shard_errors))
+    error = ShardsInsertException(
+        f"Shards = {sorted(failed_shards)} failed",
+        failed_shards=failed_shards,
+        sharding_key=first.sharding_key,
+        shards_n=first.shards_n,
+    )
+    error.__cause__ = first
+    return error
 
 
 def get_topic_handler(
@@ -135,12 +339,21 @@ def get_topic_handler(
     dlq_topic: str,
     repository: AnalyticalRepository,
     db_table: str,
-) -> ITopicHandler:
+    columnar_insert: bool = True,
+    insert_retries: int = 0,
+    retry_backoff_ms: int = 0,
+    rollups: Sequence[Rollup] = (),
+    insert_raw: bool = True,
+    sessions: WatchSessions | None = None,
+    backpressure: Backpressure | None = None,
+) -> KafkaToDatabaseHandler:
     schema = TOPIC_SCHEMAS_MAP.get(topic, None)
 
     if not schema:
         raise ValueError(f"No schema configured for topic = {topic}")
 
+    decoder_cls = TOPIC_DECODERS_MAP.get(topic, SchemaBatchDecoder)
+
     return KafkaToDatabaseHandler(
         schema=schema,
         consumer=consumer,
@@ -148,4 +361,12 @@ def get_topic_handler(
         dlq_topic=dlq_topic,
         analytical_repository=repository,
         db_table=db_table,
+        columnar_insert=columnar_insert,
+        decoder=decoder_cls(schema),
+        insert_retries=insert_retries,
+        retry_backoff_ms=retry_backoff_ms,
+        rollups=rollups,
+        insert_raw=insert_raw,
+        sessions=sessions,
+        backpressure=backpressure,
     )
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+
+from asynch.pool import Pool
+from redis import asyncio as aioredis
+from src.etl.clickhouse_connection import create_connection_pool
+from src.settings.app import AppSettings
+from src.settings.trending import TrendingSettings
+
+logger = logging.getLogger(__name__)
+
+# Films by unique viewers within the window, scanning only the window's partitions
+TRENDING_QUERY = """
+    SELECT toString(film_id), uniq(user_id) AS viewers
+    FROM {table}
+    WHERE timestamp >= now() - toIntervalHour(%(hours)s)
+    GROUP BY film_id
+    ORDER BY viewers DESC
+    LIMIT %(limit)s
+"""
+
+
+class TrendingFilms:
+    """Ranks films by viewers over sliding windows and publishes them to redis.
+
+    Every window's ranking is a sorted set of film ids scored by viewers, replaced as a
+    whole in one transaction, so readers never see a partially written ranking.
+    """
+
+    def __init__(
+        self,
+        pool: Pool,
+        redis: aioredis.Redis,
+        table: str,
+        settings: TrendingSettings,
+    ) -> None:
+        self.pool = pool
+        self.redis = redis
+        self.table = table
+        self.settings = settings
+
+    def key(self, hours: int) -> str:
+        return f"{self.settings.key_prefix}:{hours}h"
+
+    async def rank(self, hours: int) -> dict[str, int]:
+        async with self.pool.acquire() as connection, connection.cursor() as cursor:
+            await cursor.execute(
+                TRENDING_QUERY.format(table=self.table),
+                {"hours": hours, "limit": self.settings.top_n},
+            )
+            return dict(await cursor.fetchall())
+
+    async def publish(self, hours: int, ranking: dict[str, int]) -> None:
+        key = self.key(hours)
+        tmp_key = f"{key}:tmp"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if ranking:
+                pipe.delete(tmp_key)
+                pipe.zadd(tmp_key, ranking)  # type: ignore[arg-type]
+                pipe.rename(tmp_key, key)
+                pipe.expire(key, self.settings.key_ttl_sec)
+            else:
+                pipe.delete(key)
+            await pipe.execute()
+
+    async def refresh(self) -> None:
+        for hours in self.settings.windows_hours:
+            ranking = await self.rank(hours)
+            await self.publish(hours, ranking)
+            logger.info(
+                f"Published trending films, window = {hours}h, n = {len(ranking)}"
+            )
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                # Rankings are kept until they expire, so a failed refresh is retried
+                logger.exception("Failed to refresh trending films")
+            await asyncio.sleep(self.settings.interval_sec)
+
+
+async def run_trending(app_settings: AppSettings, once: bool = False) -> None:
+    settings = app_settings.trending
+    redis = aioredis.Redis(host=settings.redis_host, port=settings.redis_port)
+    try:
+        async with create_connection_pool(app_settings.clickhouse) as pool:
+            trending = TrendingFilms(
+                pool, redis, app_settings.clickhouse.table, settings
+            )
+            if once:
+                await trending.refresh()
+            else:
+                await trending.run()
+    finally:
+        await redis.close()
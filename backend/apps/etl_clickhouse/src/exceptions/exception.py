@@ -4,3 +4,19 @@ class BaseUGCException(Exception):  # noqa: N818
 
 class BatchInsertException(BaseUGCException):  # noqa: N818
     pass
+
+
+class ShardsInsertException(BatchInsertException):  # noqa: N818
+    "Insert failed on some shards only, the other shards have their rows"
+
+    def __init__(
+        self, message: str, failed_shards: set[int], sharding_key: str, shards_n: int
+    ) -> None:
+        super().__init__(message)
+        self.failed_shards = failed_shards
+        self.sharding_key = sharding_key
+        self.shards_n = shards_n
+
+
+class BatchDroppedException(BaseUGCException):  # noqa: N818
+    "Batch given up on as its partitions were revoked, its offsets mustn't be committed"
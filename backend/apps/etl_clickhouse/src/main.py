@@ -1,9 +1,16 @@
+import argparse
 import asyncio
 import logging
 import logging.config
 import sys
 
+from prometheus_client import start_http_server
+from src.etl.replay import ReplayBounds, parse_timestamp, run_replay
+from src.etl.reprocessor import run_reprocessor
 from src.etl.run import run_etl
+from src.etl.supervisor import Supervisor
+from src.etl.trending import run_trending
+from src.migrations.migrate import run_migrations
 from src.settings.app import get_app_settings
 from src.utils.write_pid import write_pid
 
@@ -24,7 +31,95 @@ def handle_uncaught_exception(exc_type, exc_value, exc_traceback):
 sys.excepthook = handle_uncaught_exception
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ETL from Kafka to Clickhouse")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("run", help="Consume topics into clickhouse, the default")
+    commands.add_parser(
+        "reprocess", help="Consume DLQ topics and insert their messages again"
+    )
+
+    replay = commands.add_parser(
+        "replay",
+        help="Insert a range of a topic again, without touching the consumer group",
+    )
+    replay.add_argument("--topic", default=settings.kafka.topic)
+    replay.add_argument(
+        "--partitions", type=int, nargs="*", help="All partitions by default"
+    )
+    start = replay.add_mutually_exclusive_group()
+    start.add_argument("--from-offset", type=int)
+    start.add_argument(
+        "--from-timestamp",
+        type=parse_timestamp,
+        help="Milliseconds since epoch or ISO datetime",
+    )
+    end = replay.add_mutually_exclusive_group()
+    end.add_argument("--to-offset", type=int, help="Exclusive")
+    end.add_argument(
+        "--to-timestamp",
+        type=parse_timestamp,
+        help="Exclusive, the end of the topic as of start by default",
+    )
+    replay.add_argument("--batch-size", type=int, default=100_000)
+    replay.add_argument("--max-in-flight", type=int, default=4)
+
+    migrate = commands.add_parser("migrate", help="Apply pending clickhouse migrations")
+    migrate.add_argument(
+        "--dry-run", action="store_true", help="Only log statements to execute"
+    )
+
+    trending = commands.add_parser(
+        "trending", help="Publish trending films to redis periodically"
+    )
+    trending.add_argument("--once", action="store_true", help="Refresh once and exit")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "reprocess":
+        if settings.metrics.enabled:
+            start_http_server(settings.metrics.port)
+        asyncio.run(run_reprocessor(settings))
+        sys.exit()
+
+    if args.command == "replay":
+        bounds = ReplayBounds(
+            from_offset=args.from_offset,
+            from_timestamp=args.from_timestamp,
+            to_offset=args.to_offset,
+            to_timestamp=args.to_timestamp,
+        )
+        asyncio.run(
+            run_replay(
+                settings,
+                topic=args.topic,
+                bounds=bounds,
+                partition_ids=args.partitions,
+                batch_size=args.batch_size,
+                max_in_flight=args.max_in_flight,
+            )
+        )
+        sys.exit()
+
+    if args.command == "migrate":
+        asyncio.run(run_migrations(settings, dry_run=args.dry_run))
+        sys.exit()
+
+    if args.command == "trending":
+        asyncio.run(run_trending(settings, once=args.once))
+        sys.exit()
+
     if settings.pidfile:
         write_pid(settings.pidfile)
-    asyncio.run(run_etl(settings))
+    # Before workers start, so they don't race each other applying the same migrations
+    if settings.migrations.on_startup:
+        asyncio.run(run_migrations(settings))
+    if settings.etl.workers > 1:
+        Supervisor(settings.etl.workers).run()
+    else:
+        # Workers of the supervisor serve metrics themselves
+        if settings.metrics.enabled:
+            start_http_server(settings.metrics.port)
+        asyncio.run(run_etl(settings))
@@ -0,0 +1,72 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+BUFFER_FLUSHES = Counter(
+    "etl_buffer_flushes_total",
+    "Number of buffer flushes by the condition that triggered them",
+    ["reason"],
+)
+MESSAGES_CONSUMED = Counter(
+    "etl_messages_consumed_total",
+    "Number of messages consumed from kafka",
+    ["topic"],
+)
+CONSUMER_LAG = Gauge(
+    "etl_consumer_lag_messages",
+    "Messages between the partition's high watermark and the consumer position",
+    ["topic", "partition"],
+)
+BUFFER_BYTES = Gauge(
+    "etl_buffer_bytes",
+    "Size of messages waiting in the partition's buffer",
+    ["topic", "partition"],
+)
+BUFFER_MESSAGES = Gauge(
+    "etl_buffer_messages",
+    "Number of messages waiting in the partition's buffer",
+    ["topic", "partition"],
+)
+FLUSH_DURATION = Histogram(
+    "etl_flush_duration_seconds",
+    "Seconds from a buffer flush until its batch is inserted and committed",
+    ["topic"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+ROWS_INSERTED = Counter(
+    "etl_rows_inserted_total",
+    "Number of rows inserted into the analytical database",
+    ["table"],
+)
+PARSE_FAILURES = Counter(
+    "etl_parse_failures_total",
+    "Number of messages that couldn't be parsed",
+    ["schema"],
+)
+DLQ_SENDS = Counter(
+    "etl_dlq_sends_total",
+    "Number of messages sent to a DLQ or parking topic",
+    ["topic"],
+)
+LAST_COMMIT = Gauge(
+    "etl_last_commit_timestamp_seconds",
+    "Unix time of the last offsets commit, time() minus it is the time since",
+    ["topic"],
+)
+BATCH_SIZE_BYTES = Gauge(
+    "etl_batch_size_bytes",
+    "Buffer size at which batches of the topic are flushed, changes if adaptive",
+    ["topic"],
+)
+ACTIVE_PARTS = Gauge(
+    "etl_active_parts",
+    "Most active parts in a partition of the table, as last seen by adaptive sizing",
+    ["table"],
+)
+INSERT_OVERLOADS = Counter(
+    "etl_insert_overloads_total",
+    "Number of inserts that failed because clickhouse was overloaded or unreachable",
+    ["table"],
+)
+CONSUMPTION_PAUSED = Gauge(
+    "etl_consumption_paused",
+    "1 while consumption is paused until clickhouse recovers from overload",
+)
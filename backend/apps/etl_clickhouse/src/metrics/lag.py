@@ -0,0 +1,34 @@
+import asyncio
+import logging
+
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from src.metrics.etl import CONSUMER_LAG
+
+logger = logging.getLogger(__name__)
+
+
+async def report_consumer_lag(consumer: AIOKafkaConsumer, interval_sec: float) -> None:
+    "Periodically exports lag of the assigned partitions, from the last fetched watermark"
+    reported: set[TopicPartition] = set()
+    while True:
+        assignment = consumer.assignment()
+        for tp in reported - assignment:
+            CONSUMER_LAG.remove(tp.topic, str(tp.partition))
+        reported &= assignment
+
+        for tp in assignment:
+            highwater = consumer.highwater(tp)
+            if highwater is None:
+                continue
+            try:
+                position = await consumer.position(tp)
+            except Exception as e:
+                # The partition can be revoked while we wait for its position
+                logger.debug(f"Couldn't get position of partition = {tp}, err = {e}")
+                continue
+            CONSUMER_LAG.labels(tp.topic, tp.partition).set(
+                max(highwater - position, 0)
+            )
+            reported.add(tp)
+
+        await asyncio.sleep(interval_sec)
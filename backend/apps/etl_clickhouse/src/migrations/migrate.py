@@ -0,0 +1,208 @@
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from string import Template
+
+from asynch.pool import Pool
+from src.etl.analytical_db import sharding_expression
+from src.etl.clickhouse_connection import create_connection_pool
+from src.settings.app import AppSettings
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = Path(__file__).parent / "versions"
+# Statements with this comment are only run when a cluster is configured
+CLUSTER_ONLY = "-- cluster only"
+MIGRATIONS_TABLE = "schema_migrations"
+# Replicated tables of a shard share a path in keeper, the macros are set per server
+REPLICATION_ARGS = "'/clickhouse/tables/{shard}/{database}/{table}', '{replica}'"
+
+_FILE_NAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+_STATEMENT_END = re.compile(r";\s*(?:\n|$)")
+_CREATE_TABLE = re.compile(r"CREATE TABLE IF NOT EXISTS\s+(\w+)\.(\w+)")
+_ORDER_BY = re.compile(r"^ORDER BY\s+(.+)$", re.MULTILINE)
+
+
+def sorting_key(order_by: str) -> str:
+    "ORDER BY expression as system.tables shows it, i.e. film_id, user_id, timestamp"
+    if order_by.startswith("(") and order_by.endswith(")"):
+        order_by = order_by[1:-1]
+    return ", ".join(column.strip() for column in order_by.split(","))
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    def statements(self, variables: dict[str, str], cluster: bool) -> list[str]:
+        sql = Template(self.path.read_text()).substitute(variables)
+        statements = []
+        for statement in _STATEMENT_END.split(sql):
+            lines = [line.strip() for line in statement.strip().splitlines()]
+            if all(not line or line.startswith("--") for line in lines):
+                continue
+            if CLUSTER_ONLY in lines and not cluster:
+                continue
+            statements.append(statement.strip())
+        return statements
+
+
+def load_migrations(directory: Path = VERSIONS_DIR) -> list[Migration]:
+    "Migrations named <version>_<name>.sql, in version order"
+    migrations: dict[int, Migration] = {}
+    for path in directory.glob("*.sql"):
+        match = _FILE_NAME.match(path.name)
+        if match is None:
+            raise ValueError(
+                f"Migration name must be <version>_<name>.sql, got = {path}"
+            )
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version = {version}")
+        migrations[version] = Migration(version, match.group(2), path)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def template_variables(app_settings: AppSettings) -> dict[str, str]:
+    """Values of ${...} in migrations.
+
+    Tables have fixed names, as in .env.example and the etl's table settings, so
+    routes to other tables need them created separately. Without a cluster they're plain
+    MergeTree tables. With one they're replicated local tables on every server, with
+    the local table suffix, and Distributed tables over them take the plain names and
+    shard rows as the etl does.
+    """
+    clickhouse = app_settings.clickhouse
+    migrations = app_settings.migrations
+    variables = {
+        "database": clickhouse.database,
+        "cluster": clickhouse.cluster,
+        "on_cluster": "",
+        "local": "",
+        "replicated": "",
+        "replication": "",
+        "raw_ttl_days": str(migrations.raw_ttl_days),
+        "rollup_ttl_days": str(migrations.rollup_ttl_days),
+        "sharding_expression": sharding_expression(clickhouse.sharding_key),
+    }
+    if clickhouse.cluster:
+        if not clickhouse.local_table_suffix:
+            raise ValueError(
+                "CLICKHOUSE_LOCAL_TABLE_SUFFIX must be set with a cluster, "
+                "as local and Distributed tables can't share names"
+            )
+        variables |= {
+            "on_cluster": f"ON CLUSTER {clickhouse.cluster}",
+            "local": clickhouse.local_table_suffix,
+            "replicated": "Replicated",
+            "replication": REPLICATION_ARGS,
+        }
+    return variables
+
+
+class Migrator:
+    """Applies migrations that weren't applied yet, in version order.
+
+    Applied versions are recorded in the database, each after all its statements
+    succeeded. Statements should be idempotent, i.e. CREATE ... IF NOT EXISTS, so a
+    migration interrupted half way can simply be applied again.
+    """
+
+    def __init__(self, pool: Pool, app_settings: AppSettings) -> None:
+        self.pool = pool
+        self.database = app_settings.clickhouse.database
+        self.cluster = bool(app_settings.clickhouse.cluster)
+        self.variables = template_variables(app_settings)
+
+    async def _execute(self, query: str) -> list[tuple]:
+        async with self.pool.acquire() as connection, connection.cursor() as cursor:
+            await cursor.execute(query)
+            return await cursor.fetchall()
+
+    async def _prepare(self) -> None:
+        on_cluster = self.variables["on_cluster"]
+        await self._execute(
+            f"CREATE DATABASE IF NOT EXISTS {self.database} {on_cluster}"
+        )
+        # Kept on the server migrations are run against, which is enough as
+        # migrations are idempotent and apply to the cluster with ON CLUSTER
+        await self._execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.database}.{MIGRATIONS_TABLE} (
+                version UInt32,
+                name String,
+                applied_at DateTime DEFAULT now()
+            )
+            Engine=MergeTree()
+            ORDER BY version
+            """
+        )
+
+    async def applied(self) -> set[int]:
+        table = f"{self.database}.{MIGRATIONS_TABLE}"
+        [(exists,)] = await self._execute(f"EXISTS TABLE {table}")
+        if not exists:
+            return set()
+        rows = await self._execute(f"SELECT version FROM {table}")
+        return {version for (version,) in rows}
+
+    async def check_sorting_keys(self, migration: Migration) -> None:
+        """Refuses to go on if a table the migration creates exists with another key.
+
+        CREATE TABLE IF NOT EXISTS would leave such a table, i.e. one created from the
+        old clickhouse.ddl, as it is and the migration would still be recorded.
+        """
+        for statement in migration.statements(self.variables, self.cluster):
+            table = _CREATE_TABLE.search(statement)
+            order_by = _ORDER_BY.search(statement)
+            if table is None or order_by is None:
+                continue
+            database, name = table.groups()
+            rows = await self._execute(
+                "SELECT sorting_key FROM system.tables "
+                f"WHERE database = '{database}' AND name = '{name}'"
+            )
+            expected = sorting_key(order_by.group(1).strip())
+            if rows and rows[0][0] != expected:
+                raise ValueError(
+                    f"Table = {database}.{name} exists with ORDER BY ({rows[0][0]}), "
+                    f"migration = {migration.version}_{migration.name} expects "
+                    f"({expected}), move it with INSERT ... SELECT as described "
+                    "under Migrations in the README"
+                )
+
+    async def migrate(self, dry_run: bool = False) -> list[Migration]:
+        "Returns the pending migrations, with dry_run only logs their statements"
+        if not dry_run:
+            await self._prepare()
+        applied = await self.applied()
+        pending = [m for m in load_migrations() if m.version not in applied]
+        if not pending:
+            logger.info("Clickhouse schema is up to date")
+
+        for migration in pending:
+            await self.check_sorting_keys(migration)
+        for migration in pending:
+            logger.info(f"Applying migration = {migration.version}_{migration.name}")
+            for statement in migration.statements(self.variables, self.cluster):
+                if dry_run:
+                    logger.info(f"Would execute:\n{statement}")
+                    continue
+                await self._execute(statement)
+            if not dry_run:
+                await self._execute(
+                    f"INSERT INTO {self.database}.{MIGRATIONS_TABLE} (version, name) "
+                    f"VALUES ({migration.version}, '{migration.name}')"
+                )
+        return pending
+
+
+async def run_migrations(app_settings: AppSettings, dry_run: bool = False) -> None:
+    # The database may not exist yet, so connect to the default one
+    async with create_connection_pool(
+        app_settings.clickhouse, database="default"
+    ) as pool:
+        await Migrator(pool, app_settings).migrate(dry_run)
@@ -0,0 +1,125 @@
+-- Raw events and the etl's optional rollups and sessions.
+--
+-- Tables are sorted by film first, as reads are mostly per film, and partitioned by
+-- month, so retention drops whole parts. Timestamps within a film and user arrive at
+-- regular heartbeat intervals, so DoubleDelta stores them in a few bits, and playback
+-- progress grows steadily, so Delta does the same for it. UUIDs are random and keep
+-- the default LZ4, which is as small as ZSTD on them and faster to read. There are no
+-- low-cardinality strings in these tables, review texts are compressed with ZSTD.
+--
+-- non_replicated_deduplication_window makes MergeTree tables skip inserts whose
+-- insert_deduplication_token was already seen, so retried etl batches aren't duplicated
+
+CREATE TABLE IF NOT EXISTS ${database}.ugc_film_views${local} ${on_cluster} (
+    user_id UUID,
+    film_id UUID,
+    progress_sec UInt32 CODEC(Delta, ZSTD(1)),
+    timestamp DateTime CODEC(DoubleDelta, ZSTD(1))
+)
+Engine=${replicated}MergeTree(${replication})
+PARTITION BY toYYYYMM(timestamp)
+ORDER BY (film_id, user_id, timestamp)
+TTL timestamp + INTERVAL ${raw_ttl_days} DAY
+SETTINGS non_replicated_deduplication_window = 1000;
+
+CREATE TABLE IF NOT EXISTS ${database}.ugc_film_likes${local} ${on_cluster} (
+    user_id UUID,
+    film_id UUID,
+    rank UInt8 CODEC(T64, ZSTD(1)),
+    timestamp DateTime CODEC(Delta, ZSTD(1))
+)
+Engine=${replicated}MergeTree(${replication})
+PARTITION BY toYYYYMM(timestamp)
+ORDER BY (film_id, user_id, timestamp)
+TTL timestamp + INTERVAL ${raw_ttl_days} DAY
+SETTINGS non_replicated_deduplication_window = 1000;
+
+CREATE TABLE IF NOT EXISTS ${database}.ugc_film_reviews${local} ${on_cluster} (
+    user_id UUID,
+    film_id UUID,
+    text String CODEC(ZSTD(3)),
+    timestamp DateTime CODEC(Delta, ZSTD(1))
+)
+Engine=${replicated}MergeTree(${replication})
+PARTITION BY toYYYYMM(timestamp)
+ORDER BY (film_id, user_id, timestamp)
+TTL timestamp + INTERVAL ${raw_ttl_days} DAY
+SETTINGS non_replicated_deduplication_window = 1000;
+
+-- Rollups of views, written by the etl with ETL_ROLLUPS=true, kept longer than raw views
+CREATE TABLE IF NOT EXISTS ${database}.ugc_film_views_by_minute${local} ${on_cluster} (
+    film_id UUID,
+    minute DateTime CODEC(DoubleDelta, ZSTD(1)),
+    views SimpleAggregateFunction(sum, UInt64),
+    max_progress_sec SimpleAggregateFunction(max, UInt32),
+    users AggregateFunction(uniq, UUID)
+)
+Engine=${replicated}AggregatingMergeTree(${replication})
+PARTITION BY toYYYYMM(minute)
+ORDER BY (film_id, minute)
+TTL minute + INTERVAL ${rollup_ttl_days} DAY
+SETTINGS non_replicated_deduplication_window = 1000;
+
+CREATE TABLE IF NOT EXISTS ${database}.ugc_user_film_views_by_day${local} ${on_cluster} (
+    user_id UUID,
+    film_id UUID,
+    day Date CODEC(Delta, ZSTD(1)),
+    views SimpleAggregateFunction(sum, UInt64),
+    max_progress_sec SimpleAggregateFunction(max, UInt32),
+    first_view SimpleAggregateFunction(min, DateTime),
+    last_view SimpleAggregateFunction(max, DateTime)
+)
+Engine=${replicated}AggregatingMergeTree(${replication})
+PARTITION BY toYYYYMM(day)
+ORDER BY (user_id, film_id, day)
+TTL day + INTERVAL ${rollup_ttl_days} DAY
+SETTINGS non_replicated_deduplication_window = 1000;
+
+-- Watch sessions, written by the etl with ETL_SESSIONS=true
+CREATE TABLE IF NOT EXISTS ${database}.view_sessions${local} ${on_cluster} (
+    user_id UUID,
+    film_id UUID,
+    start DateTime CODEC(Delta, ZSTD(1)),
+    end DateTime CODEC(Delta, ZSTD(1)),
+    watched_sec UInt32,
+    seeks UInt32
+)
+Engine=${replicated}MergeTree(${replication})
+PARTITION BY toYYYYMM(start)
+ORDER BY (film_id, user_id, start)
+TTL start + INTERVAL ${raw_ttl_days} DAY
+SETTINGS non_replicated_deduplication_window = 1000;
+
+-- On a cluster the etl inserts into the local tables of every shard directly,
+-- reads go through Distributed tables named like the tables above. They shard by
+-- CLICKHOUSE_SHARDING_KEY the way the etl does, so inserts through them agree
+
+-- cluster only
+CREATE TABLE IF NOT EXISTS ${database}.ugc_film_views ${on_cluster}
+AS ${database}.ugc_film_views${local}
+Engine=Distributed(${cluster}, ${database}, ugc_film_views${local}, ${sharding_expression});
+
+-- cluster only
+CREATE TABLE IF NOT EXISTS ${database}.ugc_film_likes ${on_cluster}
+AS ${database}.ugc_film_likes${local}
+Engine=Distributed(${cluster}, ${database}, ugc_film_likes${local}, ${sharding_expression});
+
+-- cluster only
+CREATE TABLE IF NOT EXISTS ${database}.ugc_film_reviews ${on_cluster}
+AS ${database}.ugc_film_reviews${local}
+Engine=Distributed(${cluster}, ${database}, ugc_film_reviews${local}, ${sharding_expression});
+
+-- cluster only
+CREATE TABLE IF NOT EXISTS ${database}.ugc_film_views_by_minute ${on_cluster}
+AS ${database}.ugc_film_views_by_minute${local}
+Engine=Distributed(${cluster}, ${database}, ugc_film_views_by_minute${local}, rand());
+
+-- cluster only
+CREATE TABLE IF NOT EXISTS ${database}.ugc_user_film_views_by_day ${on_cluster}
+AS ${database}.ugc_user_film_views_by_day${local}
+Engine=Distributed(${cluster}, ${database}, ugc_user_film_views_by_day${local}, ${sharding_expression});
+
+-- cluster only
+CREATE TABLE IF NOT EXISTS ${database}.view_sessions ${on_cluster}
+AS ${database}.view_sessions${local}
+Engine=Distributed(${cluster}, ${database}, view_sessions${local}, ${sharding_expression});
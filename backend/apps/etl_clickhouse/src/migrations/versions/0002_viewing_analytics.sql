@@ -0,0 +1,62 @@
+-- Per film and user summaries of views for the analytics api, maintained by
+-- materialized views on every insert into ugc_film_views, so reads never scan raw
+-- views. Both tables hold the same summaries, sorted for reads per film and per user.
+-- Only views inserted after this migration are summarized, see the README to backfill.
+
+CREATE TABLE IF NOT EXISTS ${database}.film_user_views${local} ${on_cluster} (
+    film_id UUID,
+    user_id UUID,
+    views SimpleAggregateFunction(sum, UInt64),
+    max_progress_sec SimpleAggregateFunction(max, UInt32),
+    first_view SimpleAggregateFunction(min, DateTime),
+    last_view SimpleAggregateFunction(max, DateTime)
+)
+Engine=${replicated}AggregatingMergeTree(${replication})
+ORDER BY (film_id, user_id);
+
+CREATE TABLE IF NOT EXISTS ${database}.user_film_views${local} ${on_cluster} (
+    user_id UUID,
+    film_id UUID,
+    views SimpleAggregateFunction(sum, UInt64),
+    max_progress_sec SimpleAggregateFunction(max, UInt32),
+    first_view SimpleAggregateFunction(min, DateTime),
+    last_view SimpleAggregateFunction(max, DateTime)
+)
+Engine=${replicated}AggregatingMergeTree(${replication})
+ORDER BY (user_id, film_id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ${database}.film_user_views_mv${local} ${on_cluster}
+TO ${database}.film_user_views${local}
+AS SELECT
+    film_id,
+    user_id,
+    count() AS views,
+    max(progress_sec) AS max_progress_sec,
+    min(timestamp) AS first_view,
+    max(timestamp) AS last_view
+FROM ${database}.ugc_film_views${local}
+GROUP BY film_id, user_id;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ${database}.user_film_views_mv${local} ${on_cluster}
+TO ${database}.user_film_views${local}
+AS SELECT
+    user_id,
+    film_id,
+    count() AS views,
+    max(progress_sec) AS max_progress_sec,
+    min(timestamp) AS first_view,
+    max(timestamp) AS last_view
+FROM ${database}.ugc_film_views${local}
+GROUP BY user_id, film_id;
+
+-- Views are sharded by user, so summaries of a user stay on one shard
+
+-- cluster only
+CREATE TABLE IF NOT EXISTS ${database}.film_user_views ${on_cluster}
+AS ${database}.film_user_views${local}
+Engine=Distributed(${cluster}, ${database}, film_user_views${local}, ${sharding_expression});
+
+-- cluster only
+CREATE TABLE IF NOT EXISTS ${database}.user_film_views ${on_cluster}
+AS ${database}.user_film_views${local}
+Engine=Distributed(${cluster}, ${database}, user_film_views${local}, ${sharding_expression});
@@ -1,16 +1,36 @@
-from collections.abc import Callable
-from typing import Any
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from typing import Any, Self
 
 import orjson
 from pydantic import BaseModel
 
+MAX_UINT32 = 2**32 - 1
+# ClickHouse DateTime is stored as UInt32 seconds since epoch
+MAX_TIMESTAMP = 2**32
+
 
 def orjson_dumps(value: dict[str, Any], *, default: Any) -> str:
     return orjson.dumps(value, default=default).decode()
 
 
+def utc_from_timestamp(timestamp: float) -> datetime:
+    if not 0 <= timestamp < MAX_TIMESTAMP:
+        raise ValueError(f"timestamp is out of range, timestamp = {timestamp}")
+    return datetime.utcfromtimestamp(timestamp)
+
+
 class AppBaseSchema(BaseModel):
     class Config:
         orm_mode: bool = True
         json_loads: Callable = orjson.loads
         json_dumps: Callable = orjson_dumps
+
+    @classmethod
+    def column_names(cls) -> list[str]:
+        return list(cls.__fields__)
+
+    @classmethod
+    def to_columns(cls, models: Sequence[Self]) -> list[list[Any]]:
+        "Transpose parsed models into per-column lists in column_names() order"
+        return [[getattr(model, name) for model in models] for name in cls.__fields__]
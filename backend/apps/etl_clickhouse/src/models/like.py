@@ -0,0 +1,20 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import Field, validator
+from src.models.base import AppBaseSchema, utc_from_timestamp
+
+
+class LikeMessage(AppBaseSchema):
+    user_id: UUID
+
+    film_id: UUID
+
+    rank: int = Field(ge=1, le=10)
+
+    timestamp: datetime
+
+    @validator("timestamp", pre=True)
+    @classmethod
+    def transform_to_utc_timestamp(cls, timestamp: float):
+        return utc_from_timestamp(timestamp)
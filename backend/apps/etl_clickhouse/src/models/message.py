@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class TopicMessage(BaseModel):
+    key: bytes | None
+    value: bytes
+    topic: str | None = None
+    partition: int | None = None
+    offset: int | None = None
+    headers: tuple[tuple[str, bytes], ...] = ()
@@ -0,0 +1,20 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import validator
+from src.models.base import AppBaseSchema, utc_from_timestamp
+
+
+class ReviewMessage(AppBaseSchema):
+    user_id: UUID
+
+    film_id: UUID
+
+    text: str
+
+    timestamp: datetime
+
+    @validator("timestamp", pre=True)
+    @classmethod
+    def transform_to_utc_timestamp(cls, timestamp: float):
+        return utc_from_timestamp(timestamp)
@@ -1,8 +1,8 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import validator
-from src.models.base import AppBaseSchema
+from pydantic import Field, validator
+from src.models.base import MAX_UINT32, AppBaseSchema, utc_from_timestamp
 
 
 class ViewMessage(AppBaseSchema):
@@ -10,11 +10,11 @@ class ViewMessage(AppBaseSchema):
 
     film_id: UUID
 
-    progress_sec: int
+    progress_sec: int = Field(ge=0, le=MAX_UINT32)
 
     timestamp: datetime
 
     @validator("timestamp", pre=True)
     @classmethod
     def transform_to_utc_timestamp(cls, timestamp: float):
-        return datetime.utcfromtimestamp(timestamp)
+        return utc_from_timestamp(timestamp)
@@ -6,6 +6,11 @@ from src.settings.clickhouse import ClickhouseSettings
 from src.settings.etl import ETLSettings
 from src.settings.kafka import KafkaSettings
 from src.settings.logging import LoggingSettings
+from src.settings.metrics import MetricsSettings
+from src.settings.migrations import MigrationsSettings
+from src.settings.parquet import ParquetSettings
+from src.settings.reprocessor import ReprocessorSettings
+from src.settings.trending import TrendingSettings
 
 
 class AppSettings(BaseAppSettings):
@@ -15,6 +20,11 @@ class AppSettings(BaseAppSettings):
     etl: ETLSettings = ETLSettings()
     logging: LoggingSettings = LoggingSettings()
     clickhouse: ClickhouseSettings = ClickhouseSettings()
+    reprocessor: ReprocessorSettings = ReprocessorSettings()
+    metrics: MetricsSettings = MetricsSettings()
+    parquet: ParquetSettings = ParquetSettings()
+    migrations: MigrationsSettings = MigrationsSettings()
+    trending: TrendingSettings = TrendingSettings()
 
 
 @lru_cache(maxsize=1)
@@ -9,3 +9,25 @@ class ClickhouseSettings(BaseAppSettings):
     user: str = pydantic.Field(env="CLICKHOUSE_USER", default="default")
     password: str = pydantic.Field(env="CLICKHOUSE_PASSWORD", default="")
     table: str = pydantic.Field(env="CLICKHOUSE_TABLE")
+    # Let the server buffer inserts of all workers and write them as one part
+    async_insert: bool = pydantic.Field(env="CLICKHOUSE_ASYNC_INSERT", default=False)
+    # Wait until buffered inserts are written, otherwise offsets may be committed
+    # before the data is and it's lost if the server crashes
+    wait_for_async_insert: bool = pydantic.Field(
+        env="CLICKHOUSE_WAIT_FOR_ASYNC_INSERT", default=True
+    )
+    # Overrides the server's async_insert_busy_timeout_ms if set
+    async_insert_busy_timeout_ms: int | None = pydantic.Field(
+        env="CLICKHOUSE_ASYNC_INSERT_BUSY_TIMEOUT_MS", default=None
+    )
+    # Cluster the migrations create replicated local and Distributed tables on
+    cluster: str = pydantic.Field(env="CLICKHOUSE_CLUSTER", default="")
+    # JSON list of shards, each a list of replicas' host:port, i.e.
+    # [["node1:9000", "node2:9000"], ["node3:9000", "node4:9000"]]. If set, batches
+    # are split by the sharding key and inserted into local tables of every shard
+    shards: list[list[str]] = pydantic.Field(env="CLICKHOUSE_SHARDS", default=[])
+    sharding_key: str = pydantic.Field(env="CLICKHOUSE_SHARDING_KEY", default="user_id")
+    # Local tables are named after the routes' tables with this suffix, i.e. _local
+    local_table_suffix: str = pydantic.Field(
+        env="CLICKHOUSE_LOCAL_TABLE_SUFFIX", default=""
+    )
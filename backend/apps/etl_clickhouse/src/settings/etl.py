@@ -1,7 +1,107 @@
+from enum import StrEnum, unique
+
 import pydantic
 from src.settings.base import BaseAppSettings
 
 
+@unique
+class Sink(StrEnum):
+    CLICKHOUSE: str = "clickhouse"
+    # Parquet files, i.e. to archive raw events
+    PARQUET: str = "parquet"
+
+
+class TopicRoute(pydantic.BaseModel):
+    "Where messages of a topic go, buffer limits fall back to the ETL_* defaults"
+
+    topic: str
+    table: str
+    dlq: str | None = None
+    parking: str | None = None
+    buffer_size: int | None = None
+    max_messages: int | None = None
+    linger_ms: int | None = None
+
+
 class ETLSettings(BaseAppSettings):
+    sink: Sink = pydantic.Field(env="ETL_SINK", default=Sink.CLICKHOUSE)
     buffer_size: int = pydantic.Field(env="ETL_MAX_BUFFER_BYTES", default=10000)
+    max_messages: int = pydantic.Field(env="ETL_MAX_BUFFER_MESSAGES", default=10000)
     linger_ms: int = pydantic.Field(env="ETL_LINGER_MS", default=100)
+    columnar_insert: bool = pydantic.Field(env="ETL_COLUMNAR_INSERT", default=True)
+    max_in_flight_batches: int = pydantic.Field(
+        env="ETL_MAX_IN_FLIGHT_BATCHES", default=2
+    )
+    insert_retries: int = pydantic.Field(env="ETL_INSERT_RETRIES", default=3)
+    # Delay before the first retry, doubled on every next one
+    insert_retry_backoff_ms: int = pydantic.Field(
+        env="ETL_INSERT_RETRY_BACKOFF_MS", default=500
+    )
+    # Pause consumption instead of sending to the DLQ while clickhouse is overloaded
+    backpressure: bool = pydantic.Field(env="ETL_BACKPRESSURE", default=True)
+    # Delay before the first insert probe while paused, doubled up to the max
+    backpressure_probe_backoff_ms: int = pydantic.Field(
+        env="ETL_BACKPRESSURE_PROBE_BACKOFF_MS", default=1000
+    )
+    backpressure_probe_max_backoff_ms: int = pydantic.Field(
+        env="ETL_BACKPRESSURE_PROBE_MAX_BACKOFF_MS", default=30000
+    )
+    # Overloaded batches go to the DLQ after all once paused this long, at most half of
+    # KAFKA_MAX_POLL_INTERVAL_MS as consuming may wait for held batches
+    backpressure_max_pause_sec: int = pydantic.Field(
+        env="ETL_BACKPRESSURE_MAX_PAUSE_SEC", default=120
+    )
+    # Insert views rolled up per film and minute and per user, film and day
+    rollups: bool = pydantic.Field(env="ETL_ROLLUPS", default=False)
+    # With rollups, whether raw views are inserted as well
+    raw_insert: bool = pydantic.Field(env="ETL_RAW_INSERT", default=True)
+    film_minute_table: str = pydantic.Field(
+        env="ETL_FILM_MINUTE_TABLE", default="ugc_film_views_by_minute"
+    )
+    user_film_day_table: str = pydantic.Field(
+        env="ETL_USER_FILM_DAY_TABLE", default="ugc_user_film_views_by_day"
+    )
+    # Reconstruct watch sessions of views and insert the closed ones
+    sessions: bool = pydantic.Field(env="ETL_SESSIONS", default=False)
+    sessions_table: str = pydantic.Field(
+        env="ETL_SESSIONS_TABLE", default="view_sessions"
+    )
+    # Seconds without heartbeats after which a session is closed
+    session_gap_sec: int = pydantic.Field(env="ETL_SESSION_GAP_SEC", default=1800)
+    # Open sessions kept per partition, the least recently active are closed first
+    sessions_max_open: int = pydantic.Field(env="ETL_SESSIONS_MAX_OPEN", default=100000)
+    # Where open sessions are checkpointed, must be shared by all workers
+    sessions_state_dir: str = pydantic.Field(
+        env="ETL_SESSIONS_STATE_DIR", default="sessions_state"
+    )
+    # Adjust buffer sizes between the min and max bytes by insert latency, rows per
+    # insert and active parts of the table, starting from the route's buffer size
+    adaptive_batch_size: bool = pydantic.Field(
+        env="ETL_ADAPTIVE_BATCH_SIZE", default=False
+    )
+    adaptive_min_bytes: int = pydantic.Field(
+        env="ETL_ADAPTIVE_MIN_BYTES", default=100_000
+    )
+    adaptive_max_bytes: int = pydantic.Field(
+        env="ETL_ADAPTIVE_MAX_BYTES", default=64 * 1024 * 1024
+    )
+    adaptive_target_latency_ms: int = pydantic.Field(
+        env="ETL_ADAPTIVE_TARGET_LATENCY_MS", default=1000
+    )
+    adaptive_target_rows: int = pydantic.Field(
+        env="ETL_ADAPTIVE_TARGET_ROWS", default=100_000
+    )
+    # Batches grow regardless of latency from this many active parts in a partition,
+    # well below clickhouse's parts_to_delay_insert
+    adaptive_max_active_parts: int = pydantic.Field(
+        env="ETL_ADAPTIVE_MAX_ACTIVE_PARTS", default=100
+    )
+    adaptive_parts_interval_ms: int = pydantic.Field(
+        env="ETL_ADAPTIVE_PARTS_INTERVAL_MS", default=10000
+    )
+    # Number of worker processes in the consumer group, more than one starts a supervisor
+    workers: int = pydantic.Field(env="ETL_WORKERS", default=1)
+    # JSON list of TopicRoute, i.e. [{"topic": "likes", "table": "ugc_film_likes"}],
+    # if empty the single KAFKA_TOPIC -> CLICKHOUSE_TABLE route is used. Those stay
+    # required either way, replay defaults to KAFKA_TOPIC
+    routes: list[TopicRoute] = pydantic.Field(env="ETL_ROUTES", default=[])
@@ -8,7 +8,35 @@ class KafkaSettings(BaseAppSettings):
     consumer_group_id: str = pydantic.Field(env="KAFKA_GROUP_ID")
     topic: str = pydantic.Field(env="KAFKA_TOPIC")
     dlq: str = pydantic.Field(env="KAFKA_DLQ")
+    # Records returned by one getmany at most, and how long it waits for any
+    max_records: int = pydantic.Field(env="KAFKA_MAX_RECORDS", default=5_000)
+    getmany_timeout_ms: int = pydantic.Field(
+        env="KAFKA_GETMANY_TIMEOUT_MS", default=500
+    )
+    # Brokers answer a fetch once they have fetch_min_bytes or fetch_max_wait_ms passed,
+    # larger fetches mean fewer round trips per message under load
+    fetch_min_bytes: int = pydantic.Field(env="KAFKA_FETCH_MIN_BYTES", default=1)
+    fetch_max_wait_ms: int = pydantic.Field(env="KAFKA_FETCH_MAX_WAIT_MS", default=500)
+    fetch_max_bytes: int = pydantic.Field(
+        env="KAFKA_FETCH_MAX_BYTES", default=50 * 1024 * 1024
+    )
+    max_partition_fetch_bytes: int = pydantic.Field(
+        env="KAFKA_MAX_PARTITION_FETCH_BYTES", default=1024 * 1024
+    )
+    # The consumer leaves the group if it doesn't poll for this long
+    max_poll_interval_ms: int = pydantic.Field(
+        env="KAFKA_MAX_POLL_INTERVAL_MS", default=300_000
+    )
 
     @property
     def dsn(self) -> str:
         return f"{self.host}:{self.port}"
+
+    def fetch_options(self) -> dict[str, int]:
+        "Fetch tuning of AIOKafkaConsumer"
+        return {
+            "fetch_min_bytes": self.fetch_min_bytes,
+            "fetch_max_wait_ms": self.fetch_max_wait_ms,
+            "fetch_max_bytes": self.fetch_max_bytes,
+            "max_partition_fetch_bytes": self.max_partition_fetch_bytes,
+        }
@@ -0,0 +1,10 @@
+import pydantic
+from src.settings.base import BaseAppSettings
+
+
+class MetricsSettings(BaseAppSettings):
+    enabled: bool = pydantic.Field(env="METRICS_ENABLED", default=False)
+    # With several workers every worker serves metrics on port + its index
+    port: int = pydantic.Field(env="METRICS_PORT", default=8000)
+    # How often consumer lag is refreshed
+    lag_interval_ms: int = pydantic.Field(env="METRICS_LAG_INTERVAL_MS", default=5000)
@@ -0,0 +1,13 @@
+import pydantic
+from src.settings.base import BaseAppSettings
+
+
+class MigrationsSettings(BaseAppSettings):
+    # Apply pending clickhouse migrations before consuming
+    on_startup: bool = pydantic.Field(env="MIGRATIONS_ON_STARTUP", default=False)
+    # Retention of raw events and sessions, and of rollups. Only used when tables are
+    # created, changing them later needs a migration with ALTER TABLE ... MODIFY TTL
+    raw_ttl_days: int = pydantic.Field(env="MIGRATIONS_RAW_TTL_DAYS", default=365)
+    rollup_ttl_days: int = pydantic.Field(
+        env="MIGRATIONS_ROLLUP_TTL_DAYS", default=3 * 365
+    )
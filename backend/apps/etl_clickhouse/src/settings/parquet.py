@@ -0,0 +1,13 @@
+import pydantic
+from src.settings.base import BaseAppSettings
+
+
+class ParquetSettings(BaseAppSettings):
+    # Root of topic=<topic>/date=<yyyy-mm-dd> partitions
+    directory: str = pydantic.Field(env="PARQUET_DIR", default="archive")
+    compression: str = pydantic.Field(env="PARQUET_COMPRESSION", default="zstd")
+    # A batch's file is rolled over to the next one once it's this large
+    max_file_bytes: int = pydantic.Field(
+        env="PARQUET_MAX_FILE_BYTES", default=128 * 1024 * 1024
+    )
+    row_group_rows: int = pydantic.Field(env="PARQUET_ROW_GROUP_ROWS", default=100_000)
@@ -0,0 +1,17 @@
+import pydantic
+from src.settings.base import BaseAppSettings
+
+
+class ReprocessorSettings(BaseAppSettings):
+    consumer_group_id: str = pydantic.Field(
+        env="DLQ_GROUP_ID", default="etl_clickhouse_dlq"
+    )
+    # Messages failing this many times are moved to the route's parking topic
+    max_attempts: int = pydantic.Field(env="DLQ_MAX_ATTEMPTS", default=5)
+    batch_size: int = pydantic.Field(env="DLQ_BATCH_SIZE", default=1000)
+    max_messages_per_sec: int = pydantic.Field(
+        env="DLQ_MAX_MESSAGES_PER_SEC", default=1000
+    )
+    # Pause after a batch with failed messages, doubled while batches keep failing
+    backoff_ms: int = pydantic.Field(env="DLQ_BACKOFF_MS", default=1000)
+    max_backoff_ms: int = pydantic.Field(env="DLQ_MAX_BACKOFF_MS", default=60000)
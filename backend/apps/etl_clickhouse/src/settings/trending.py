@@ -0,0 +1,19 @@
+import pydantic
+from src.settings.base import BaseAppSettings
+
+
+class TrendingSettings(BaseAppSettings):
+    redis_host: str = pydantic.Field(env="REDIS_HOST", default="localhost")
+    redis_port: int = pydantic.Field(env="REDIS_PORT", default=6379)
+    # Rankings are written to sorted sets named <prefix>:<hours>h, read by films_api
+    key_prefix: str = pydantic.Field(
+        env="TRENDING_KEY_PREFIX", default="trending:films"
+    )
+    # Sliding windows of views ranked, in hours
+    windows_hours: list[int] = pydantic.Field(
+        env="TRENDING_WINDOWS_HOURS", default=[1, 24, 7 * 24]
+    )
+    top_n: int = pydantic.Field(env="TRENDING_TOP_N", default=500)
+    interval_sec: float = pydantic.Field(env="TRENDING_INTERVAL_SEC", default=60)
+    # Rankings expire if the job stops refreshing them, rather than going stale
+    key_ttl_sec: int = pydantic.Field(env="TRENDING_KEY_TTL_SEC", default=15 * 60)
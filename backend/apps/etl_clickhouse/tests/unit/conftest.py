@@ -0,0 +1,8 @@
+import os
+
+# Settings are read on import, unit tests don't connect anywhere
+os.environ.setdefault("KAFKA_GROUP_ID", "etl_unit_tests")
+os.environ.setdefault("CLICKHOUSE_DB", "etl_unit_tests")
+os.environ.setdefault("KAFKA_TOPIC", "views")
+os.environ.setdefault("KAFKA_DLQ", "views_dlq")
+os.environ.setdefault("CLICKHOUSE_TABLE", "ugc_film_views")
@@ -0,0 +1,23 @@
+from uuid import UUID, uuid4
+
+from src.etl.analytical_db import shard_index, sharding_expression
+
+
+def test_shard_index_of_uuid_and_its_string_agree():
+    for _ in range(100):
+        user_id = uuid4()
+        assert shard_index(user_id, 3) == shard_index(str(user_id), 3)
+
+
+def test_shard_index_spreads_keys_over_shards():
+    shards = [shard_index(uuid4(), 4) for _ in range(1000)]
+
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_shard_index_is_cityhash_of_string():
+    user_id = UUID("6c1a1b4e-8d3f-4a55-9f52-1b0f9a6f2d11")
+
+    # Changing it between releases would put a user's rows on two shards
+    assert shard_index(user_id, 2**64) == 6847774381693583786
+    assert sharding_expression("user_id") == "cityHash64(toString(user_id))"
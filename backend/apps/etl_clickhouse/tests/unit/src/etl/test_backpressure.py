@@ -0,0 +1,195 @@
+import asyncio
+from collections.abc import Iterable
+from typing import Any
+from uuid import uuid4
+
+import orjson
+import pytest
+from aiokafka import TopicPartition
+from asynch.errors import ServerException
+from src.etl.analytical_db import AnalyticalRepository
+from src.etl.backpressure import Backpressure, is_overload
+from src.etl.decoders import ViewBatchDecoder
+from src.etl.topic_handler import KafkaToDatabaseHandler
+from src.exceptions.exception import (
+    BatchDroppedException,
+    BatchInsertException,
+    ShardsInsertException,
+)
+from src.models.message import TopicMessage
+from src.models.view import ViewMessage
+
+pytestmark = pytest.mark.asyncio
+
+TOPIC = "views"
+TOO_MANY_PARTS = 252
+UNKNOWN_TABLE = 60
+
+
+class FakeConsumer:
+    def __init__(self, assignment: set[TopicPartition]) -> None:
+        self._assignment = assignment
+        self.paused: set[TopicPartition] = set()
+        self.pauses = 0
+
+    def assignment(self) -> set[TopicPartition]:
+        return self._assignment
+
+    def pause(self, *partitions: TopicPartition) -> None:
+        self.pauses += 1
+        self.paused |= set(partitions)
+
+    def resume(self, *partitions: TopicPartition) -> None:
+        self.paused -= set(partitions)
+
+
+class FakeProducer:
+    def __init__(self) -> None:
+        self.sent: list[bytes] = []
+
+    async def send(self, topic: str, value: bytes, key: bytes | None = None) -> None:
+        self.sent.append(value)
+
+
+class OverloadedRepository(AnalyticalRepository):
+    "Fails every insert as clickhouse does while merges fall behind"
+
+    def __init__(self) -> None:
+        self.attempts = 0
+
+    async def insert_batch(
+        self,
+        table: str,
+        keys: Iterable[str],
+        data: list[dict[str, Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        await self.insert_columns(table, keys, [], dedup_token)
+
+    async def insert_columns(
+        self,
+        table: str,
+        keys: Iterable[str],
+        columns: list[list[Any]],
+        dedup_token: str | None = None,
+    ) -> None:
+        self.attempts += 1
+        raise BatchInsertException from ServerException(
+            "Too many parts", TOO_MANY_PARTS
+        )
+
+    async def active_parts(self, table: str) -> int:
+        return 0
+
+
+def views(partition: int, n: int) -> list[TopicMessage]:
+    return [
+        TopicMessage(
+            key=None,
+            value=orjson.dumps(
+                {
+                    "user_id": str(uuid4()),
+                    "film_id": str(uuid4()),
+                    "progress_sec": i,
+                    "timestamp": 1700000000,
+                }
+            ),
+            topic=TOPIC,
+            partition=partition,
+            offset=i,
+        )
+        for i in range(n)
+    ]
+
+
+def insert_error(cause: BaseException) -> BatchInsertException:
+    try:
+        raise BatchInsertException from cause
+    except BatchInsertException as e:
+        return e
+
+
+async def test_overloaded_batch_goes_to_dlq_after_max_pause():
+    tp = TopicPartition(TOPIC, 0)
+    consumer = FakeConsumer({tp})
+    producer = FakeProducer()
+    repository = OverloadedRepository()
+    handler = KafkaToDatabaseHandler(
+        schema=ViewMessage,
+        consumer=consumer,
+        producer=producer,
+        dlq_topic="dlq",
+        analytical_repository=repository,
+        db_table="views",
+        decoder=ViewBatchDecoder(),
+        backpressure=Backpressure(
+            consumer, probe_backoff_ms=10, probe_max_backoff_ms=20, max_pause_sec=0.1
+        ),
+    )
+    messages = views(0, 3)
+
+    await asyncio.wait_for(handler.handle_batch(messages), 5)
+
+    assert producer.sent == [message.value for message in messages]
+    assert repository.attempts > 2
+    assert consumer.pauses == 1
+    assert consumer.paused == set()
+
+
+async def test_revocation_drops_held_batch():
+    tp = TopicPartition(TOPIC, 0)
+    consumer = FakeConsumer({tp})
+    backpressure = Backpressure(consumer, probe_backoff_ms=60000, max_pause_sec=120)
+    repository = OverloadedRepository()
+
+    held = asyncio.create_task(
+        backpressure.wait(
+            lambda: repository.insert_columns("views", [], []), "views", {tp}
+        )
+    )
+    await asyncio.sleep(0.01)
+    assert consumer.paused == {tp}
+
+    backpressure.on_partitions_revoked({tp})
+    # Wakes up long before the next probe
+    with pytest.raises(BatchDroppedException):
+        await asyncio.wait_for(held, 1)
+    assert repository.attempts == 0
+    assert not backpressure.paused
+    assert consumer.paused == set()
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (insert_error(ServerException("Too many parts", TOO_MANY_PARTS)), True),
+        (insert_error(ServerException("Unknown table", UNKNOWN_TABLE)), False),
+        (insert_error(TimeoutError()), True),
+        (insert_error(ValueError("bad value")), False),
+        (
+            insert_error(
+                ShardsInsertException(
+                    "Shards = [1] failed",
+                    failed_shards={1},
+                    sharding_key="user_id",
+                    shards_n=2,
+                )
+            ),
+            False,
+        ),
+    ],
+)
+async def test_is_overload_walks_causes(error: BaseException, expected: bool):
+    assert is_overload(error) is expected
+
+
+async def test_is_overload_finds_overload_of_a_shard():
+    shard_error = insert_error(
+        insert_error(ServerException("Memory limit exceeded", 241))
+    )
+    error = ShardsInsertException(
+        "Shards = [1] failed", failed_shards={1}, sharding_key="user_id", shards_n=2
+    )
+    error.__cause__ = shard_error
+
+    assert is_overload(error)
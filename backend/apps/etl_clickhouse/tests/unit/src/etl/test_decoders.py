@@ -0,0 +1,40 @@
+from uuid import uuid4
+
+import orjson
+from src.etl.decoders import ViewBatchDecoder
+
+
+def view(progress_sec, timestamp=1700000000) -> bytes:
+    return orjson.dumps(
+        {
+            "user_id": str(uuid4()),
+            "film_id": str(uuid4()),
+            "progress_sec": progress_sec,
+            "timestamp": timestamp,
+        }
+    )
+
+
+def test_fast_path_rows():
+    decoded = ViewBatchDecoder().decode([view(1), view(2), view(3)])
+
+    assert decoded.columns[2] == [1, 2, 3]
+    assert decoded.columns[3] == [1700000000] * 3
+    assert decoded.invalid == []
+
+
+def test_slow_path_rows_keep_message_order():
+    values = [view("5", 1), view(6, 2), view(7, 3), view("8", 4), view(-1, 5)]
+    decoded = ViewBatchDecoder().decode(values)
+
+    assert decoded.columns[2] == [5, 6, 7, 8]
+    assert decoded.columns[3] == [1, 2, 3, 4]
+    assert decoded.invalid == [4]
+
+
+def test_unparsable_rows_are_invalid():
+    values = [b"{", view(1), orjson.dumps({"user_id": "nope"}), view(2.5)]
+    decoded = ViewBatchDecoder().decode(values)
+
+    assert decoded.columns[2] == [1, 2]
+    assert decoded.invalid == [0, 2]
@@ -0,0 +1,104 @@
+import asyncio
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import pytest
+from aiokafka import TopicPartition
+from src.etl.partitions import FlushOnRevokeListener, PartitionBuffers
+from src.etl.pipeline import BatchPipeline
+from src.etl.routing import Route
+from src.models.message import TopicMessage
+
+pytestmark = pytest.mark.asyncio
+
+TOPIC = "views"
+TP = TopicPartition(TOPIC, 0)
+
+
+@dataclass
+class Record:
+    offset: int
+    key: bytes | None = None
+    value: bytes | None = b"{}"
+
+
+class FakeConsumer:
+    def __init__(self) -> None:
+        self.commits: list[dict[TopicPartition, int]] = []
+
+    async def commit(self, offsets: dict[TopicPartition, int]) -> None:
+        self.commits.append(offsets)
+
+
+class RecordingHandler:
+    def __init__(self) -> None:
+        self.batches: list[list[int]] = []
+        self.gate: asyncio.Future | None = None
+
+    async def __call__(self, messages: Sequence[TopicMessage]) -> None:
+        self.batches.append([message.offset for message in messages])
+        if self.gate is not None and len(self.batches) == 1:
+            await self.gate
+
+
+def records(first: int, last: int) -> list[Record]:
+    return [Record(offset) for offset in range(first, last + 1)]
+
+
+def make_buffers(
+    consumer: FakeConsumer, handler: RecordingHandler, linger_ms: int = 0
+) -> PartitionBuffers:
+    route = Route(
+        topic=TOPIC,
+        table="ugc_film_views",
+        dlq="views_dlq",
+        parking="views_dlq_parked",
+        buffer_size=1024 * 1024,
+        max_messages=0,
+        linger_ms=linger_ms,
+    )
+    pipeline = BatchPipeline(consumer, handler, max_in_flight=1, topic=TOPIC)
+    return PartitionBuffers({TOPIC: (route, pipeline)})
+
+
+async def test_revoked_partition_isnt_buffered_until_assigned_again():
+    consumer = FakeConsumer()
+    handler = RecordingHandler()
+    buffers = make_buffers(consumer, handler)
+    listener = FlushOnRevokeListener(buffers)
+
+    await buffers.extend(TP, records(0, 4))
+    await listener.on_partitions_revoked({TP})
+    assert handler.batches == [[0, 1, 2, 3, 4]]
+    assert consumer.commits == [{TP: 5}]
+
+    # Fetched before the revocation, the partition's new owner consumes it
+    await buffers.extend(TP, records(5, 9))
+    await buffers.close([TP])
+    assert handler.batches == [[0, 1, 2, 3, 4]]
+    assert consumer.commits == [{TP: 5}]
+
+    await listener.on_partitions_assigned({TP})
+    await buffers.extend(TP, records(5, 9))
+    await buffers.close([TP])
+    assert handler.batches[-1] == [5, 6, 7, 8, 9]
+    assert consumer.commits[-1] == {TP: 10}
+
+
+async def test_lingering_flush_waiting_for_a_slot_survives_close():
+    consumer = FakeConsumer()
+    handler = RecordingHandler()
+    handler.gate = asyncio.get_running_loop().create_future()
+    buffers = make_buffers(consumer, handler, linger_ms=10)
+
+    await buffers.extend(TP, records(0, 4))
+    await asyncio.sleep(0.05)
+    # The first batch holds the only slot, so the second one's flush waits for it
+    await buffers.extend(TP, records(5, 9))
+    await asyncio.sleep(0.05)
+
+    asyncio.get_running_loop().call_later(0.05, handler.gate.set_result, None)
+    await buffers.close([TP])
+
+    assert handler.batches == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]]
+    assert consumer.commits[-1] == {TP: 10}
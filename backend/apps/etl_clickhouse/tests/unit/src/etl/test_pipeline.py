@@ -0,0 +1,119 @@
+import asyncio
+from collections.abc import Sequence
+
+import pytest
+from aiokafka import TopicPartition
+from src.etl.pipeline import BatchPipeline
+from src.exceptions.exception import BatchDroppedException, BatchInsertException
+from src.models.message import TopicMessage
+
+pytestmark = pytest.mark.asyncio
+
+TOPIC = "views"
+
+
+class FakeConsumer:
+    def __init__(self) -> None:
+        self.commits: list[dict[TopicPartition, int]] = []
+
+    async def commit(self, offsets: dict[TopicPartition, int]) -> None:
+        self.commits.append(offsets)
+
+
+class ControlledHandler:
+    "Finishes every batch only when the test says so, keyed by partition and first offset"
+
+    def __init__(self) -> None:
+        self.outcomes: dict[tuple[int, int], asyncio.Future] = {}
+
+    def outcome(self, partition: int, first: int) -> asyncio.Future:
+        key = (partition, first)
+        if key not in self.outcomes:
+            self.outcomes[key] = asyncio.get_running_loop().create_future()
+        return self.outcomes[key]
+
+    async def __call__(self, messages: Sequence[TopicMessage]) -> None:
+        error = await self.outcome(messages[0].partition, messages[0].offset)
+        if error is not None:
+            raise error
+
+
+def batch(partition: int, first: int, last: int) -> list[TopicMessage]:
+    return [
+        TopicMessage(key=None, value=b"", topic=TOPIC, partition=partition, offset=i)
+        for i in range(first, last + 1)
+    ]
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def consumer() -> FakeConsumer:
+    return FakeConsumer()
+
+
+@pytest.fixture
+def handler() -> ControlledHandler:
+    return ControlledHandler()
+
+
+@pytest.fixture
+def pipeline(consumer: FakeConsumer, handler: ControlledHandler) -> BatchPipeline:
+    return BatchPipeline(consumer, handler, max_in_flight=4, topic=TOPIC)
+
+
+async def test_offsets_are_committed_in_submit_order(
+    consumer: FakeConsumer, handler: ControlledHandler, pipeline: BatchPipeline
+):
+    await pipeline.submit(batch(0, 0, 9))
+    await pipeline.submit(batch(0, 10, 19))
+
+    handler.outcome(0, 10).set_result(None)
+    await settle()
+    assert consumer.commits == []
+
+    handler.outcome(0, 0).set_result(None)
+    await pipeline.join()
+    assert consumer.commits == [{TopicPartition(TOPIC, 0): 20}]
+
+
+async def test_failed_batch_blocks_later_offsets(
+    consumer: FakeConsumer, handler: ControlledHandler, pipeline: BatchPipeline
+):
+    await pipeline.submit(batch(0, 0, 9))
+    await pipeline.submit(batch(1, 0, 9))
+
+    handler.outcome(1, 0).set_result(None)
+    handler.outcome(0, 0).set_result(BatchInsertException("failed"))
+
+    with pytest.raises(BatchInsertException):
+        await pipeline.join()
+    with pytest.raises(BatchInsertException):
+        await pipeline.submit(batch(1, 10, 19))
+    assert consumer.commits == []
+
+
+async def test_dropped_partitions_are_committed_once_forgotten(
+    consumer: FakeConsumer, handler: ControlledHandler, pipeline: BatchPipeline
+):
+    await pipeline.submit(batch(0, 0, 9))
+    await pipeline.submit(batch(0, 10, 19))
+    await pipeline.submit(batch(1, 0, 9))
+
+    handler.outcome(0, 0).set_result(BatchDroppedException("revoked"))
+    handler.outcome(0, 10).set_result(None)
+    handler.outcome(1, 0).set_result(None)
+    await pipeline.join()
+    # Committing past the dropped batch would skip it for the partition's new owner
+    assert consumer.commits == [{TopicPartition(TOPIC, 1): 10}]
+
+    # Once the partition's buffer is closed it's consumed again from the last commit
+    pipeline.committer.forget_dropped({TopicPartition(TOPIC, 0)})
+    del handler.outcomes[(0, 0)]
+    await pipeline.submit(batch(0, 0, 9))
+    handler.outcome(0, 0).set_result(None)
+    await pipeline.join()
+    assert consumer.commits[-1] == {TopicPartition(TOPIC, 0): 10}
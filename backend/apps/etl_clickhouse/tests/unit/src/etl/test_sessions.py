@@ -0,0 +1,105 @@
+from pathlib import Path
+from uuid import uuid4
+
+import orjson
+import pytest
+from aiokafka import TopicPartition
+from src.etl.decoders import ViewBatchDecoder
+from src.etl.sessions import WatchSessions
+from src.models.message import TopicMessage
+
+pytestmark = pytest.mark.asyncio
+
+TOPIC = "views"
+USER_ID = uuid4()
+FILM_ID = uuid4()
+START = 1700000000
+
+
+def heartbeats(offsets: list[int]) -> list[TopicMessage]:
+    "A heartbeat every 10 seconds of a viewer watching without seeking"
+    return [
+        TopicMessage(
+            key=None,
+            value=orjson.dumps(
+                {
+                    "user_id": str(USER_ID),
+                    "film_id": str(FILM_ID),
+                    "progress_sec": offset * 10,
+                    "timestamp": START + offset * 10,
+                }
+            ),
+            topic=TOPIC,
+            partition=0,
+            offset=offset,
+        )
+        for offset in offsets
+    ]
+
+
+def apply(sessions: WatchSessions, offsets: list[int]) -> None:
+    decoder = ViewBatchDecoder()
+    messages = heartbeats(offsets)
+    batch = decoder.decode([message.value for message in messages])
+    sessions.apply(messages, batch, decoder)
+
+
+def checkpoint(sessions: WatchSessions, state_dir: Path) -> None:
+    tracker = sessions._trackers[(TOPIC, 0)]
+    (state_dir / f"{TOPIC}-0.json").write_bytes(tracker.dump())
+
+
+def watched_sec(sessions: WatchSessions) -> int:
+    [session] = sessions._trackers[(TOPIC, 0)].open.values()
+    return session.watched_sec
+
+
+@pytest.fixture
+def sessions(tmp_path: Path) -> WatchSessions:
+    return WatchSessions("view_sessions", str(tmp_path), gap_sec=600, max_open=100)
+
+
+async def test_offset_gaps_keep_state_in_memory(
+    sessions: WatchSessions, tmp_path: Path
+):
+    apply(sessions, [0, 1])
+    checkpoint(sessions, tmp_path)
+    apply(sessions, [2, 3])
+
+    # Transaction markers leave gaps in offsets, the checkpoint is older than memory
+    apply(sessions, [5, 6])
+
+    assert sessions._trackers[(TOPIC, 0)].offset == 6
+    assert watched_sec(sessions) == 60
+
+
+async def test_consuming_again_from_earlier_offset_reloads_checkpoint(
+    sessions: WatchSessions, tmp_path: Path
+):
+    apply(sessions, [0, 1, 2])
+    checkpoint(sessions, tmp_path)
+    apply(sessions, [3, 4])
+
+    apply(sessions, [3, 4, 5])
+
+    assert sessions._trackers[(TOPIC, 0)].offset == 5
+    assert watched_sec(sessions) == 50
+
+
+async def test_revoked_partition_is_reloaded_when_assigned_again(
+    sessions: WatchSessions, tmp_path: Path
+):
+    apply(sessions, [0, 1])
+    checkpoint(sessions, tmp_path)
+    await sessions.forget({TopicPartition(TOPIC, 0)})
+    assert sessions._trackers == {}
+
+    # Meanwhile another worker applied more heartbeats and checkpointed them
+    other = WatchSessions("view_sessions", str(tmp_path), gap_sec=600, max_open=100)
+    apply(other, [2, 3])
+    checkpoint(other, tmp_path)
+
+    apply(sessions, [4])
+
+    assert sessions._trackers[(TOPIC, 0)].offset == 4
+    assert watched_sec(sessions) == 40
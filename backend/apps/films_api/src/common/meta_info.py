@@ -41,6 +41,11 @@ class SearchQuery(MetaInfoParam):
     description: str = "Query string for the items to search"
 
 
+class TrendingWindow(MetaInfoParam):
+    title: str = "Trending window in hours"
+    description: str = "Hours of views to rank trending items by"
+
+
 class DefaultMetaInfo(BaseModel):
     sort_by: SortBy = SortBy()
     order_by: OrderBy = OrderBy()
@@ -49,3 +54,4 @@ class DefaultMetaInfo(BaseModel):
     filter_by: FilterBy = FilterBy()
     filter_value: FilterValue = FilterValue()
     search_query: SearchQuery = SearchQuery()
+    trending_window: TrendingWindow = TrendingWindow()
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Any, Generic, Type, TypeVar
+from typing import Any, Generic, Sequence, Type, TypeVar
 
 from src.common.utils import ESHandler
 from src.settings.app import AppSettings
@@ -26,6 +26,10 @@ class AbstractRepository(ABC, Generic[T]):
     async def find_by_query(self, query: dict[str, Any]) -> list[T]:
         pass
 
+    @abstractmethod
+    async def find_by_ids(self, primary_keys: Sequence[Any]) -> list[T]:
+        pass
+
     @abstractmethod
     def repository_type(self) -> RepositoryType:
         pass
@@ -49,5 +53,11 @@ class ESRepository(AbstractRepository[T]):
             return []
         return [self.schema(**entity) for entity in raw_entities]
 
+    async def find_by_ids(self, primary_keys: Sequence[Any]) -> list[T]:
+        raw_entities = await self.es_handler.mget(
+            self.index, [str(primary_key) for primary_key in primary_keys]
+        )
+        return [self.schema(**entity) for entity in raw_entities]
+
     def repository_type(self) -> RepositoryType:
         return RepositoryType.ES
@@ -46,6 +46,19 @@ class ESHandler:
             raise ElasticsearchRepositoryError from err
         return doc["_source"]
 
+    async def mget(self, index: str, item_ids: list[str]) -> list[dict[str, Any]]:
+        "Found documents in the order of ids, missing ones are skipped"
+        if not item_ids:
+            return []
+        try:
+            docs = await self.client.mget(index=index, body={"ids": item_ids})
+        except NotFoundError:
+            return []
+        except RequestError as err:
+            logger.error(err)
+            raise ElasticsearchRepositoryError from err
+        return [doc["_source"] for doc in docs["docs"] if doc.get("found")]
+
     async def scan(
         self, index: str, query: dict[str, Any]
     ) -> AsyncGenerator[dict[str, Any], None]:
@@ -6,6 +6,7 @@ from src.films.dependencies import (
     get_films,
     get_personalized_films,
     get_searched_films,
+    get_trending_films,
 )
 from src.films.settings import FilmSettings
 
@@ -71,6 +72,28 @@ async def personalized_films_list(
     return films
 
 
+@router.get(
+    path="/trending",
+    response_model=list[schemas.Film],
+    summary="Trending films list",
+    description="Get paginated films list sorted by viewers within the window",
+    response_description="Film id, title and rating",
+)
+@cache(
+    expire=film_settings.trending_cache_expire_in_seconds,
+    namespace="films_trending",
+)
+async def trending_films_list(
+    films: list[schemas.Film] = Depends(get_trending_films),
+) -> list[schemas.Film]:
+    """Get list of trending films.
+
+    Example:
+    `GET /api/v1/films/trending?window_hours=24&page_number=1&page_size=50`.
+    """
+    return films
+
+
 @router.get(
     path="/search",
     response_model=list[schemas.Film],
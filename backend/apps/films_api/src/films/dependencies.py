@@ -4,23 +4,29 @@ from typing import Annotated
 from uuid import UUID
 
 from fastapi import Depends
-from src.common.database import get_elastic_handler
+from redis.asyncio import Redis
+from src.common.database import get_elastic_handler, get_redis
 from src.common.dependencies import check_permission
 from src.common.permission import Permissions
 from src.common.schemas import JwtClaims
 from src.common.utils import ESHandler, models_to_schemas
 from src.films.exceptions import FilmNotFound
-from src.films.params import FilmRequestParams
+from src.films.params import FilmRequestParams, TrendingFilmRequestParams
 from src.films.repository import ESFilmRepository
 from src.films.schemas import DetailFilm, Film
 from src.films.service import (
     FilmService,
     MockRecommendationService,
+    RedisTrendingService,
     StandardFilmService,
+    TrendingService,
 )
+from src.films.settings import FilmSettings
 
 logger = getLogger("root")
 
+film_settings = FilmSettings.get()
+
 CanReadFilms = Annotated[
     JwtClaims | None, Depends(check_permission(Permissions.can_read_films))
 ]
@@ -34,6 +40,10 @@ def get_film_service(
     return StandardFilmService(film_repository)
 
 
+def get_trending_service(redis: Redis = Depends(get_redis)) -> TrendingService:
+    return RedisTrendingService(redis, film_settings.trending_key_prefix)
+
+
 async def get_film(
     film_id: UUID,
     service: FilmService = Depends(get_film_service),
@@ -72,3 +82,13 @@ async def get_personalized_films(
     request_params = await recommendation_service.get_user_preferences(user_id)
     film_models = await film_service.find_films_by_params(request_params)
     return models_to_schemas(film_models, Film)
+
+
+async def get_trending_films(
+    request_params: TrendingFilmRequestParams = Depends(TrendingFilmRequestParams),
+    film_service: FilmService = Depends(get_film_service),
+    trending_service: TrendingService = Depends(get_trending_service),
+) -> list[Film]:
+    film_ids = await trending_service.get_trending_film_ids(request_params)
+    film_models = await film_service.find_films_by_ids(film_ids)
+    return models_to_schemas(film_models, Film)
@@ -10,6 +10,9 @@ from src.common.dependencies import (
     PaginationRequestParams,
     SortRequestParams,
 )
+from src.films.settings import FilmSettings
+
+film_settings = FilmSettings.get()
 
 
 class FilmSortOptions(str, Enum):
@@ -72,3 +75,23 @@ class FilmRequestParams(
             },
         }
         return filter_subquery
+
+
+class TrendingFilmRequestParams(PaginationRequestParams):
+    window_hours: Annotated[
+        int,
+        Query(
+            title=META_INFO.trending_window.title,
+            description=META_INFO.trending_window.description,
+            ge=1,
+        ),
+    ] = film_settings.trending_default_window_hours
+
+    @property
+    def start(self) -> int:
+        return (self.page_number - 1) * self.page_size
+
+    @property
+    def end(self) -> int:
+        "Inclusive, like redis ranges"
+        return self.start + self.page_size - 1
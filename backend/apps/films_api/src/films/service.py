@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
+from typing import Sequence
 from uuid import UUID
 
+from redis.asyncio import Redis
 from src.films.models import Film
-from src.films.params import FilmRequestParams
+from src.films.params import FilmRequestParams, TrendingFilmRequestParams
 from src.films.repository import FilmRepository
 
 
@@ -15,6 +17,10 @@ class FilmService(ABC):
     async def find_films_by_params(self, params: FilmRequestParams) -> list[Film]:
         pass
 
+    @abstractmethod
+    async def find_films_by_ids(self, primary_keys: Sequence[UUID]) -> list[Film]:
+        pass
+
 
 class RecommendationService(ABC):
     @abstractmethod
@@ -22,6 +28,14 @@ class RecommendationService(ABC):
         pass
 
 
+class TrendingService(ABC):
+    @abstractmethod
+    async def get_trending_film_ids(
+        self, params: TrendingFilmRequestParams
+    ) -> list[UUID]:
+        pass
+
+
 class StandardFilmService(FilmService):
     def __init__(self, film_repository: FilmRepository) -> None:
         super().__init__()
@@ -34,6 +48,9 @@ class StandardFilmService(FilmService):
         db_params = params.to_db_params(self.film_repository.repository_type())
         return await self.film_repository.find_by_query(db_params)
 
+    async def find_films_by_ids(self, primary_keys: Sequence[UUID]) -> list[Film]:
+        return await self.film_repository.find_by_ids(primary_keys)
+
 
 class MockRecommendationService(RecommendationService):
     async def get_user_preferences(self, user_id: UUID) -> FilmRequestParams:
@@ -44,3 +61,23 @@ class MockRecommendationService(RecommendationService):
         But for now we will return the default params.
         """
         return FilmRequestParams(query="Shooter", page_number=1, page_size=50)
+
+
+class RedisTrendingService(TrendingService):
+    """Reads trending films ranked by etl_clickhouse from redis sorted sets.
+
+    Rankings are precomputed periodically, so requests never query analytics.
+    A window that isn't ranked has no trending films.
+    """
+
+    def __init__(self, redis: Redis, key_prefix: str) -> None:
+        super().__init__()
+        self.redis = redis
+        self.key_prefix = key_prefix
+
+    async def get_trending_film_ids(
+        self, params: TrendingFilmRequestParams
+    ) -> list[UUID]:
+        key = f"{self.key_prefix}:{params.window_hours}h"
+        film_ids = await self.redis.zrevrange(key, params.start, params.end)
+        return [UUID(film_id.decode()) for film_id in film_ids]
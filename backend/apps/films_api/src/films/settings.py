@@ -8,3 +8,16 @@ class FilmSettings(BaseAppSettings["FilmSettings"]):
         env="FILM_CACHE_EXPIRE_IN_SECONDS",
         default=300,
     )
+    # Sorted sets of trending film ids, <prefix>:<hours>h, published by etl_clickhouse
+    trending_key_prefix: str = pydantic.Field(
+        env="TRENDING_KEY_PREFIX",
+        default="trending:films",
+    )
+    trending_default_window_hours: int = pydantic.Field(
+        env="FILM_TRENDING_DEFAULT_WINDOW_HOURS",
+        default=24,
+    )
+    trending_cache_expire_in_seconds: int = pydantic.Field(
+        env="FILM_TRENDING_CACHE_EXPIRE_IN_SECONDS",
+        default=60,
+    )
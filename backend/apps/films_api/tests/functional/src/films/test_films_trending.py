@@ -0,0 +1,67 @@
+import uuid
+from http import HTTPStatus
+
+import pytest
+from redis import Redis
+from tests.functional.conftest import ESWriteType, GetRequestType
+from tests.functional.settings import Settings
+
+pytestmark = pytest.mark.asyncio
+
+settings = Settings.get()
+TRENDING_URL = "/api/v1/films/trending"
+TRENDING_KEY = "trending:films:24h"
+
+
+def make_film(film_id: str, title: str, imdb_rating: float) -> dict:
+    return {
+        "id": film_id,
+        "imdb_rating": imdb_rating,
+        "genres": [{"id": str(uuid.uuid4()), "name": "Action"}],
+        "title": title,
+        "description": "",
+        "directors_names": [],
+        "actors_names": [],
+        "writers_names": [],
+        "directors": [],
+        "actors": [],
+        "writers": [],
+    }
+
+
+@pytest.mark.parametrize(
+    "query_data, expected_titles",
+    [
+        ({"page_size": 10, "page_number": 1}, ["Less rated", "Top rated"]),
+        ({"page_size": 1, "page_number": 1}, ["Less rated"]),
+        # Pages are taken from the ranking before films are looked up in the index,
+        # so a page comes back short when its ranked films are missing from the index
+        ({"page_size": 1, "page_number": 2}, []),
+        ({"page_size": 1, "page_number": 3}, ["Top rated"]),
+        ({"page_size": 10, "page_number": 1, "window_hours": 1}, []),
+    ],
+)
+async def test_trending_films_are_sorted_by_viewers(
+    es_write_data: ESWriteType,
+    make_get_request: GetRequestType,
+    flushable_redis_client: Redis,
+    query_data: dict,
+    expected_titles: list[str],
+) -> None:
+    top_rated = make_film(str(uuid.uuid4()), "Top rated", 9)
+    less_rated = make_film(str(uuid.uuid4()), "Less rated", 5)
+    await es_write_data(
+        [top_rated, less_rated],
+        settings.elastic.film_index.index,
+        settings.elastic.film_index.field_id_name,
+    )
+    # A ranked film missing from the index is skipped, it ranks second here
+    await flushable_redis_client.zadd(
+        TRENDING_KEY,
+        {top_rated["id"]: 10, less_rated["id"]: 100, str(uuid.uuid4()): 50},
+    )
+
+    body, status = await make_get_request(TRENDING_URL, query_data)
+
+    assert status == HTTPStatus.OK
+    assert [film["title"] for film in body] == expected_titles
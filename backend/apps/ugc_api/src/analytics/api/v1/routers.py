@@ -0,0 +1,46 @@
+import logging
+
+from fastapi import APIRouter, Depends
+from fastapi_pagination import Page, Params
+
+from src.analytics import schemas
+from src.analytics.dependencies import AnalyticsServiceType
+from src.common.dependencies import RateLimiterType, UserToken
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get(
+    path="/film-viewing-stats",
+    response_model=schemas.FilmViewingStatsResponseSchema,
+    summary="get film's viewing stats",
+    description="An endpoint for getting film's unique viewers, watch time "
+    "and completion rate",
+    response_description="film's viewing stats",
+)
+async def get_film_viewing_stats(
+    _: RateLimiterType,
+    service: AnalyticsServiceType,
+    film_id: str,
+) -> schemas.FilmViewingStatsResponseSchema:
+    return await service.get_film_viewing_stats(film_id=film_id)
+
+
+@router.get(
+    path="/watch-history",
+    response_model=Page[schemas.WatchHistoryItemSchema],
+    summary="get user's watch history",
+    description="An endpoint for getting films watched by the user, latest first",
+    response_description="watched films",
+)
+async def get_watch_history(
+    _: RateLimiterType,
+    service: AnalyticsServiceType,
+    user: UserToken,
+    pagination_params: Params = Depends(Params),
+) -> Page[schemas.WatchHistoryItemSchema]:
+    return await service.get_watch_history(
+        user_id=user.user.id, pagination_params=pagination_params
+    )
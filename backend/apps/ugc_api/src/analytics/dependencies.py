@@ -0,0 +1,6 @@
+from typing import Annotated
+
+from fastapi import Depends
+from src.analytics.services import IAnalyticsService, get_service
+
+AnalyticsServiceType = Annotated[IAnalyticsService, Depends(get_service)]
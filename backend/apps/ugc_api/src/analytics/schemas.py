@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from src.common.schemas import BaseSchema
+
+
+class FilmViewingStatsResponseSchema(BaseSchema):
+    film_id: str
+    unique_viewers: int
+    total_watch_time_sec: int
+    completion_rate: float
+
+
+class WatchHistoryItemSchema(BaseSchema):
+    film_id: str
+    views: int
+    progress_sec: int
+    first_view: datetime
+    last_view: datetime
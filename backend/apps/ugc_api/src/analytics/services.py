@@ -0,0 +1,129 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+from fastapi_pagination import Page, Params
+from src.analytics.schemas import FilmViewingStatsResponseSchema, WatchHistoryItemSchema
+from src.common.dependencies import AnalyticalRepositoryType
+from src.common.repositories import IAnalyticalRepository
+from src.settings.app import get_app_settings
+
+settings = get_app_settings()
+
+
+class IAnalyticsService(ABC):
+    @abstractmethod
+    async def get_film_viewing_stats(
+        self, film_id: str
+    ) -> FilmViewingStatsResponseSchema:
+        """Method returns viewing stats of a film.
+
+        Args:
+            film_id (str): Film id.
+
+        Returns:
+            FilmViewingStatsResponseSchema: Viewers, watch time and completion rate.
+        """
+
+    @abstractmethod
+    async def get_watch_history(
+        self, user_id: str, pagination_params: Params
+    ) -> Page[WatchHistoryItemSchema]:
+        """Method returns a page of films watched by the user, latest first.
+
+        Args:
+            user_id (str): User id.
+
+        Returns:
+            Page[WatchHistoryItemSchema]: Page of watched films.
+        """
+
+
+class AnalyticsService(IAnalyticsService):
+    # * a viewer who reached this share of the furthest progress anyone reached
+    # * is counted as having completed the film, as film durations aren't known here
+    COMPLETION_THRESHOLD = 0.9
+
+    # * summaries are maintained by materialized views on raw views and may hold
+    # * several rows per film and user until merged, so they're grouped again
+    FILM_STATS_QUERY = """
+        WITH (
+            SELECT max(max_progress_sec)
+            FROM {database}.film_user_views
+            WHERE film_id = toUUIDOrZero(%(film_id)s)
+        ) AS film_progress_sec
+        SELECT
+            count() AS unique_viewers,
+            sum(progress_sec) AS total_watch_time_sec,
+            countIf(progress_sec >= %(threshold)s * film_progress_sec)
+                AS completed_viewers
+        FROM (
+            SELECT user_id, max(max_progress_sec) AS progress_sec
+            FROM {database}.film_user_views
+            WHERE film_id = toUUIDOrZero(%(film_id)s)
+            GROUP BY user_id
+        )
+    """
+    WATCH_HISTORY_QUERY = """
+        SELECT
+            toString(film_id) AS film_id,
+            sum(views) AS views,
+            max(max_progress_sec) AS progress_sec,
+            min(first_view) AS first_view,
+            max(last_view) AS last_view
+        FROM {database}.user_film_views
+        WHERE user_id = toUUIDOrZero(%(user_id)s)
+        GROUP BY film_id
+        ORDER BY last_view DESC, film_id
+        LIMIT %(limit)s OFFSET %(offset)s
+    """
+    WATCHED_FILMS_QUERY = """
+        SELECT uniqExact(film_id) AS total
+        FROM {database}.user_film_views
+        WHERE user_id = toUUIDOrZero(%(user_id)s)
+    """
+
+    def __init__(self, repository: IAnalyticalRepository):
+        self.repository = repository
+        self.database = settings.clickhouse.database
+
+    async def get_film_viewing_stats(
+        self, film_id: str
+    ) -> FilmViewingStatsResponseSchema:
+        stats, *_ = await self.repository.fetch(
+            self.FILM_STATS_QUERY.format(database=self.database),
+            {"film_id": film_id, "threshold": self.COMPLETION_THRESHOLD},
+        )
+        unique_viewers = stats["unique_viewers"]
+        completion_rate = (
+            stats["completed_viewers"] / unique_viewers if unique_viewers else 0.0
+        )
+        return FilmViewingStatsResponseSchema(
+            film_id=film_id,
+            unique_viewers=unique_viewers,
+            total_watch_time_sec=stats["total_watch_time_sec"],
+            completion_rate=completion_rate,
+        )
+
+    async def get_watch_history(
+        self, user_id: str, pagination_params: Params
+    ) -> Page[WatchHistoryItemSchema]:
+        params = {
+            "user_id": user_id,
+            "limit": pagination_params.size,
+            "offset": (pagination_params.page - 1) * pagination_params.size,
+        }
+        history, total = await asyncio.gather(
+            self.repository.fetch(
+                self.WATCH_HISTORY_QUERY.format(database=self.database), params
+            ),
+            self.repository.fetch(
+                self.WATCHED_FILMS_QUERY.format(database=self.database), params
+            ),
+        )
+        return Page.create(
+            items=history, params=pagination_params, total=total[0]["total"]
+        )
+
+
+def get_service(repository: AnalyticalRepositoryType) -> IAnalyticsService:
+    return AnalyticsService(repository)
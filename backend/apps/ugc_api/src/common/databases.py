@@ -1,10 +1,12 @@
 from aiokafka import AIOKafkaProducer
+from asynch.pool import Pool
 from motor.core import AgnosticClient
 from redis.asyncio import Redis
 
 redis: None | Redis = None
 producer: AIOKafkaProducer | None = None
 mongodb: AgnosticClient | None = None
+clickhouse: Pool | None = None
 
 
 def get_mongodb() -> AgnosticClient:
@@ -26,3 +28,10 @@ def get_kafka_producer() -> AIOKafkaProducer:
         raise RuntimeError("Kafka producer has not been defined.")
 
     return producer
+
+
+def get_clickhouse() -> Pool:
+    if clickhouse is None:
+        raise RuntimeError("ClickHouse connection pool has not been defined.")
+
+    return clickhouse
@@ -1,32 +1,55 @@
 from typing import Annotated
 
 from aiokafka import AIOKafkaProducer
+from asynch.pool import Pool
 from fastapi import Depends
 from fastapi_limiter.depends import RateLimiter
 from motor.core import AgnosticClient
 from src.common.authorization import JWTBearer, JwtClaims
-from src.common.databases import get_kafka_producer, get_mongodb
+from src.common.databases import get_clickhouse, get_kafka_producer, get_mongodb
+from src.common.instrumentation import InstrumentedMessageQueue, InstrumentedRepository
 from src.common.message_queue import IMessageQueue, KafkaMessageQueue
-from src.common.repositories import IRepository, MongoRepository
+from src.common.repositories import (
+    ClickhouseRepository,
+    IAnalyticalRepository,
+    IRepository,
+    MongoRepository,
+)
 from src.settings.app import get_app_settings
 
 settings = get_app_settings()
 
 KafkaProducerType = Annotated[AIOKafkaProducer, Depends(get_kafka_producer)]
 MongoCLientType = Annotated[AgnosticClient, Depends(get_mongodb)]
+ClickhousePoolType = Annotated[Pool, Depends(get_clickhouse)]
 
 
 def get_message_queue(kafka_producer: KafkaProducerType) -> IMessageQueue:
-    return KafkaMessageQueue(kafka_producer=kafka_producer)
+    message_queue = KafkaMessageQueue(kafka_producer=kafka_producer)
+    if settings.metrics.enabled:
+        return InstrumentedMessageQueue(message_queue)
+    return message_queue
 
 
 def get_repository(mongo_client: MongoCLientType) -> IRepository:
-    return MongoRepository(mongo_client=mongo_client, db_name=settings.mongo.db_name)
+    repository = MongoRepository(
+        mongo_client=mongo_client, db_name=settings.mongo.db_name
+    )
+    if settings.metrics.enabled:
+        return InstrumentedRepository(repository)
+    return repository
+
+
+def get_analytical_repository(pool: ClickhousePoolType) -> IAnalyticalRepository:
+    return ClickhouseRepository(pool=pool)
 
 
 UserToken = Annotated[JwtClaims, Depends(JWTBearer())]
 MessageQueueType = Annotated[IMessageQueue, Depends(get_message_queue)]
 RepositoryType = Annotated[IRepository, Depends(get_repository)]
+AnalyticalRepositoryType = Annotated[
+    IAnalyticalRepository, Depends(get_analytical_repository)
+]
 RateLimiterType = Annotated[
     RateLimiter,
     Depends(
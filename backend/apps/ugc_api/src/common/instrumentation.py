@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from opentelemetry import trace
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    multiprocess,
+)
+from pymongo import monitoring
+from pymongo.collection import ObjectId
+from src.common.message_queue import IMessageQueue
+from src.common.repositories import IRepository
+
+tracer = trace.get_tracer(__name__)
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+MONGO_OPERATION_LATENCY = Histogram(
+    "ugc_mongo_operation_seconds",
+    "Latency of MongoDB repository operations",
+    ["operation", "collection"],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_OPERATION_ERRORS = Counter(
+    "ugc_mongo_operation_errors_total",
+    "Number of failed MongoDB repository operations",
+    ["operation", "collection"],
+)
+MONGO_DOCUMENTS_RETURNED = Histogram(
+    "ugc_mongo_documents_returned",
+    "Number of documents returned by MongoDB read operations",
+    ["operation", "collection"],
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "ugc_mongo_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the MongoDB connection pool",
+    ["address"],
+    buckets=LATENCY_BUCKETS,
+)
+KAFKA_SEND_LATENCY = Histogram(
+    "ugc_kafka_send_seconds",
+    "Time spent enqueueing a message into the Kafka producer",
+    ["topic"],
+    buckets=LATENCY_BUCKETS,
+)
+KAFKA_SEND_ERRORS = Counter(
+    "ugc_kafka_send_errors_total",
+    "Number of failed Kafka sends",
+    ["topic"],
+)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registry to expose, aggregating gunicorn workers in multiprocess mode."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+@contextmanager
+def observe(
+    span_name: str,
+    latency: Histogram,
+    errors: Counter,
+    attributes: dict[str, str],
+    *labels: str,
+) -> Iterator[None]:
+    """Record latency and errors of the wrapped block as a metric and a span.
+
+    Args:
+        span_name (str): Name of the OpenTelemetry span.
+        latency (Histogram): Histogram to observe the duration with.
+        errors (Counter): Counter to increment if the block raises.
+        attributes (dict[str, str]): Span attributes.
+        labels (str): Label values for both metrics.
+    """
+    with tracer.start_as_current_span(span_name, attributes=attributes):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            errors.labels(*labels).inc()
+            raise
+        finally:
+            latency.labels(*labels).observe(time.perf_counter() - start)
+
+
+class InstrumentedRepository(IRepository):
+    """Repository decorator recording per-operation latency and result sizes."""
+
+    def __init__(self, repository: IRepository):
+        self.repository = repository
+
+    @staticmethod
+    def _observe(operation: str, collection: str):
+        return observe(
+            f"mongo.{operation}",
+            MONGO_OPERATION_LATENCY,
+            MONGO_OPERATION_ERRORS,
+            {
+                "db.system": "mongodb",
+                "db.operation": operation,
+                "db.mongodb.collection": collection,
+            },
+            operation,
+            collection,
+        )
+
+    @staticmethod
+    def _documents_returned(operation: str, collection: str, count: int) -> None:
+        MONGO_DOCUMENTS_RETURNED.labels(operation, collection).observe(count)
+        trace.get_current_span().set_attribute("db.documents_returned", count)
+
+    async def insert(self, data: dict, collection: str) -> ObjectId:
+        with self._observe("insert", collection):
+            return await self.repository.insert(data, collection)
+
+    async def update(
+        self, filters: dict[str, str], data: dict, collection: str, upsert: bool = True
+    ) -> None:
+        with self._observe("update", collection):
+            await self.repository.update(filters, data, collection, upsert=upsert)
+
+    async def get_by_id(self, entity_id: str, collection: str) -> dict:
+        with self._observe("get_by_id", collection):
+            document = await self.repository.get_by_id(entity_id, collection)
+            self._documents_returned("get_by_id", collection, 1)
+            return document
+
+    async def get_list(
+        self,
+        collection: str,
+        filters: dict[str, str],
+        skip: int = 0,
+        limit: int | None = None,
+    ) -> list[dict]:
+        with self._observe("get_list", collection):
+            documents = await self.repository.get_list(
+                collection, filters, skip=skip, limit=limit
+            )
+            self._documents_returned("get_list", collection, len(documents))
+            return documents
+
+    async def count(self, collection: str, filters: dict[str, str]) -> int:
+        with self._observe("count", collection):
+            return await self.repository.count(collection, filters)
+
+    async def aggregate(
+        self, collection: str, filters: list[dict], limit: int | None = None
+    ) -> list[dict]:
+        with self._observe("aggregate", collection):
+            documents = await self.repository.aggregate(
+                collection, filters, limit=limit
+            )
+            self._documents_returned("aggregate", collection, len(documents))
+            return documents
+
+
+class InstrumentedMessageQueue(IMessageQueue):
+    """Message queue decorator recording the time spent enqueueing to Kafka."""
+
+    def __init__(self, message_queue: IMessageQueue):
+        self.message_queue = message_queue
+
+    async def push(self, topic: str, message: bytes, key: bytes | None = None) -> None:
+        with observe(
+            "kafka.send",
+            KAFKA_SEND_LATENCY,
+            KAFKA_SEND_ERRORS,
+            {"messaging.system": "kafka", "messaging.destination": topic},
+            topic,
+        ):
+            await self.message_queue.push(topic, message, key=key)
+
+
+class PoolCheckoutListener(monitoring.ConnectionPoolListener):
+    """Measures how long pymongo waits for a pooled connection.
+
+    Motor runs pymongo in executor threads and a checkout is started and
+    finished in the same thread, so the start time is kept thread-local.
+    """
+
+    def __init__(self) -> None:
+        self._started = threading.local()
+
+    def connection_check_out_started(self, event) -> None:
+        self._started.at = time.perf_counter()
+
+    def connection_checked_out(self, event) -> None:
+        self._observe(event.address)
+
+    def connection_check_out_failed(self, event) -> None:
+        self._observe(event.address)
+
+    def _observe(self, address: tuple[str, int]) -> None:
+        started_at = getattr(self._started, "at", None)
+        if started_at is None:
+            return
+        self._started.at = None
+        MONGO_POOL_CHECKOUT_WAIT.labels(f"{address[0]}:{address[1]}").observe(
+            time.perf_counter() - started_at
+        )
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_created(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        pass
+
+    def connection_checked_in(self, event) -> None:
+        pass
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+from asynch.cursors import DictCursor
+from asynch.pool import Pool
 from motor.core import AgnosticClient
 from pymongo.collection import InsertOneResult, ObjectId
 
@@ -18,7 +20,7 @@ class IRepository(ABC):
 
     @abstractmethod
     async def update(
-        self, filters: dict[str, str], data: dict, collection: str, upsert: bool = True
+        self, filters: dict, data: dict, collection: str, upsert: bool = True
     ) -> None:
         """update a record in the repository
 
@@ -102,7 +104,7 @@ class MongoRepository(IRepository):
         return cursor.inserted_id
 
     async def update(
-        self, filters: dict[str, str], data: dict, collection: str, upsert: bool = True
+        self, filters: dict, data: dict, collection: str, upsert: bool = True
     ) -> None:
         await self.client[self.db_name][collection].update_one(
             filters, {"$set": data}, upsert=upsert
@@ -136,3 +138,31 @@ class MongoRepository(IRepository):
     ) -> list[dict]:
         cursor = self.client[self.db_name][collection].aggregate(pipeline=filters)
         return await cursor.to_list(length=limit)  # type: ignore
+
+
+class IAnalyticalRepository(ABC):
+    @abstractmethod
+    async def fetch(self, query: str, params: dict | None = None) -> list[dict]:
+        """run a read query against the analytical database
+
+        Args:
+            query (str): Query with %(name)s placeholders.
+            params (dict): Values of the placeholders.
+
+        Returns:
+            list[dict]: Rows by column name.
+        """
+
+
+class ClickhouseRepository(IAnalyticalRepository):
+    """ClickHouse implementation."""
+
+    def __init__(self, pool: Pool):
+        self.pool = pool
+
+    async def fetch(self, query: str, params: dict | None = None) -> list[dict]:
+        async with self.pool.acquire() as connection, connection.cursor(
+            cursor=DictCursor
+        ) as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
@@ -6,16 +6,20 @@ import sentry_sdk
 import structlog
 import uvicorn
 from aiokafka import AIOKafkaProducer
+from asynch import create_pool
 from fastapi import FastAPI, Request, status
 from fastapi.responses import ORJSONResponse, Response
 from fastapi_limiter import FastAPILimiter
 from fastapi_pagination import add_pagination
 from motor.motor_asyncio import AsyncIOMotorClient
 from opentelemetry import trace
+from prometheus_client import make_asgi_app
 from redis import asyncio as aioredis
 from starlette.middleware.sessions import SessionMiddleware
 
+from src.analytics.api.v1.routers import router as analytics_router
 from src.common import databases
+from src.common.instrumentation import PoolCheckoutListener, metrics_registry
 from src.film_progress.api.v1.routers import router as film_progress_router
 from src.likes.api.v1.routers import router as likes_router
 from src.reviews.api.v1.routers import router as reviews_router
@@ -43,7 +47,20 @@ async def lifespan(app: FastAPI):
         request_timeout_ms=10000,
         retry_backoff_ms=1000,
     )
-    databases.mongodb = AsyncIOMotorClient(settings.mongo.dsn)
+    databases.mongodb = AsyncIOMotorClient(
+        settings.mongo.dsn,
+        event_listeners=[PoolCheckoutListener()] if settings.metrics.enabled else [],
+    )
+    # * no connections are opened up front, so the api starts without clickhouse
+    databases.clickhouse = await create_pool(
+        minsize=0,
+        maxsize=settings.clickhouse.pool_size,
+        host=settings.clickhouse.host,
+        port=settings.clickhouse.port,
+        database=settings.clickhouse.database,
+        user=settings.clickhouse.user,
+        password=settings.clickhouse.password,
+    )
 
     await databases.producer.start()
     await FastAPILimiter.init(databases.redis)
@@ -53,6 +70,8 @@ async def lifespan(app: FastAPI):
     databases.mongodb.close()
     await databases.redis.close()
     await databases.producer.stop()
+    databases.clickhouse.close()
+    await databases.clickhouse.wait_closed()
 
 
 app = FastAPI(
@@ -115,6 +134,7 @@ async def setup_request_id_for_jaeger(
     return await call_next(request)
 
 
+app.include_router(analytics_router, prefix="/api/v1", tags=["analytics"])
 app.include_router(film_progress_router, prefix="/api/v1", tags=["film_progress"])
 app.include_router(likes_router, prefix="/api/v1", tags=["likes"])
 app.include_router(reviews_router, prefix="/api/v1", tags=["reviews"])
@@ -130,6 +150,9 @@ if settings.sentry.enabled:
         enable_tracing=True,
     )
 
+if settings.metrics.enabled:
+    app.mount(settings.metrics.path, make_asgi_app(registry=metrics_registry()))
+
 add_pagination(app)
 
 if __name__ == "__main__":
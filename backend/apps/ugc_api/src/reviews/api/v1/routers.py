@@ -71,11 +71,26 @@ async def get_user_review(
     )
 
 
+@router.get(
+    path="/reviews/{review_id:str}/full",
+    response_model=schemas.ReviewResponseSchema,
+    summary="get review record with full text",
+    description="An endpoint for getting a review record with its full text",
+    response_description="review record",
+)
+async def get_review(
+    review_id: str,
+    _: RateLimiterType,
+    service: ReviewServiceType,
+) -> schemas.ReviewResponseSchema:
+    return await service.get_review(review_id=review_id)
+
+
 @router.get(
     path="/reviews",
-    response_model=Page[schemas.ReviewResponseSchema],
+    response_model=Page[schemas.ReviewSnippetResponseSchema],
     summary="get film's review records",
-    description="An endpoint for getting film's review records",
+    description="An endpoint for getting film's review records with text snippets",
     response_description="review records",
 )
 async def get_reviews(
@@ -83,7 +98,7 @@ async def get_reviews(
     service: ReviewServiceType,
     film_id: str,
     pagination_params: Params = Depends(Params),
-) -> Page[schemas.ReviewResponseSchema]:
+) -> Page[schemas.ReviewSnippetResponseSchema]:
     return await service.get_films_reviews(
         film_id=film_id, pagination_params=pagination_params
     )
@@ -1,7 +1,20 @@
-from pydantic import Field
+from pydantic import Field, validator
 from src.common.schemas import BaseMongoSchema, BaseSchema
 from typing_extensions import Self
 
+REVIEW_SNIPPET_LENGTH = 200
+REVIEW_SNIPPET_ELLIPSIS = "..."
+
+
+def build_snippet(text: str, length: int = REVIEW_SNIPPET_LENGTH) -> str:
+    """Cut the review text to a preview, preferably on a word boundary."""
+    if len(text) <= length:
+        return text
+    snippet = text[:length]
+    if " " in snippet:
+        snippet = snippet.rsplit(" ", 1)[0]
+    return snippet.rstrip() + REVIEW_SNIPPET_ELLIPSIS
+
 
 class ReviewBaseRequestSchema(BaseSchema):
     film_id: str
@@ -21,11 +34,30 @@ class ReviewUpdateRequestSchema(ReviewBaseRequestSchema):
     timestamp: int = Field(..., ge=0)
 
 
-class ReviewCreateResponseSchema(ReviewBaseResponseSchema):
+class ReviewTextResponseSchema(ReviewBaseResponseSchema):
     timestamp: int
     user_id: str
     text: str
+    # reviews stored before snippets were introduced have only the text
+    snippet: str | None = None
+    text_length: int | None = None
+
+    @validator("snippet", always=True)
+    @classmethod
+    def fill_snippet(cls, snippet: str | None, values: dict) -> str | None:
+        if snippet is None and "text" in values:
+            return build_snippet(values["text"])
+        return snippet
+
+    @validator("text_length", always=True)
+    @classmethod
+    def fill_text_length(cls, text_length: int | None, values: dict) -> int | None:
+        if text_length is None and "text" in values:
+            return len(values["text"])
+        return text_length
+
 
+class ReviewCreateResponseSchema(ReviewTextResponseSchema):
     @classmethod
     def from_input_schema(
         cls, input_schema: ReviewCreateRequestSchema, user_id: str
@@ -36,14 +68,12 @@ class ReviewCreateResponseSchema(ReviewBaseResponseSchema):
             film_id=input_schema.film_id,
             timestamp=input_schema.timestamp,
             text=input_schema.text,
+            snippet=build_snippet(input_schema.text),
+            text_length=len(input_schema.text),
         )
 
 
-class ReviewUpdateResponseSchema(ReviewBaseResponseSchema):
-    timestamp: int
-    user_id: str
-    text: str
-
+class ReviewUpdateResponseSchema(ReviewTextResponseSchema):
     @classmethod
     def from_input_schema(
         cls, input_schema: ReviewUpdateRequestSchema, user_id: str
@@ -54,6 +84,8 @@ class ReviewUpdateResponseSchema(ReviewBaseResponseSchema):
             film_id=input_schema.film_id,
             timestamp=input_schema.timestamp,
             text=input_schema.text,
+            snippet=build_snippet(input_schema.text),
+            text_length=len(input_schema.text),
         )
 
 
@@ -61,3 +93,10 @@ class ReviewResponseSchema(ReviewBaseResponseSchema):
     timestamp: float
     text: str
     user_id: str
+
+
+class ReviewSnippetResponseSchema(ReviewBaseResponseSchema):
+    timestamp: float
+    snippet: str
+    text_length: int
+    user_id: str
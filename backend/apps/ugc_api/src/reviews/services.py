@@ -1,6 +1,8 @@
 import asyncio
+import http
 from abc import ABC, abstractmethod
 
+from fastapi import HTTPException
 from fastapi_pagination import Page, Params
 from pymongo.collection import ObjectId
 from src.common.dependencies import MessageQueueType, RepositoryType
@@ -10,8 +12,10 @@ from src.reviews.schemas import (
     ReviewCreateRequestSchema,
     ReviewCreateResponseSchema,
     ReviewResponseSchema,
+    ReviewSnippetResponseSchema,
     ReviewUpdateRequestSchema,
     ReviewUpdateResponseSchema,
+    build_snippet,
 )
 
 
@@ -59,25 +63,54 @@ class IReviewService(ABC):
             None: No return value.
         """
 
+    @abstractmethod
+    async def get_review(self, review_id: str) -> ReviewResponseSchema:
+        """Method returns a review with its full text.
+
+        Args:
+            review_id (str): review id .
+
+        Returns:
+            ReviewResponseSchema: Review record.
+        """
+
     @abstractmethod
     async def get_films_reviews(
         self,
         film_id: str,
         pagination_params: Params,
-    ) -> Page[ReviewResponseSchema]:
-        """Method handle event from the client and send it to the queue.
+    ) -> Page[ReviewSnippetResponseSchema]:
+        """Method returns a page of film's reviews without their full text.
 
         Args:
             film_id (str): film id of related to reviews .
 
         Returns:
-            None: No return value.
+            Page[ReviewSnippetResponseSchema]: Page of review snippets.
         """
 
 
 class ReviewService(IReviewService):
     REVIEWS_NAMESPACE = "reviews"
 
+    # * reviews stored before snippets were introduced have only the full text,
+    # * so the text is shipped for them alone and cut with build_snippet
+    SNIPPET_PROJECTION = {
+        "_id": 1,
+        "film_id": 1,
+        "user_id": 1,
+        "timestamp": 1,
+        "snippet": 1,
+        "text": {
+            "$cond": [
+                {"$in": [{"$type": "$snippet"}, ["missing", "null"]]},
+                "$text",
+                "$$REMOVE",
+            ]
+        },
+        "text_length": {"$ifNull": ["$text_length", {"$strLenCP": "$text"}]},
+    }
+
     def __init__(self, message_queue: IMessageQueue, repository: IRepository):
         self.message_queue = message_queue
         self.repository = repository
@@ -93,7 +126,9 @@ class ReviewService(IReviewService):
         _, inserted_id = await asyncio.gather(
             self.message_queue.push(
                 self.REVIEWS_NAMESPACE,
-                review_record.json(exclude_none=True).encode(),
+                review_record.json(
+                    exclude_none=True, exclude={"snippet", "text_length"}
+                ).encode(),
                 key=key.encode(),
             ),
             self.repository.insert(
@@ -114,6 +149,7 @@ class ReviewService(IReviewService):
         user_id: str,
         review_id: str,
     ) -> ReviewUpdateResponseSchema:
+        object_id = review_object_id(review_id)
         key = build_key(film_id=update_request_body.film_id, user_id=user_id)
         review_record = ReviewUpdateResponseSchema.from_input_schema(
             update_request_body, user_id
@@ -121,22 +157,20 @@ class ReviewService(IReviewService):
         await asyncio.gather(
             self.message_queue.push(
                 self.REVIEWS_NAMESPACE,
-                review_record.json(exclude_none=True).encode(),
+                review_record.json(
+                    exclude_none=True, exclude={"snippet", "text_length"}
+                ).encode(),
                 key=key.encode(),
             ),
             self.repository.update(
-                filters={"_id": str(ObjectId(review_id))},
+                filters={"_id": object_id},
                 data=review_record.dict(exclude_none=True),
                 collection=self.REVIEWS_NAMESPACE,
                 upsert=False,
             ),
         )
 
-        updated_review = await self.repository.get_by_id(
-            entity_id=review_id,
-            collection=self.REVIEWS_NAMESPACE,
-        )
-
+        updated_review = await self.get_review_record(review_id)
         return ReviewUpdateResponseSchema(**updated_review)
 
     async def get_user_review(self, film_id: str, user_id: str) -> ReviewResponseSchema:
@@ -149,28 +183,61 @@ class ReviewService(IReviewService):
         # * because we expect only one review per user per film
         return ReviewResponseSchema(**review)
 
+    async def get_review(self, review_id: str) -> ReviewResponseSchema:
+        review = await self.get_review_record(review_id)
+        return ReviewResponseSchema(**review)
+
+    async def get_review_record(self, review_id: str) -> dict:
+        try:
+            return await self.repository.get_by_id(
+                entity_id=str(review_object_id(review_id)),
+                collection=self.REVIEWS_NAMESPACE,
+            )
+        except ValueError as e:
+            raise review_not_found() from e
+
     async def get_films_reviews(
         self,
         film_id: str,
         pagination_params: Params,
-    ) -> Page[ReviewResponseSchema]:
+    ) -> Page[ReviewSnippetResponseSchema]:
         skip = (pagination_params.page - 1) * pagination_params.size
+        pipeline: list[dict] = [
+            {"$match": {"film_id": film_id}},
+            {"$skip": skip},
+            {"$limit": pagination_params.size},
+            {"$project": self.SNIPPET_PROJECTION},
+        ]
 
         reviews, total = await asyncio.gather(
-            self.repository.get_list(
+            self.repository.aggregate(
                 collection=self.REVIEWS_NAMESPACE,
-                skip=skip,
+                filters=pipeline,
                 limit=pagination_params.size,
-                filters={"film_id": film_id},
             ),
             self.repository.count(
                 collection=self.REVIEWS_NAMESPACE,
                 filters={"film_id": film_id},
             ),
         )
+        for review in reviews:
+            if review.get("snippet") is None:
+                review["snippet"] = build_snippet(review.pop("text"))
         return Page.create(items=reviews, params=pagination_params, total=total)
 
 
+def review_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=http.HTTPStatus.NOT_FOUND, detail="Review not found"
+    )
+
+
+def review_object_id(review_id: str) -> ObjectId:
+    if not ObjectId.is_valid(review_id):
+        raise review_not_found()
+    return ObjectId(review_id)
+
+
 def get_service(
     message_queue: MessageQueueType, repository: RepositoryType
 ) -> IReviewService:
@@ -1,10 +1,12 @@
 from functools import lru_cache
 
 from src.settings.auth import AuthSettings
+from src.settings.clickhouse import ClickhouseSettings
 from src.settings.base import BaseAppSettings
 from src.settings.jaeger import JaegerSettings
 from src.settings.kafka import KafkaSettings
 from src.settings.logging import LoggingSettings
+from src.settings.metrics import MetricsSettings
 from src.settings.mongo import MongoSettings
 from src.settings.rate_limiter import RateLimiterSettings
 from src.settings.redis import RedisSettings
@@ -22,6 +24,8 @@ class AppSettings(BaseAppSettings):
     kafka = KafkaSettings()  # type: ignore
     mongo = MongoSettings()  # type: ignore
     sentry = SentrySettings()  # type: ignore
+    metrics = MetricsSettings()  # type: ignore
+    clickhouse = ClickhouseSettings()  # type: ignore
 
 
 @lru_cache(maxsize=1)
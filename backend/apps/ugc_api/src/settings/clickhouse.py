@@ -0,0 +1,11 @@
+import pydantic
+from src.settings.base import BaseAppSettings
+
+
+class ClickhouseSettings(BaseAppSettings):
+    host: str = pydantic.Field(env="CLICKHOUSE_HOST", default="127.0.0.1")
+    port: int = pydantic.Field(env="CLICKHOUSE_PORT", default=9000)
+    database: str = pydantic.Field(env="CLICKHOUSE_DB", default="ugc_analytics")
+    user: str = pydantic.Field(env="CLICKHOUSE_USER", default="default")
+    password: str = pydantic.Field(env="CLICKHOUSE_PASSWORD", default="")
+    pool_size: int = pydantic.Field(env="CLICKHOUSE_POOL_SIZE", default=10)
@@ -0,0 +1,7 @@
+import pydantic
+from src.settings.base import BaseAppSettings
+
+
+class MetricsSettings(BaseAppSettings):
+    enabled: bool = pydantic.Field(env="METRICS_ENABLED", default=False)
+    path: str = pydantic.Field(env="METRICS_PATH", default="/metrics")
@@ -0,0 +1,104 @@
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from src.common.authorization import JwtClaims
+from src.common.dependencies import get_analytical_repository
+from src.common.repositories import IAnalyticalRepository
+from src.main import app
+
+pytestmark = pytest.mark.asyncio
+
+
+class StubAnalyticalRepository(IAnalyticalRepository):
+    def __init__(self, results: list[list[dict]]):
+        self.results = results
+        self.calls: list[tuple[str, dict | None]] = []
+
+    async def fetch(self, query: str, params: dict | None = None) -> list[dict]:
+        self.calls.append((query, params))
+        return self.results[len(self.calls) - 1]
+
+
+@pytest.fixture
+def analytical_repository(request: pytest.FixtureRequest):
+    repository = StubAnalyticalRepository(request.param)
+    app.dependency_overrides[get_analytical_repository] = lambda: repository
+    yield repository
+    app.dependency_overrides.pop(get_analytical_repository)
+
+
+@pytest.mark.parametrize(
+    "analytical_repository",
+    [[[{"unique_viewers": 4, "total_watch_time_sec": 18000, "completed_viewers": 3}]]],
+    indirect=True,
+)
+async def test_get_film_viewing_stats(
+    client: AsyncClient, analytical_repository: StubAnalyticalRepository
+):
+    film_id = str(uuid4())
+    response = await client.get(
+        f"/film-viewing-stats?film_id={film_id}",
+        headers={"X-Request-Id": "test", "Authorization": "Bearer test_jwt"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "film_id": film_id,
+        "unique_viewers": 4,
+        "total_watch_time_sec": 18000,
+        "completion_rate": 0.75,
+    }
+    (_, params), *_ = analytical_repository.calls
+    assert params is not None and params["film_id"] == film_id
+
+
+@pytest.mark.parametrize(
+    "analytical_repository",
+    [[[{"unique_viewers": 0, "total_watch_time_sec": 0, "completed_viewers": 0}]]],
+    indirect=True,
+)
+async def test_get_film_viewing_stats_without_views(
+    client: AsyncClient, analytical_repository: StubAnalyticalRepository
+):
+    response = await client.get(
+        f"/film-viewing-stats?film_id={uuid4()}",
+        headers={"X-Request-Id": "test", "Authorization": "Bearer test_jwt"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["completion_rate"] == 0.0
+
+
+WATCHED_FILM = {
+    "film_id": str(uuid4()),
+    "views": 12,
+    "progress_sec": 3600,
+    "first_view": datetime(2024, 1, 1, 20, 0),
+    "last_view": datetime(2024, 1, 2, 21, 0),
+}
+
+
+@pytest.mark.parametrize(
+    "analytical_repository", [[[WATCHED_FILM], [{"total": 3}]]], indirect=True
+)
+async def test_get_watch_history(
+    mock_jwt: JwtClaims,
+    client: AsyncClient,
+    analytical_repository: StubAnalyticalRepository,
+):
+    response = await client.get(
+        "/watch-history?page=2&size=2",
+        headers={"X-Request-Id": "test", "Authorization": "Bearer test_jwt"},
+    )
+
+    assert response.status_code == 200
+    page = response.json()
+    assert page["total"] == 3
+    item, *_ = page["items"]
+    assert item["film_id"] == WATCHED_FILM["film_id"]
+    assert item["progress_sec"] == WATCHED_FILM["progress_sec"]
+
+    (_, params), *_ = analytical_repository.calls
+    assert params == {"user_id": str(mock_jwt.user.id), "limit": 2, "offset": 2}
@@ -0,0 +1,50 @@
+from unittest import mock
+
+import pytest
+from prometheus_client import REGISTRY
+from src.common.instrumentation import InstrumentedMessageQueue, InstrumentedRepository
+
+pytestmark = pytest.mark.asyncio
+
+
+def sample(name: str, labels: dict[str, str]) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+async def test_repository_records_latency_and_documents():
+    repository = mock.AsyncMock()
+    repository.get_list.return_value = [{"film_id": "1"}, {"film_id": "2"}]
+    labels = {"operation": "get_list", "collection": "test_reviews"}
+    count_before = sample("ugc_mongo_operation_seconds_count", labels)
+    documents_before = sample("ugc_mongo_documents_returned_sum", labels)
+
+    documents = await InstrumentedRepository(repository).get_list(
+        collection="test_reviews", filters={}, limit=2
+    )
+
+    assert len(documents) == 2
+    assert sample("ugc_mongo_operation_seconds_count", labels) == count_before + 1
+    assert sample("ugc_mongo_documents_returned_sum", labels) == documents_before + 2
+
+
+async def test_repository_records_errors():
+    repository = mock.AsyncMock()
+    repository.count.side_effect = RuntimeError("mongo is down")
+    labels = {"operation": "count", "collection": "test_reviews"}
+    errors_before = sample("ugc_mongo_operation_errors_total", labels)
+
+    with pytest.raises(RuntimeError):
+        await InstrumentedRepository(repository).count("test_reviews", filters={})
+
+    assert sample("ugc_mongo_operation_errors_total", labels) == errors_before + 1
+
+
+async def test_message_queue_records_send_latency():
+    message_queue = mock.AsyncMock()
+    labels = {"topic": "test_topic"}
+    count_before = sample("ugc_kafka_send_seconds_count", labels)
+
+    await InstrumentedMessageQueue(message_queue).push("test_topic", b"{}", key=b"1")
+
+    message_queue.push.assert_awaited_once_with("test_topic", b"{}", key=b"1")
+    assert sample("ugc_kafka_send_seconds_count", labels) == count_before + 1
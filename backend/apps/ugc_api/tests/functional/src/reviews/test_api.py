@@ -5,6 +5,7 @@ import pytest
 from httpx import AsyncClient
 from motor.core import AgnosticClient
 from src.common.authorization import JwtClaims
+from src.reviews.schemas import build_snippet
 from src.settings.app import get_app_settings
 
 
@@ -66,5 +67,103 @@ async def test_get_review(
 
     item = items[0]
     assert item["film_id"] == test_event["film_id"]
-    assert item["text"] == test_event["text"]
+    assert item["snippet"] == test_event["text"]
+    assert item["text_length"] == len(test_event["text"])
     assert item["timestamp"] == test_event["timestamp"]
+    assert "text" not in item
+
+
+async def test_get_reviews_returns_snippets_only(
+    client: AsyncClient, db_session: AgnosticClient
+):
+    test_event = {
+        "film_id": str(uuid4()),
+        "text": "long review " * 100,
+        "timestamp": int(time()),
+    }
+    headers = {"X-Request-Id": "test", "Authorization": "Bearer test_jwt"}
+
+    response = await client.post("/reviews", json=test_event, headers=headers)
+    assert response.status_code == 200
+    review_id = response.json()["id"]
+
+    response = await client.get(
+        f"/reviews?film_id={test_event['film_id']}", headers=headers
+    )
+    assert response.status_code == 200
+
+    item, *_ = response.json()["items"]
+    assert "text" not in item
+    assert item["text_length"] == len(test_event["text"])
+    assert len(item["snippet"]) < len(test_event["text"])
+    assert test_event["text"].startswith(item["snippet"].removesuffix("..."))
+
+    response = await client.get(f"/reviews/{review_id}/full", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["text"] == test_event["text"]
+
+
+async def test_get_reviews_builds_snippets_of_old_reviews(
+    client: AsyncClient, db_session: AgnosticClient
+):
+    test_event = {
+        "user_id": str(uuid4()),
+        "film_id": str(uuid4()),
+        "text": "old review " * 100,
+        "timestamp": int(time()),
+    }
+    film_collection = db_session[settings.mongo.db_name]["reviews"]
+    await film_collection.insert_one(test_event)
+
+    response = await client.get(
+        f"/reviews?film_id={test_event['film_id']}",
+        headers={"X-Request-Id": "test", "Authorization": "Bearer test_jwt"},
+    )
+    assert response.status_code == 200
+
+    item, *_ = response.json()["items"]
+    assert "text" not in item
+    assert item["snippet"] == build_snippet(test_event["text"])
+    assert item["text_length"] == len(test_event["text"])
+
+
+async def test_update_old_review(
+    mock_jwt: JwtClaims, client: AsyncClient, db_session: AgnosticClient
+):
+    test_event = {
+        "user_id": str(mock_jwt.user.id),
+        "film_id": str(uuid4()),
+        "text": "old review",
+        "timestamp": int(time()),
+    }
+    film_collection = db_session[settings.mongo.db_name]["reviews"]
+    inserted = await film_collection.insert_one(test_event)
+
+    update_event = {
+        "film_id": test_event["film_id"],
+        "text": "updated review",
+        "timestamp": int(time()),
+    }
+    response = await client.put(
+        f"/reviews/{inserted.inserted_id}",
+        json=update_event,
+        headers={"X-Request-Id": "test", "Authorization": "Bearer test_jwt"},
+    )
+    assert response.status_code == 200
+
+    updated_event = response.json()
+    assert updated_event["text"] == update_event["text"]
+    assert updated_event["snippet"] == update_event["text"]
+    assert updated_event["text_length"] == len(update_event["text"])
+
+    stored_event = await film_collection.find_one({"_id": inserted.inserted_id})
+    assert stored_event["snippet"] == update_event["text"]
+
+
+@pytest.mark.parametrize("review_id", ["000000000000000000000000", "not-an-id"])
+async def test_get_unknown_review(client: AsyncClient, review_id: str):
+    response = await client.get(
+        f"/reviews/{review_id}/full",
+        headers={"X-Request-Id": "test", "Authorization": "Bearer test_jwt"},
+    )
+    assert response.status_code == 404